@@ -3,7 +3,7 @@
 Frequenty used functions and classes
 
 Dependency:
-    wxPython (4.0), 
+    wxPython (4.0), (optional; only for GUI functions and classes)
     Numpy (1.17), 
 """
 
@@ -11,8 +11,11 @@ import sys, errno
 from os import path, strerror
 from datetime import datetime
 
-import wx
-import wx.lib.scrolledpanel as sPanel
+try:
+    import wx
+    import wx.lib.scrolledpanel as sPanel
+except ImportError: # running without GUI (such as pyListenerDaemon.py)
+    wx = None
 import numpy as np
 
 DEBUG = False
@@ -384,7 +387,7 @@ def show_msg(msg, size=(400,200), title="Message"):
 
 #=======================================================================
 
-class PopupDialog(wx.Dialog):
+class PopupDialog(wx.Dialog if wx != None else object):
     """ Class for showing a message to a user.
     Most simple messages can be dealt using wx.MessageBox.
     This class was made to use it as a base class for a dialog box
@@ -0,0 +1,232 @@
+# coding: UTF-8
+
+"""
+pyLAsync
+asyncio interface of PyListener (pyListenerLib.py).
+It wraps the existing PyListener pipeline (listening thread and
+contProcMicAudioData) and exposes two async iterators;
+spectrogram columns (with RMS amplitudes) and sound fragment events.
+
+Data is passed from the threads to the event loop with
+loop.call_soon_threadsafe and stored in bounded asyncio queues.
+When a consumer is too slow and a queue is full, the oldest item is
+dropped (the capturing thread never blocks) and counted in 'dropped'.
+
+Example:
+    import asyncio
+    import pyListenerLib as PLL
+    from pyLAsync import AsyncPyListener
+
+    async def main():
+        pl = PLL.PyListener(None)
+        pl.listen(flag='templateFolder', wavFP='input/sample_phee')
+        pl.templFP = 'input/sample_phee'
+        apl = AsyncPyListener(pl)
+        await apl.start()
+        async for evt in apl.events():
+            if evt['event'] == 'fragment': print(evt['matched'])
+
+    asyncio.run(main())
+
+Dependency:
+    pyAudio (0.2),
+    NumPy (1.17),
+    SciPy (1.3),
+    Scikit-image (0.15),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import queue, asyncio
+from threading import Thread
+
+DEBUG = False
+
+#=======================================================================
+
+class AsyncPyListener(object):
+    """ asyncio wrapper of PyListener.
+
+    Args:
+        pl (PyListener): PyListener object (template should be already
+          loaded, if comparison is required).
+        maxCols (int): Maximum number of spectrogram columns to keep
+          in the queue.
+        maxEvents (int): Maximum number of events to keep in the queue.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, pl, maxCols=256, maxEvents=64):
+        if DEBUG: print("AsyncPyListener.__init__()")
+        self.pl = pl # PyListener
+        self.maxCols = maxCols # size of queue for spectrogram columns
+        self.maxEvents = maxEvents # size of queue for events
+        self.loop = None # asyncio event loop
+        self.colQ = None # asyncio.Queue for spectrogram columns
+        self.evtQ = None # asyncio.Queue for sound fragment events
+        self.q2p = queue.Queue() # queue to the processing thread
+        self.procTh = None # thread running contProcMicAudioData
+        self.dropped = dict(cols=0, events=0) # number of dropped items
+          # due to full queues
+        self.isRunning = False
+
+    #-------------------------------------------------------------------
+
+    async def start(self, chosenDevIdx=0, source=None):
+        """ Start listening and processing threads.
+        When the source reaches its end, the processing thread finishes
+        and so do the async iterators (stop() is still to be called).
+
+        Args:
+            chosenDevIdx (int): Audio device index to open a stream.
+            source (None/ AudioSource, optional): Audio source to listen
+              to, instead of microphone.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("AsyncPyListener.start()")
+        if self.isRunning: return
+        self.loop = asyncio.get_running_loop()
+        self.colQ = asyncio.Queue(maxsize=self.maxCols)
+        self.evtQ = asyncio.Queue(maxsize=self.maxEvents)
+        self.q2p = queue.Queue()
+        self.pl.blockCallbacks.append(self.onBlock)
+        self.pl.sfCallbacks.append(self.onEvent)
+        self.pl.startContMicListening(chosenDevIdx, source)
+        self.procTh = Thread(target=self.procRun)
+        self.procTh.start()
+        self.isRunning = True
+
+    #-------------------------------------------------------------------
+
+    async def stop(self):
+        """ Stop processing and listening threads
+        and finish async iterators.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("AsyncPyListener.stop()")
+        if not self.isRunning: return
+        self.q2p.put(('msg', 'quit'), True, None)
+        await self.loop.run_in_executor(None, self.procTh.join)
+        await self.loop.run_in_executor(None, self.pl.endContMicListening)
+        self.pl.blockCallbacks.remove(self.onBlock)
+        self.pl.sfCallbacks.remove(self.onEvent)
+        self.procTh = None
+        self.isRunning = False
+
+    #-------------------------------------------------------------------
+
+    def procRun(self):
+        """ Function for the processing thread; 
+        runs contProcMicAudioData and lets the async iterators finish
+        when it returns (by stop() or at the end of the source).
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("AsyncPyListener.procRun()")
+        self.pl.contProcMicAudioData(self.q2p)
+        self.loop.call_soon_threadsafe(self.put, self.colQ, None, 'cols')
+        self.loop.call_soon_threadsafe(self.put, self.evtQ, None, 'events')
+
+    #-------------------------------------------------------------------
+
+    def onBlock(self, ad, amp):
+        """ Called in the listening thread with a new spectrogram column.
+
+        Args:
+            ad (numpy.array): Spectrogram column.
+            amp (float): RMS amplitude of the audio block.
+
+        Returns:
+            None
+        """
+        self.loop.call_soon_threadsafe(self.put, self.colQ, (ad, amp), 'cols')
+
+    #-------------------------------------------------------------------
+
+    def onEvent(self, evt):
+        """ Called in the processing thread with a sound fragment event.
+
+        Args:
+            evt (dict): Event of sound fragment.
+
+        Returns:
+            None
+        """
+        self.loop.call_soon_threadsafe(self.put, self.evtQ, evt, 'events')
+
+    #-------------------------------------------------------------------
+
+    def put(self, q, item, key):
+        """ Put an item into a bounded queue (in the event loop);
+        if the queue is full, drop the oldest item.
+
+        Args:
+            q (asyncio.Queue): Queue to put the item.
+            item (): Item to put.
+            key (str): Key in self.dropped for counting dropped items.
+
+        Returns:
+            None
+        """
+        if q.full():
+            q.get_nowait()
+            self.dropped[key] += 1
+        q.put_nowait(item)
+
+    #-------------------------------------------------------------------
+
+    async def columns(self):
+        """ Async iterator of spectrogram columns.
+
+        Yields:
+            (tuple): (spectrogram column (numpy.array), RMS amplitude)
+        """
+        while True:
+            item = await self.colQ.get()
+            if item == None: return
+            yield item
+
+    #-------------------------------------------------------------------
+
+    async def events(self):
+        """ Async iterator of sound fragment events.
+
+        Yields:
+            (dict): Event of sound fragment
+              (see PyListener.contProcMicAudioData).
+        """
+        while True:
+            item = await self.evtQ.get()
+            if item == None: return
+            yield item
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__": pass
+
@@ -0,0 +1,416 @@
+# coding: UTF-8
+
+"""
+pyLAudioSource
+Audio sources for PyListener (pyListenerLib.py).
+Every source delivers blocks of audio data as NumPy arrays
+(mono, int16), so that microphone, WAV file, raw PCM from stdin or
+a FIFO and synthetic signal feed the same processing pipeline.
+This also makes it possible to benchmark and test pyListener
+on a machine without sound card.
+
+Example:
+    import pyListenerLib as PLL
+    from pyLAudioSource import SyntheticSource
+    pl = PLL.PyListener(None, flagMic=False)
+    pl.startContMicListening(source=SyntheticSource('tone', duration=10))
+
+Dependency:
+    NumPy (1.17),
+    pyAudio (0.2), (optional; only for PyAudioSource)
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys
+from time import perf_counter, sleep
+
+import numpy as np
+from pyLWAVFile import WAVFile
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+DEBUG = False
+
+#=======================================================================
+
+class AudioSource(object):
+    """ Base class of audio sources.
+
+    Args:
+        framerate (int): Sampling rate.
+        nchannels (int): Number of channels of the original data.
+          Data is delivered as mono after mixing channels.
+        flagRealtime (bool): Whether to deliver blocks in real time
+          (for sources which are not real time by nature).
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, framerate=44100, nchannels=1, flagRealtime=False):
+        if DEBUG: print("AudioSource.__init__()")
+        self.framerate = framerate # sampling rate
+        self.nchannels = nchannels # number of channels
+        self.nframes = None # number of total frames (None if unknown)
+        self.flagRealtime = flagRealtime # deliver blocks in real time
+        self.speed = 1.0 # speed factor of real-time delivery
+        self.eof = False # whether the source reached its end
+        self.overflows = 0 # number of input overflows
+        self.framesRead = 0 # number of frames delivered
+        self.t0 = None # time (perf_counter) of the first read
+        self.lossless = True # whether the listening thread should wait 
+          # for the processing, instead of dropping blocks
+          # (False for sources, which can't be paused such as microphone)
+
+    #-------------------------------------------------------------------
+
+    def open(self):
+        """ Open the source.
+        """
+        self.eof = False
+        self.framesRead = 0
+        self.t0 = None
+
+    #-------------------------------------------------------------------
+
+    def read(self, nFrames):
+        """ Read a block of audio data.
+
+        Args:
+            nFrames (int): Number of frames to read.
+
+        Returns:
+            (None/ numpy.array): Mono int16 data with nFrames length
+              (a short last block is padded with zeros).
+              None when the source reached its end.
+        """
+        if self.eof: return None
+        if self.flagRealtime: self.pace()
+        data = self.readData(nFrames)
+        if data is None or len(data) == 0:
+            self.eof = True
+            return None
+        data = self.toMono(data)
+        if len(data) < nFrames:
+            data = np.concatenate((data,
+                                   np.zeros(nFrames-len(data), np.int16)))
+        self.framesRead += nFrames
+        return data
+
+    #-------------------------------------------------------------------
+
+    def readData(self, nFrames):
+        """ Read data from the actual source (to be overridden).
+
+        Args:
+            nFrames (int): Number of frames to read.
+
+        Returns:
+            (None/ numpy.array): int16 data; 2D (frames, channels)
+              or 1D (interleaved or mono).
+        """
+        raise NotImplementedError
+
+    #-------------------------------------------------------------------
+
+    def toMono(self, data):
+        """ Mix channels of data into mono int16 data.
+
+        Args:
+            data (numpy.array): int16 data.
+
+        Returns:
+            (numpy.array): Mono int16 data.
+        """
+        if data.ndim == 1 and self.nchannels > 1:
+            data = data[:len(data)-len(data)%self.nchannels]
+            data = data.reshape(-1, self.nchannels)
+        if data.ndim == 2:
+            if data.shape[1] == 1: data = data[:,0]
+            else: data = data.mean(axis=1).astype(np.int16)
+        return data
+
+    #-------------------------------------------------------------------
+
+    def pace(self):
+        """ Wait until the time of the next block to emulate
+        real-time audio input. The schedule is based on the time of
+        the first read, so that timing errors do not accumulate.
+        It sleeps until shortly before the scheduled time, then 
+        busy-waits for the rest, since sleep() can oversleep
+        by more than a millisecond.
+        """
+        now = perf_counter()
+        if self.t0 == None: self.t0 = now
+        t = self.t0 + self.framesRead/(self.framerate*self.speed)
+        if t - now > 0.002: sleep(t-now-0.001)
+        while perf_counter() < t: pass
+
+    #-------------------------------------------------------------------
+
+    def getReadAvailable(self):
+        """ Number of frames, which are waiting to be read.
+        """
+        return 0
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close the source.
+        """
+        pass
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class PyAudioSource(AudioSource):
+    """ Audio input device, using pyAudio.
+
+    Args:
+        pa (pyaudio.PyAudio): PyAudio object.
+        devIdx (int): Input device index.
+        framerate (int): Sampling rate.
+        framesPerBuffer (int): Frames per buffer of the stream.
+    """
+    def __init__(self, pa, devIdx, framerate, framesPerBuffer):
+        if DEBUG: print("PyAudioSource.__init__()")
+        AudioSource.__init__(self, framerate, 1)
+        self.pa = pa
+        self.devIdx = devIdx # device index
+        self.framesPerBuffer = framesPerBuffer
+        self.stream = None # pyaudio.Stream
+        self.lossless = False
+
+    #-------------------------------------------------------------------
+
+    def open(self):
+        AudioSource.open(self)
+        self.stream = self.pa.open(
+                                format = pyaudio.paInt16,
+                                channels = 1,
+                                rate = self.framerate,
+                                input = True,
+                                input_device_index = self.devIdx,
+                                frames_per_buffer = self.framesPerBuffer,
+                                  )
+
+    #-------------------------------------------------------------------
+
+    def readData(self, nFrames):
+        try:
+            data = self.stream.read(nFrames, exception_on_overflow=True)
+        except IOError as e:
+            if e.errno != pyaudio.paInputOverflowed: raise
+            ### input buffer overflowed; the block is dropped
+            self.overflows += 1
+            data = self.stream.read(nFrames, exception_on_overflow=False)
+        return np.frombuffer(data, dtype=np.int16)
+
+    #-------------------------------------------------------------------
+
+    def getReadAvailable(self):
+        try: return self.stream.get_read_available()
+        except IOError: return 0
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        if self.stream != None: self.stream.close()
+        self.stream = None
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class WAVFileSource(AudioSource):
+    """ WAV file as an audio source. 
+    It's read through memory-map (pyLWAVFile.WAVFile), so the file can
+    be of any size.
+
+    Args:
+        fp (str): File path of WAV file.
+        flagRealtime (bool): Whether to deliver blocks in real time.
+    """
+    def __init__(self, fp, flagRealtime=False):
+        if DEBUG: print("WAVFileSource.__init__()")
+        AudioSource.__init__(self, flagRealtime=flagRealtime)
+        self.fp = fp
+        self.wavData = WAVFile(fp) # memory-mapped WAV file
+        self.framerate = self.wavData.framerate
+        self.nchannels = self.wavData.nchannels
+        self.nframes = self.wavData.nframes
+
+    #-------------------------------------------------------------------
+
+    def open(self):
+        AudioSource.open(self)
+        if self.wavData == None: self.wavData = WAVFile(self.fp)
+
+    #-------------------------------------------------------------------
+
+    def readData(self, nFrames):
+        return self.wavData.read(self.framesRead, nFrames)
+
+    #-------------------------------------------------------------------
+
+    def seek(self, pos):
+        """ Move to a frame position (for offline processing).
+
+        Args:
+            pos (int): Frame position.
+
+        Returns:
+            None
+        """
+        self.framesRead = pos
+        self.eof = False
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        if self.wavData != None: self.wavData.close()
+        self.wavData = None
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class ReplaySource(WAVFileSource):
+    """ WAV file replayed through the live (threaded) path at 1x, 
+    Nx or maximum speed, for load testing.
+    With speed > 0, blocks are delivered on an exact schedule and,
+    like microphone input, dropped when processing falls behind.
+    With speed 0 (maximum), blocks are delivered as fast as the 
+    processing takes them, without dropping.
+
+    Args:
+        fp (str): File path of WAV file.
+        speed (float): Speed factor; 1.0 is real time, 0 is maximum.
+    """
+    def __init__(self, fp, speed=1.0):
+        if DEBUG: print("ReplaySource.__init__()")
+        WAVFileSource.__init__(self, fp, flagRealtime=(speed > 0))
+        self.speed = speed
+        self.lossless = (speed <= 0)
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class PCMPipeSource(AudioSource):
+    """ Raw PCM data (int16, little-endian, interleaved)
+    from stdin or a FIFO (named pipe).
+
+    Args:
+        fp (str): '-' for stdin, otherwise file path of FIFO (or file).
+        framerate (int): Sampling rate.
+        nchannels (int): Number of channels.
+    """
+    def __init__(self, fp='-', framerate=44100, nchannels=1):
+        if DEBUG: print("PCMPipeSource.__init__()")
+        AudioSource.__init__(self, framerate, nchannels)
+        self.fp = fp
+        self.f = None # file object to read
+        self.lossless = False # writer (such as 'arecord') is often live
+
+    #-------------------------------------------------------------------
+
+    def open(self):
+        AudioSource.open(self)
+        if self.fp == '-': self.f = sys.stdin.buffer
+        else: self.f = open(self.fp, 'rb')
+
+    #-------------------------------------------------------------------
+
+    def readData(self, nFrames):
+        buf = bytearray(nFrames*self.nchannels*2)
+        mv = memoryview(buf)
+        n = 0
+        while n < len(buf): # read until the block is full or EOF
+            r = self.f.readinto(mv[n:])
+            if not r: break
+            n += r
+        n -= n % 2
+        return np.frombuffer(buf, dtype='<i2', count=int(n/2)).astype(np.int16)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        if self.f != None and self.fp != '-': self.f.close()
+        self.f = None
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class SyntheticSource(AudioSource):
+    """ Synthetic signal generator.
+
+    Args:
+        kind (str): 'tone', 'noise' or 'silence'.
+        freq (float): Frequency (Hz) of tone.
+        amp (float): Amplitude (0.0-1.0).
+        framerate (int): Sampling rate.
+        duration (None/ float): Total duration in seconds.
+          None means infinite.
+        onDur (None/ float): When given, signal is on for this duration
+          (in seconds) and off for 'offDur', repeatedly.
+        offDur (float): Off duration (in seconds) of the signal.
+        flagRealtime (bool): Whether to deliver blocks in real time.
+        seed (None/ int): Random seed for noise.
+    """
+    def __init__(self, kind='tone', freq=7000.0, amp=0.3, framerate=44100,
+                 duration=None, onDur=None, offDur=1.0, flagRealtime=False,
+                 seed=None):
+        if DEBUG: print("SyntheticSource.__init__()")
+        AudioSource.__init__(self, framerate, 1, flagRealtime)
+        self.kind = kind
+        self.freq = freq
+        self.amp = amp
+        self.onDur = onDur
+        self.offDur = offDur
+        if duration != None: self.nframes = int(duration*framerate)
+        self.rng = np.random.RandomState(seed)
+
+    #-------------------------------------------------------------------
+
+    def readData(self, nFrames):
+        n = nFrames
+        if self.nframes != None: n = min(n, self.nframes-self.framesRead)
+        if n <= 0: return None
+        t = (self.framesRead + np.arange(n)) / float(self.framerate)
+        if self.kind == 'tone':
+            data = np.sin(2*np.pi*self.freq*t)
+        elif self.kind == 'noise':
+            data = self.rng.uniform(-1.0, 1.0, n)
+        else:
+            data = np.zeros(n)
+        if self.onDur != None: # on/off pattern
+            data[(t % (self.onDur+self.offDur)) >= self.onDur] = 0
+        return (data * self.amp * 32767).astype(np.int16)
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__": pass
+
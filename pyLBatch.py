@@ -0,0 +1,1016 @@
+# coding: UTF-8
+
+"""
+pyLBatch
+Batch scanning of WAV files (such as nightly field recordings) with
+a template, using a pool of processes.
+Each worker process loads the template once, then scans files with
+PyListener.scanWAVFile. One JSON record per sound fragment is written
+in the output file (JSON Lines), with file path, offsets, parameters
+and match result. Progress and throughput are reported to stderr.
+With --watch, the template folder is polled and a reloaded template
+is published again; workers use it from their next file.
+
+A checkpoint manifest (output file path + '.manifest') records each
+completed file (with its size and modification time) and the offset of
+the output file after its records. A rerun with the same arguments
+truncates the output to the last committed offset (dropping records of
+an interrupted file) and skips completed files, so an interrupted scan
+can be restarted cheaply and the output doesn't contain duplicates.
+When a completed file was modified (size or modification time) after
+its checkpoint, the output and the manifest are rewritten without
+its records and the file is scanned again, so the output has only
+the records of the latest scan of each file.
+
+For scanning on several hosts, which share only a directory, a work 
+queue in the shared directory can be used (--queue). Files are 
+enqueued as token files, claimed by workers with atomic rename, 
+results are written in a result file (shard) per worker and 
+merged at the end. Claims of crashed workers are requeued after 
+they stop sending heartbeats (--stale).
+
+Usage:
+    python pyLBatch.py -t input/sample_phee -o results.jsonl recordings/2019_*
+    python pyLBatch.py -t input/sample_phee -j 8 --save /data/field/
+    python pyLBatch.py -t input/sample_phee --restart /data/field/
+    python pyLBatch.py -t input/sample_phee --watch 10 /data/field/
+    python pyLBatch.py -t input/sample_phee --queue /shared/q --enqueue /data/field/
+    python pyLBatch.py --queue /shared/q --work -j 8   (on each host)
+    python pyLBatch.py --queue /shared/q --merge -o results.jsonl
+
+Dependency:
+    NumPy (1.17),
+    SciPy (1.3),
+    Scikit-image (0.15),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys, json, argparse, socket
+from os import path, walk, mkdir, devnull, cpu_count, fsync, stat, getpid
+from os import rename, remove, listdir, utime, makedirs
+from glob import glob
+from time import time, sleep
+from hashlib import sha1
+from threading import Thread, Event
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pyListenerLib as PLL
+from pyLWAVFile import WAVFile
+from pyLSharedTemplate import SharedTemplatePublisher, SharedTemplateReader
+from pyLSharedTemplate import shared_memory
+from pyLTemplateWatcher import TemplateWatcher
+from fFuncNClasses import GNU_notice, writeFile, get_time_stamp, chkFPath
+
+__version__ = '0.1'
+DEBUG = False
+
+_pl = None # PyListener of a worker process
+_reader = None # SharedTemplateReader of a worker process
+
+#=======================================================================
+
+def findWAVFiles(inputs):
+    """ Find WAV files from directories, glob patterns or file paths.
+
+    Args:
+        inputs (list): Directory paths (searched recursively),
+          glob patterns or file paths.
+
+    Returns:
+        (list): Sorted file paths of WAV files.
+    """
+    if DEBUG: print("pyLBatch.findWAVFiles()")
+    fps = set()
+    for inp in inputs:
+        if path.isdir(inp):
+            for root, __, files in walk(inp):
+                for fn in files:
+                    if fn.lower().endswith('.wav'):
+                        fps.add(path.join(root, fn))
+        else:
+            for fp in glob(inp, recursive=True):
+                if path.isfile(fp) and fp.lower().endswith('.wav'):
+                    fps.add(fp)
+    return sorted(fps)
+
+#-----------------------------------------------------------------------
+
+def publishTemplate(templFP, logFile):
+    """ Load template in the main process and publish it in shared 
+    memory for worker processes.
+
+    Args:
+        templFP (str): Folder (or file) path of template WAV file(s).
+        logFile (str): File path of log file.
+
+    Returns:
+        (None/ SharedTemplatePublisher): None when shared memory is 
+          not available; then each worker loads template.
+    """
+    if shared_memory == None: return None
+    pl = PLL.PyListener(None, None, logFile, flagMic=False)
+    if path.isdir(templFP): flag = 'templateFolder'
+    else: flag = 'templateFile'
+    pl.templFP = templFP
+    pl.listen(flag=flag, wavFP=templFP)
+    pub = SharedTemplatePublisher()
+    try:
+        pub.publish(pl)
+    except:
+        pub.close()
+        raise
+    return pub
+
+#-----------------------------------------------------------------------
+
+def watchTemplate(pub, templFP, interval, logFile):
+    """ Watch the template folder and publish the template again 
+    (as a new version) whenever it's reloaded, so that worker processes
+    use it from their next file. Files scanned before that keep 
+    the records made with the previous version.
+
+    Args:
+        pub (SharedTemplatePublisher): Publisher of the template.
+        templFP (str): Folder path of template WAV files.
+        interval (float): Polling interval in seconds.
+        logFile (str): File path of log file.
+
+    Returns:
+        (TemplateWatcher): Started watcher; it should be stopped 
+          before the publisher is closed.
+    """
+    pl = PLL.PyListener(None, None, logFile, flagMic=False) # holds
+      # the reloaded template for publishing
+    def onReloaded(params):
+        pl.applyTemplateSwap()
+        v = pub.publish(pl)
+        msg = "%s, [MSG], Template version %i is published.\n"%(
+                                                        get_time_stamp(), v)
+        writeFile(logFile, msg)
+    watcher = TemplateWatcher(templFP, interval, logFile, 
+                              callback=onReloaded)
+    watcher.addListener(pl)
+    watcher.start()
+    return watcher
+
+#-----------------------------------------------------------------------
+
+def initWorker(templFP, logFile, flagQuiet=True, xcorrThr=None,
+               snapName=None):
+    """ Initializer of a worker process; load template once.
+
+    Args:
+        templFP (str): Folder (or file) path of template WAV file(s).
+        logFile (str): File path of log file.
+        flagQuiet (bool): Whether to suppress printing results.
+        xcorrThr (None/ float): When given, sound fragments are detected
+          by template cross-correlation with this score threshold.
+        snapName (None/ str): Name of shared memory (control block) of
+          template published by the main process. When given, 
+          template is attached from it, instead of loading.
+
+    Returns:
+        None
+    """
+    global _pl, _reader
+    if flagQuiet: sys.stdout = open(devnull, 'w')
+    _pl = PLL.PyListener(None, None, logFile, flagMic=False)
+    _pl.nTemplWorkers = 1 # already in a pool of processes
+    _pl.flagPrint = not flagQuiet
+    if snapName != None:
+        _reader = SharedTemplateReader(snapName)
+        _reader.refresh(_pl)
+    else:
+        if path.isdir(templFP): flag = 'templateFolder'
+        else: flag = 'templateFile'
+        _pl.templFP = templFP
+        _pl.listen(flag=flag, wavFP=templFP)
+    if xcorrThr != None:
+        _pl.detectMode = 'xcorr'
+        _pl.xcorrThr = xcorrThr
+
+#-----------------------------------------------------------------------
+
+def scanFile(fp, flagSave=False):
+    """ Scan a WAV file in a worker process.
+
+    Args:
+        fp (str): File path of WAV file.
+        flagSave (bool): Whether to save matched sound fragments.
+
+    Returns:
+        (tuple): (file path, list of fragment records, duration of
+          the file in seconds, error message or None)
+    """
+    if _reader != None: _reader.refresh(_pl) # new version of template
+    try:
+        wf = WAVFile(fp)
+        dur = wf.nframes / float(wf.framerate)
+        wf.close()
+        rslts = _pl.scanWAVFile(fp, flagSave=flagSave)
+    except (ValueError, OSError) as e:
+        return fp, [], 0.0, str(e)
+    recs = []
+    for r in rslts:
+        rec = dict(file=fp,
+                   startFrame=r['startCol']*PLL.INPUT_FRAMES_PER_BLOCK,
+                   endFrame=r['endCol']*PLL.INPUT_FRAMES_PER_BLOCK)
+        rec.update(r)
+        recs.append(rec)
+    return fp, recs, dur, None
+
+#-----------------------------------------------------------------------
+
+def toJSON(rec):
+    """ Convert a fragment record to a JSON string
+    (NumPy numbers are converted to Python numbers).
+
+    Args:
+        rec (dict): Fragment record.
+
+    Returns:
+        (str): JSON string.
+    """
+    return json.dumps(rec, sort_keys=True,
+                      default=lambda o: o.item() if hasattr(o, 'item') \
+                                                 else str(o))
+
+#=======================================================================
+
+class BatchScanner(object):
+    """ Class for scanning many WAV files with a process pool.
+
+    Args:
+        templFP (str): Folder (or file) path of template WAV file(s).
+        outFP (str): File path of output (JSON Lines) file.
+        nWorkers (int): Number of worker processes.
+        logFile (str): File path of log file.
+        flagSave (bool): Whether to save matched sound fragments.
+        flagResume (bool): Whether to resume from the checkpoint manifest.
+          If False, output and manifest are started over.
+        xcorrThr (None/ float): When given, sound fragments are detected
+          by template cross-correlation with this score threshold.
+        watchInterval (None/ float): When given (and templFP is 
+          a folder), the template folder is polled with this interval 
+          (in seconds) and a reloaded template is used from the next 
+          file.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, templFP, outFP, nWorkers=None, logFile='',
+                 flagSave=False, flagResume=True, xcorrThr=None,
+                 watchInterval=None):
+        if DEBUG: print("BatchScanner.__init__()")
+        self.templFP = templFP # template folder (or file) path
+        self.outFP = outFP # output file path
+        if nWorkers == None: nWorkers = cpu_count()
+        self.nWorkers = nWorkers # number of worker processes
+        if logFile == '':
+            logFile = "log/log_%s.txt"%(get_time_stamp()[:-9])
+        self.logFile = logFile
+        self.flagSave = flagSave
+        self.flagResume = flagResume
+        self.xcorrThr = xcorrThr # score threshold of 'xcorr' detection
+        self.watchInterval = watchInterval # polling interval of
+          # template folder; None means no watching
+        self.manifestFP = outFP + '.manifest' # checkpoint manifest
+        self.fManifest = None # manifest file object
+        self.manifestLen = 0 # length of valid entries in manifest
+        self.nFiles = 0 # number of processed files
+        self.nFrags = 0 # number of written fragment records
+        self.nMatched = 0 # number of matched fragments
+        self.nErrors = 0 # number of files failed to be scanned
+        self.audioDur = 0.0 # total duration of processed audio
+        self.startTime = None
+
+    #-------------------------------------------------------------------
+
+    def run(self, fps):
+        """ Scan files and write records.
+
+        Args:
+            fps (list): File paths of WAV files.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("BatchScanner.run()")
+        if path.isdir('log') == False: mkdir('log')
+        if self.flagSave and path.isdir('recordings') == False:
+            mkdir('recordings')
+        self.startTime = time()
+        done, offset = self.loadManifest()
+        if self.flagResume and len(done) > 0: 
+        # resume; skip completed files and drop records written after 
+        # the last checkpoint (and records of modified files)
+            modified = [path.abspath(fp) for fp in fps \
+                          if path.abspath(fp) in done \
+                            and not self.isDone(fp, done)]
+            if modified != []: offset = self.dropFiles(done, modified)
+            fps = [fp for fp in fps if not self.isDone(fp, done)]
+            with open(self.outFP, 'a') as f: f.truncate(offset)
+            with open(self.manifestFP, 'a') as f: f.truncate(self.manifestLen)
+            fOut = open(self.outFP, 'a')
+        else:
+            fOut = open(self.outFP, 'w')
+            self.fManifest = open(self.manifestFP, 'w')
+            self.writeManifest(dict(template=path.abspath(self.templFP),
+                                    xcorr=self.xcorrThr))
+        if self.fManifest == None: self.fManifest = open(self.manifestFP, 'a')
+        msg = "%s, [MSG], Batch scan of %i file(s)"%(get_time_stamp(),
+                                                     len(fps))
+        if len(done) > 0 and self.flagResume:
+            msg += " (%i completed file(s) skipped)"%(len(done))
+        msg += " with %i worker(s) started.\n"%(self.nWorkers)
+        writeFile(self.logFile, msg)
+        pub = None
+        watcher = None
+        try:
+            pub = publishTemplate(self.templFP, self.logFile)
+            if pub == None: snapName = None
+            else: snapName = pub.prefix
+            if pub != None and self.watchInterval != None \
+              and path.isdir(self.templFP):
+                watcher = watchTemplate(pub, self.templFP, 
+                                        self.watchInterval, self.logFile)
+            with ProcessPoolExecutor(max_workers=self.nWorkers,
+                                     initializer=initWorker,
+                                     initargs=(self.templFP, self.logFile, 
+                                               True, self.xcorrThr, 
+                                               snapName)) as ex:
+                futures = [ex.submit(scanFile, fp, self.flagSave) \
+                             for fp in fps]
+                for fu in as_completed(futures):
+                    fp, recs, dur, err = fu.result()
+                    self.onFileDone(fOut, fp, recs, dur, err, len(fps))
+        finally:
+        # shared memory blocks are unlinked also after an error 
+        # (or KeyboardInterrupt)
+            if watcher != None: watcher.stop()
+            if pub != None: pub.close()
+            fOut.close()
+            self.fManifest.close()
+        msg = "%s, [MSG], Batch scan finished;"%(get_time_stamp())
+        msg += " %s\n"%(self.progressStr(len(fps)))
+        writeFile(self.logFile, msg)
+        sys.stderr.write("\n")
+
+    #-------------------------------------------------------------------
+
+    def loadManifest(self):
+        """ Load checkpoint manifest of a previous run.
+
+        Args: None
+
+        Returns:
+            done (dict): Completed files; key is absolute file path and 
+              value is its manifest entry.
+            offset (int): Offset of output file at the last checkpoint.
+        """
+        if DEBUG: print("BatchScanner.loadManifest()")
+        done = {}
+        offset = 0
+        if not self.flagResume or not path.isfile(self.manifestFP) \
+          or not path.isfile(self.outFP):
+            return done, offset
+        with open(self.manifestFP, 'rb') as f:
+            for line in f:
+                try: entry = json.loads(line.decode('utf-8'))
+                except ValueError: break # partially written last line
+                self.manifestLen += len(line)
+                if 'template' in entry:
+                    if entry['template'] != path.abspath(self.templFP):
+                        msg = "Manifest %s was made with"%(self.manifestFP)
+                        msg += " a different template, %s."%(entry['template'])
+                        msg += " Use --restart to start over."
+                        raise ValueError(msg)
+                    if entry.get('xcorr') != self.xcorrThr:
+                        msg = "Manifest %s was made with"%(self.manifestFP)
+                        msg += " a different detection (--xcorr %s)."%(
+                                                            entry.get('xcorr'))
+                        msg += " Use --restart to start over."
+                        raise ValueError(msg)
+                    continue
+                done[entry['file']] = entry
+                offset = entry['offset']
+        return done, offset
+
+    #-------------------------------------------------------------------
+
+    def isDone(self, fp, done):
+        """ Whether a file was completed (and not modified after).
+
+        Args:
+            fp (str): File path.
+            done (dict): Completed files (see loadManifest).
+
+        Returns:
+            (bool): Whether the file was completed.
+        """
+        entry = done.get(path.abspath(fp))
+        if entry == None: return False
+        st = stat(fp)
+        return entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+
+    #-------------------------------------------------------------------
+
+    def dropFiles(self, done, drops):
+        """ Rewrite output and manifest without records of given 
+        completed files (e.g. files modified after their checkpoint).
+        Records of a completed file are in the output between the offset
+        of the previous manifest entry and its own offset.
+        The old manifest is removed before the output is replaced, so
+        an interruption leaves the old pair, the new pair or no manifest
+        (then the next run starts over).
+
+        Args:
+            done (dict): Completed files (see loadManifest); entries of 
+              dropped files are removed and offsets of the others are
+              updated.
+            drops (list): Absolute file paths to drop.
+
+        Returns:
+            (int): Offset of output file at the last checkpoint.
+        """
+        if DEBUG: print("BatchScanner.dropFiles()")
+        tmpOutFP = self.outFP + '.tmp'
+        tmpManifestFP = self.manifestFP + '.tmp'
+        offset = 0
+        prev = 0 # offset of the previous entry in the old output
+        with open(self.outFP, 'rb') as fIn, open(tmpOutFP, 'wb') as fOut:
+            for fp in list(done.keys()):
+                entry = done.pop(fp)
+                fIn.seek(prev)
+                data = fIn.read(entry['offset']-prev)
+                prev = entry['offset']
+                if fp in drops: continue
+                fOut.write(data)
+                offset = fOut.tell()
+                done[fp] = dict(entry, offset=offset)
+            fOut.flush()
+            fsync(fOut.fileno())
+        with open(tmpManifestFP, 'w') as f:
+            f.write(json.dumps(dict(template=path.abspath(self.templFP),
+                                    xcorr=self.xcorrThr)) + "\n")
+            for entry in done.values(): f.write(json.dumps(entry) + "\n")
+            f.flush()
+            fsync(f.fileno())
+        remove(self.manifestFP)
+        rename(tmpOutFP, self.outFP)
+        rename(tmpManifestFP, self.manifestFP)
+        self.manifestLen = stat(self.manifestFP).st_size
+        msg = "%s, [MSG], Records of %i modified file(s)"%(get_time_stamp(),
+                                                           len(drops))
+        msg += " were dropped from %s; they are scanned again.\n"%(
+                                                                self.outFP)
+        writeFile(self.logFile, msg)
+        return offset
+
+    #-------------------------------------------------------------------
+
+    def writeManifest(self, entry):
+        """ Append an entry to the manifest and flush it to disk.
+
+        Args:
+            entry (dict): Manifest entry.
+
+        Returns:
+            None
+        """
+        self.fManifest.write(json.dumps(entry) + "\n")
+        self.fManifest.flush()
+        fsync(self.fManifest.fileno())
+
+    #-------------------------------------------------------------------
+
+    def onFileDone(self, fOut, fp, recs, dur, err, nTotal):
+        """ Write records of a scanned file and report progress.
+
+        Args:
+            fOut (file): Output file.
+            fp (str): File path of the scanned file.
+            recs (list): Fragment records.
+            dur (float): Duration of the file in seconds.
+            err (None/ str): Error message.
+            nTotal (int): Number of total files.
+
+        Returns:
+            None
+        """
+        self.nFiles += 1
+        if err != None:
+            self.nErrors += 1
+            msg = "%s, [ERROR], %s\n"%(get_time_stamp(), err)
+            writeFile(self.logFile, msg)
+        for rec in recs:
+            fOut.write(toJSON(rec) + "\n")
+            if rec['matched'] == True: self.nMatched += 1
+        fOut.flush()
+        if err == None:
+        # checkpoint; records are on disk before the manifest entry
+            fsync(fOut.fileno())
+            st = stat(fp)
+            self.writeManifest(dict(file=path.abspath(fp), size=st.st_size,
+                                    mtime=st.st_mtime, nFrags=len(recs),
+                                    offset=fOut.tell()))
+        self.nFrags += len(recs)
+        self.audioDur += dur
+        sys.stderr.write("\r" + self.progressStr(nTotal))
+        sys.stderr.flush()
+
+    #-------------------------------------------------------------------
+
+    def progressStr(self, nTotal):
+        """ Make a string of progress and throughput.
+
+        Args:
+            nTotal (int): Number of total files.
+
+        Returns:
+            (str): Progress string.
+        """
+        el = max(time() - self.startTime, 1e-6)
+        txt = "%i/%i files"%(self.nFiles, nTotal)
+        txt += ", %i fragments (%i matched)"%(self.nFrags, self.nMatched)
+        if self.nErrors > 0: txt += ", %i errors"%(self.nErrors)
+        txt += ", %.1f files/s"%(self.nFiles/el)
+        txt += ", %.1fx real time"%(self.audioDur/el)
+        txt += ", elapsed %.1f s"%(el)
+        return txt
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class WorkQueue(object):
+    """ Work queue of WAV files in a (shared) directory.
+    No service is required; only atomic rename of the file system.
+
+    Directory structure:
+        config.json: template path and detection setting (xcorr).
+        todo/TOKEN.json: Files to scan; content is {"file": path}.
+        claimed/TOKEN.WORKER.json: Files being scanned by WORKER.
+          Its modification time is updated as heartbeat.
+        done/TOKEN.json: Scanned files; content includes the worker 
+          and byte range of the records in the worker's shard.
+        results/WORKER.jsonl: Records written by WORKER (shard).
+
+    Args:
+        qDir (str): Directory path of the queue.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, qDir):
+        if DEBUG: print("WorkQueue.__init__()")
+        self.qDir = qDir # queue directory
+        self.dirs = {} # sub-directories
+        for key in ['todo', 'claimed', 'done', 'results']:
+            self.dirs[key] = path.join(qDir, key)
+            makedirs(self.dirs[key], exist_ok=True)
+        self.configFP = path.join(qDir, 'config.json')
+
+    #-------------------------------------------------------------------
+
+    def enqueue(self, fps, templFP, xcorrThr=None):
+        """ Add files to the queue. A file, which is already in the queue 
+        (in any state), is not added again.
+
+        Args:
+            fps (list): File paths of WAV files.
+            templFP (str): Folder (or file) path of template WAV file(s).
+            xcorrThr (None/ float): When given, sound fragments are 
+              detected by template cross-correlation with this score
+              threshold.
+
+        Returns:
+            (int): Number of added files.
+        """
+        if DEBUG: print("WorkQueue.enqueue()")
+        with open(self.configFP, 'w') as f:
+            json.dump(dict(template=path.abspath(templFP), xcorr=xcorrThr), f)
+        existing = set(self.tokens('todo') + self.tokens('done'))
+        existing.update(self.tokens('claimed'))
+        n = 0
+        for fp in fps:
+            fp = path.abspath(fp)
+            token = sha1(fp.encode('utf-8')).hexdigest()[:20]
+            if token in existing: continue
+            self.writeAtomic(path.join(self.dirs['todo'], token+'.json'), 
+                             dict(file=fp))
+            existing.add(token)
+            n += 1
+        return n
+
+    #-------------------------------------------------------------------
+
+    def tokens(self, key):
+        """ List tokens in a sub-directory.
+
+        Args:
+            key (str): 'todo', 'claimed' or 'done'.
+
+        Returns:
+            (list): Sorted tokens.
+        """
+        return sorted([fn.split('.')[0] for fn in listdir(self.dirs[key]) \
+                                        if fn.endswith('.json')])
+
+    #-------------------------------------------------------------------
+
+    def writeAtomic(self, fp, obj):
+        """ Write a JSON file atomically (write a temporary file, 
+        then rename).
+
+        Args:
+            fp (str): File path.
+            obj (dict): Object to write.
+
+        Returns:
+            None
+        """
+        tmpFP = "%s.%s_%i.tmp"%(fp, socket.gethostname(), getpid())
+        with open(tmpFP, 'w') as f:
+            json.dump(obj, f)
+            f.flush()
+            fsync(f.fileno())
+        rename(tmpFP, fp)
+
+    #-------------------------------------------------------------------
+
+    def claim(self, wID):
+        """ Claim a file to scan.
+
+        Args:
+            wID (str): Worker ID.
+
+        Returns:
+            (None/ tuple): None if there's no file to claim. Otherwise,
+              (token, file path of the claimed token, WAV file path).
+        """
+        for token in self.tokens('todo'):
+            src = path.join(self.dirs['todo'], token+'.json')
+            dst = path.join(self.dirs['claimed'], "%s.%s.json"%(token, wID))
+            try: rename(src, dst) # only one worker succeeds
+            except OSError: continue # claimed by another worker
+            if path.isfile(path.join(self.dirs['done'], token+'.json')):
+            # already done (requeued after the worker committed)
+                remove(dst)
+                continue
+            with open(dst, 'r') as f: fp = json.load(f)['file']
+            utime(dst) # the first heartbeat
+            return token, dst, fp
+        return None
+
+    #-------------------------------------------------------------------
+
+    def commit(self, token, claimFP, wID, fp, offsets, err=None):
+        """ Mark a claimed file as done.
+
+        Args:
+            token (str): Token of the file.
+            claimFP (str): File path of the claimed token.
+            wID (str): Worker ID.
+            fp (str): WAV file path.
+            offsets (tuple): Start and end byte offsets of its records
+              in the worker's shard.
+            err (None/ str): Error message.
+
+        Returns:
+            None
+        """
+        entry = dict(file=fp, worker=wID, start=offsets[0], end=offsets[1])
+        if err != None: entry['error'] = err
+        self.writeAtomic(path.join(self.dirs['done'], token+'.json'), entry)
+        try: remove(claimFP)
+        except OSError: pass
+
+    #-------------------------------------------------------------------
+
+    def requeueStale(self, staleTime):
+        """ Move claims, which didn't get heartbeat for 'staleTime' 
+        seconds (the worker probably crashed), back to 'todo'.
+
+        Args:
+            staleTime (float): Time (in seconds) to consider a claim stale.
+
+        Returns:
+            (int): Number of requeued files.
+        """
+        n = 0
+        now = time()
+        for fn in listdir(self.dirs['claimed']):
+            if not fn.endswith('.json'): continue
+            cFP = path.join(self.dirs['claimed'], fn)
+            token = fn.split('.')[0]
+            try:
+                if now - stat(cFP).st_mtime < staleTime: continue
+                if path.isfile(path.join(self.dirs['done'], token+'.json')):
+                    remove(cFP)
+                else:
+                    rename(cFP, path.join(self.dirs['todo'], token+'.json'))
+                    n += 1
+            except OSError: # renamed or removed by another worker
+                continue
+        return n
+
+    #-------------------------------------------------------------------
+
+    def status(self):
+        """ Number of files in each state.
+
+        Returns:
+            (dict): Numbers of 'todo', 'claimed' and 'done' files.
+        """
+        return dict(todo=len(self.tokens('todo')), 
+                    claimed=len(self.tokens('claimed')),
+                    done=len(self.tokens('done')))
+
+    #-------------------------------------------------------------------
+
+    def merge(self, outFP):
+        """ Merge records of all done files from shards into a file.
+        Only the byte range recorded at commit is taken from each shard,
+        so records of interrupted attempts are ignored.
+
+        Args:
+            outFP (str): Output file path (JSON Lines).
+
+        Returns:
+            (int): Number of merged files.
+        """
+        if DEBUG: print("WorkQueue.merge()")
+        entries = []
+        for token in self.tokens('done'):
+            with open(path.join(self.dirs['done'], token+'.json'), 'r') as f:
+                entries.append(json.load(f))
+        entries.sort(key=lambda e: e['file'])
+        shards = {}
+        with open(outFP, 'wb') as fOut:
+            for e in entries:
+                if e['end'] <= e['start']: continue
+                if not e['worker'] in shards:
+                    sFP = path.join(self.dirs['results'], e['worker']+'.jsonl')
+                    shards[e['worker']] = open(sFP, 'rb')
+                f = shards[e['worker']]
+                f.seek(e['start'])
+                fOut.write(f.read(e['end']-e['start']))
+        for f in shards.values(): f.close()
+        return len(entries)
+
+    #-------------------------------------------------------------------
+
+#-----------------------------------------------------------------------
+
+def queueWorker(qDir, flagSave=False, staleTime=600.0):
+    """ Worker loop on a work queue (in a process initialized with 
+    initWorker); claim a file, scan it, write its records in the shard
+    and commit, until there's no file left.
+
+    Args:
+        qDir (str): Directory path of the queue.
+        flagSave (bool): Whether to save matched sound fragments.
+        staleTime (float): Time (in seconds) to consider a claim stale.
+
+    Returns:
+        (tuple): Number of scanned files and duration (in seconds) of
+          scanned audio.
+    """
+    q = WorkQueue(qDir)
+    wID = "%s_%i"%(socket.gethostname(), getpid())
+    nFiles = 0
+    audioDur = 0.0
+    sFP = path.join(q.dirs['results'], wID+'.jsonl')
+    with open(sFP, 'a') as fShard:
+        while True:
+            c = q.claim(wID)
+            if c == None:
+                if q.requeueStale(staleTime) == 0: break
+                continue
+            token, claimFP, fp = c
+            ### keep touching the claim while scanning
+            stopEvt = Event()
+            def heartbeat():
+                while not stopEvt.wait(staleTime/4.0):
+                    try: utime(claimFP)
+                    except OSError: break
+            th = Thread(target=heartbeat, daemon=True)
+            th.start()
+            __, recs, dur, err = scanFile(fp, flagSave)
+            stopEvt.set()
+            th.join()
+            start = fShard.tell()
+            for rec in recs: fShard.write(toJSON(rec) + "\n")
+            fShard.flush()
+            fsync(fShard.fileno())
+            q.commit(token, claimFP, wID, fp, (start, fShard.tell()), err)
+            nFiles += 1
+            audioDur += dur
+    return nFiles, audioDur
+
+#-----------------------------------------------------------------------
+
+def runQueueWorkers(qDir, templFP, nWorkers, logFile, flagSave, staleTime,
+                    xcorrThr=None, watchInterval=None):
+    """ Run local worker processes on a work queue, reporting progress,
+    until the queue is empty.
+
+    Args:
+        qDir (str): Directory path of the queue.
+        templFP (str): Folder (or file) path of template WAV file(s).
+        nWorkers (int): Number of worker processes.
+        logFile (str): File path of log file.
+        flagSave (bool): Whether to save matched sound fragments.
+        staleTime (float): Time (in seconds) to consider a claim stale.
+        xcorrThr (None/ float): When given, sound fragments are detected
+          by template cross-correlation with this score threshold.
+        watchInterval (None/ float): When given (and templFP is 
+          a folder), the template folder is polled with this interval 
+          (in seconds) and a reloaded template is used from the next 
+          file.
+
+    Returns:
+        None
+    """
+    q = WorkQueue(qDir)
+    if nWorkers == None: nWorkers = cpu_count()
+    startTime = time()
+    pub = None
+    watcher = None
+    try:
+        pub = publishTemplate(templFP, logFile)
+        if pub == None: snapName = None
+        else: snapName = pub.prefix
+        if pub != None and watchInterval != None and path.isdir(templFP):
+            watcher = watchTemplate(pub, templFP, watchInterval, logFile)
+        with ProcessPoolExecutor(max_workers=nWorkers, 
+                                 initializer=initWorker,
+                                 initargs=(templFP, logFile, True, 
+                                           xcorrThr, snapName)) as ex:
+            futures = [ex.submit(queueWorker, qDir, flagSave, staleTime) \
+                         for i in range(nWorkers)]
+            nFiles = 0
+            audioDur = 0.0
+            while True:
+                pending = [fu for fu in futures if not fu.done()]
+                st = q.status()
+                el = max(time()-startTime, 1e-6)
+                txt = "todo %i, claimed %i, done %i"%(st['todo'], 
+                                                      st['claimed'],
+                                                      st['done'])
+                txt += ", elapsed %.1f s"%(el)
+                if pending == []:
+                    for fu in futures:
+                        n, d = fu.result()
+                        nFiles += n
+                        audioDur += d
+                    txt += ", %i file(s) scanned here"%(nFiles)
+                    txt += ", %.1f files/s, %.1fx real time"%(nFiles/el, 
+                                                              audioDur/el)
+                    sys.stderr.write("\r" + txt + "\n")
+                    break
+                sys.stderr.write("\r" + txt)
+                sys.stderr.flush()
+                sleep(1)
+    finally:
+    # shared memory blocks are unlinked also after an error 
+    # (or KeyboardInterrupt)
+        if watcher != None: watcher.stop()
+        if pub != None: pub.close()
+    msg = "%s, [MSG], Queue worker(s) finished; %s\n"%(get_time_stamp(), txt)
+    writeFile(logFile, msg)
+
+#=======================================================================
+
+def main(argv=None):
+    """ Parse command-line arguments and run the batch scan.
+
+    Args:
+        argv (None/ list, optional): Command-line arguments.
+
+    Returns:
+        (int): Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Batch scan with pyListener")
+    parser.add_argument('inputs', nargs='*',
+                        help="Directories, glob patterns or WAV files")
+    parser.add_argument('-t', '--template',
+                        help="Folder (or file) path of template WAV file(s)")
+    parser.add_argument('-o', '--output', default='batch_results.jsonl',
+                        help="Output file path (JSON Lines)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Number of worker processes (default: number"
+                             " of CPUs)")
+    parser.add_argument('-l', '--log', default='', help="Log file path")
+    parser.add_argument('--save', action='store_true',
+                        help="Save matched sound fragments as WAV files")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore checkpoint manifest and start over")
+    parser.add_argument('--xcorr', type=float, default=None, metavar='THR',
+                        help="Detect sound fragments by sliding template"
+                             " spectrogram (normalized cross-correlation"
+                             " score above THR), instead of amplitude"
+                             " gating")
+    parser.add_argument('--queue', 
+                        help="Directory of a work queue (can be shared by"
+                             " several hosts)")
+    parser.add_argument('--enqueue', action='store_true',
+                        help="Add input files to the work queue")
+    parser.add_argument('--work', action='store_true',
+                        help="Run worker(s) on the work queue")
+    parser.add_argument('--merge', action='store_true',
+                        help="Merge results of the work queue into output")
+    parser.add_argument('--watch', type=float, default=None, metavar='SEC',
+                        help="Poll the template folder every SEC seconds"
+                             " and use a reloaded template from the next"
+                             " file")
+    parser.add_argument('--stale', type=float, default=600.0,
+                        help="Time (in seconds) without heartbeat, after"
+                             " which a claimed file is requeued")
+    parser.add_argument('-w', action='store_true', help="Show warranty")
+    parser.add_argument('-c', action='store_true', help="Show conditions")
+    args = parser.parse_args(argv)
+
+    if args.w: GNU_notice(1); return 0
+    if args.c: GNU_notice(2); return 0
+    GNU_notice(0)
+
+    if args.queue != None: return queueMain(parser, args)
+    if args.template == None: parser.error("-t/--template is required.")
+    chkFPath(args.template)
+    fps = findWAVFiles(args.inputs)
+    if fps == []: parser.error("No WAV files were found.")
+    bs = BatchScanner(args.template, args.output, args.workers, args.log,
+                      args.save, not args.restart, args.xcorr, args.watch)
+    try:
+        bs.run(fps)
+    except ValueError as e:
+        print(e)
+        return 1
+    return 0
+
+#-----------------------------------------------------------------------
+
+def queueMain(parser, args):
+    """ Run a work queue command (--enqueue, --work or --merge).
+
+    Args:
+        parser (argparse.ArgumentParser): Argument parser.
+        args (argparse.Namespace): Parsed arguments.
+
+    Returns:
+        (int): Exit code.
+    """
+    q = WorkQueue(args.queue)
+    logFile = args.log
+    if logFile == '': logFile = "log/log_%s.txt"%(get_time_stamp()[:-9])
+    if path.isdir('log') == False: mkdir('log')
+    if args.enqueue:
+        if args.template == None: parser.error("-t/--template is required.")
+        chkFPath(args.template)
+        fps = findWAVFiles(args.inputs)
+        n = q.enqueue(fps, args.template, args.xcorr)
+        print("%i file(s) were added to the queue, %s."%(n, args.queue))
+    if args.work:
+        with open(q.configFP, 'r') as f: config = json.load(f)
+        templFP = args.template
+        if templFP == None: templFP = config['template'] # template of 
+          # the queue
+        chkFPath(templFP)
+        if args.save and path.isdir('recordings') == False:
+            mkdir('recordings')
+        runQueueWorkers(args.queue, templFP, args.workers, logFile, 
+                        args.save, args.stale, config.get('xcorr'),
+                        args.watch)
+    if args.merge:
+        st = q.status()
+        if st['todo'] > 0 or st['claimed'] > 0:
+            print("Warning: %i file(s) are not done yet."%(st['todo'] + 
+                                                           st['claimed']))
+        n = q.merge(args.output)
+        print("Records of %i file(s) were merged into %s."%(n, args.output))
+    return 0
+
+#=======================================================================
+
+if __name__ == "__main__":
+    sys.exit(main())
+
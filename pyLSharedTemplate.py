@@ -0,0 +1,297 @@
+# coding: UTF-8
+
+"""
+pyLSharedTemplate
+Loaded template (spectrogram, parameters, min. and max. values of
+comparison parameters as arrays and max. value of auto-correlation of
+the spectrogram) published in shared memory as a versioned, read-only
+snapshot. Worker processes attach to it once and use NumPy arrays on
+the shared memory directly (no copy, no pickling per task), instead
+of forming (or loading) the template in each process. When the template
+is published again (e.g. after reloading), workers pick up the new
+version at their next refresh.
+
+A control block (named after the prefix) has the current version and
+the name of the data block of the version. A data block has a header
+(JSON) and arrays.
+
+Example:
+    pub = SharedTemplatePublisher() # in the main process
+    pub.publish(pl)
+    ...
+    reader = SharedTemplateReader(pub.prefix) # in a worker process
+    reader.refresh(_pl) # _pl has the published template now
+    ...
+    pub.close()
+
+Dependency:
+    NumPy (1.17),
+    Python (3.8); multiprocessing.shared_memory
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys, json
+from os import getpid
+from time import sleep
+
+import numpy as np
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python < 3.8; templates are not shared
+    shared_memory = None
+
+import pyListenerLib as PLL
+
+DEBUG = False
+CTL_SIZE = 64 # size of control block; version (int64) and name of
+  # the data block
+ALIGN = 64 # alignment (in bytes) of arrays in a data block
+
+#=======================================================================
+
+def attachSharedMemory(name):
+    """ Attach to an existing shared memory block (the publisher 
+    unlinks it). Before Python 3.13, attaching registers the block 
+    to the resource tracker again, which is harmless for child 
+    processes of the publisher, as they share its resource tracker.
+
+    Args:
+        name (str): Name of the shared memory block.
+
+    Returns:
+        (SharedMemory): Attached shared memory block.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    return shared_memory.SharedMemory(name)
+
+#=======================================================================
+
+class SharedTemplatePublisher(object):
+    """ Publisher of template snapshots in shared memory.
+
+    Args:
+        prefix (None/ str, optional): Name of the control block and
+          prefix of names of data blocks. None means a name with
+          the process ID.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, prefix=None):
+        if DEBUG: print("SharedTemplatePublisher.__init__()")
+        if prefix == None: prefix = "pyl_templ_%i"%(getpid())
+        self.prefix = prefix # name of the control block
+        self.ctl = shared_memory.SharedMemory(prefix, create=True,
+                                              size=CTL_SIZE) # control block
+        self.ctlArr = np.ndarray((1,), dtype=np.int64, buffer=self.ctl.buf)
+          # version in the control block
+        self.ctlArr[0] = 0 # 0 means nothing is published yet
+        self.version = 0 # version of the last published snapshot
+        self.shm = None # data block of the last published snapshot
+
+    #-------------------------------------------------------------------
+
+    def publish(self, pl):
+        """ Publish the current template of a PyListener as a new version.
+
+        Args:
+            pl (PyListener): PyListener, which has a loaded template.
+
+        Returns:
+            (int): Version of the published snapshot.
+        """
+        if DEBUG: print("SharedTemplatePublisher.publish()")
+        version = self.version + 1
+        name = "%s_v%i"%(self.prefix, version)
+        keys = list(pl.compParamList)
+        arrs = dict(tSpAD=np.ascontiguousarray(pl.tSpAD),
+                    mins=np.array([pl.templP[k+'_min'] for k in keys],
+                                  dtype=np.float64),
+                    maxs=np.array([pl.templP[k+'_max'] for k in keys],
+                                  dtype=np.float64))
+        ### header and offsets of arrays
+        header = dict(version=version, framerate=PLL.RATE,
+                      templFP=pl.templFP, keys=keys, templP=pl.templP,
+                      acMax=pl.templAutoCorrMax(), arrays={})
+        offset = 0
+        for key in sorted(arrs.keys()):
+            a = arrs[key]
+            header['arrays'][key] = [offset, a.dtype.str, list(a.shape)]
+            offset += -(-a.nbytes//ALIGN) * ALIGN
+        hd = json.dumps(header, default=PLL.toBuiltin).encode('utf-8')
+        base = -(-(8+len(hd))//ALIGN) * ALIGN # beginning of arrays
+        shm = shared_memory.SharedMemory(name, create=True,
+                                         size=max(base+offset, 1))
+        np.ndarray((1,), dtype=np.uint64, buffer=shm.buf)[0] = len(hd)
+        shm.buf[8:8+len(hd)] = hd
+        for key in arrs:
+            o, dt, shape = header['arrays'][key]
+            a = np.ndarray(shape, dtype=dt, buffer=shm.buf, offset=base+o)
+            a[...] = arrs[key]
+            del a
+        ### switch version in the control block; -1 while writing name
+        self.ctlArr[0] = -1
+        nb = name.encode('ascii')
+        self.ctl.buf[8:CTL_SIZE] = nb + b'\0'*(CTL_SIZE-8-len(nb))
+        self.ctlArr[0] = version
+        ### old block is unlinked; readers attached to it keep
+        ### its memory until they close it
+        if self.shm != None:
+            self.shm.close()
+            self.shm.unlink()
+        self.shm = shm
+        self.version = version
+        return version
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Unlink the control block and the last data block.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("SharedTemplatePublisher.close()")
+        if self.shm != None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+        del self.ctlArr
+        self.ctl.close()
+        self.ctl.unlink()
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class SharedTemplateReader(object):
+    """ Reader of template snapshots in shared memory (in a worker
+    process).
+
+    Args:
+        prefix (str): Name of the control block.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, prefix):
+        if DEBUG: print("SharedTemplateReader.__init__()")
+        self.prefix = prefix # name of the control block
+        self.ctl = attachSharedMemory(prefix) # control block
+        self.ctlArr = np.ndarray((1,), dtype=np.int64, buffer=self.ctl.buf)
+          # version in the control block
+        self.version = 0 # version of the current snapshot
+        self.shm = None # data block of the current snapshot
+        self.oldShm = [] # data blocks of old snapshots, which couldn't
+          # be closed yet (arrays on them are still used)
+        self.header = None # header of the current snapshot
+        self.arrays = {} # read-only arrays of the current snapshot
+
+    #-------------------------------------------------------------------
+
+    def refresh(self, pl):
+        """ Attach to the current version (if it's new) and set
+        the template of a PyListener.
+
+        Args:
+            pl (PyListener): PyListener to set template.
+
+        Returns:
+            (bool): Whether a new version was set.
+        """
+        v = int(self.ctlArr[0])
+        if v == self.version: return False
+        if DEBUG: print("SharedTemplateReader.refresh()")
+        while True:
+            v = int(self.ctlArr[0])
+            if v == 0: return False # nothing is published
+            if v < 0: sleep(0.001); continue # publisher is writing
+            name = bytes(self.ctl.buf[8:CTL_SIZE]).rstrip(b'\0').decode()
+            if int(self.ctlArr[0]) != v: continue # changed while reading
+            try: shm = attachSharedMemory(name)
+            except FileNotFoundError: continue # replaced by a newer one
+            break
+        n = int(np.ndarray((1,), dtype=np.uint64, buffer=shm.buf)[0])
+        header = json.loads(bytes(shm.buf[8:8+n]).decode('utf-8'))
+        base = -(-(8+n)//ALIGN) * ALIGN
+        arrays = {}
+        for key in header['arrays']:
+            o, dt, shape = header['arrays'][key]
+            a = np.ndarray(shape, dtype=dt, buffer=shm.buf, offset=base+o)
+            a.flags.writeable = False
+            arrays[key] = a
+        ### set template of the PyListener
+        PLL.setAudioRate(header['framerate'])
+        pl.tSpAD = arrays['tSpAD']
+        pl.templP = header['templP']
+        pl.templFP = header['templFP']
+        pl.templStats = None
+        pl.tACMax = [pl.tSpAD, header['acMax']]
+        ### close old data block
+        if self.shm != None: self.oldShm.append(self.shm)
+        self.shm = shm
+        self.header = header
+        self.arrays = arrays
+        self.version = header['version']
+        self.closeOld()
+        return True
+
+    #-------------------------------------------------------------------
+
+    def closeOld(self):
+        """ Close data blocks of old versions, which are not used anymore.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        for shm in list(self.oldShm):
+            try: shm.close()
+            except BufferError: continue # arrays on it are still used
+            self.oldShm.remove(shm)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close all blocks (arrays on them shouldn't be used anymore).
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("SharedTemplateReader.close()")
+        self.arrays = {}
+        if self.shm != None: self.oldShm.append(self.shm)
+        self.shm = None
+        self.closeOld()
+        del self.ctlArr
+        self.ctl.close()
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__": pass
+
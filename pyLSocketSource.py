@@ -0,0 +1,392 @@
+# coding: UTF-8
+
+"""
+pyLSocketSource
+Audio source receiving framed PCM data (int16) over a UNIX or TCP
+socket, so that small recorders can forward their audio to pyListener
+running on another machine.
+SocketPCMServer accepts any number of concurrent senders and
+each connection becomes a SocketPCMSource (see pyLAudioSource.py).
+
+Protocol (all integers are little-endian):
+    header: b'PYLS', framerate (uint32), nchannels (uint16),
+      sampwidth (uint16, only 2 is supported)
+    then repeated frames: number of bytes (uint32), PCM data (int16,
+      interleaved)
+
+Received bytes are written directly from the socket into the ring
+buffer of the source (socket.recv_into a memoryview of the ring buffer),
+without intermediate bytes objects.
+
+Usage (sending WAV file to a listening pyListenerDaemon on loopback):
+    python pyListenerDaemon.py -t input/sample_phee --listen 127.0.0.1:5500
+    python pyLSocketSource.py input/test/m_test.wav 127.0.0.1:5500
+
+Dependency:
+    NumPy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys, socket, struct
+from os import path, remove
+from threading import Thread, Condition
+
+import numpy as np
+
+from pyLAudioSource import AudioSource, WAVFileSource
+from fFuncNClasses import writeFile, get_time_stamp
+
+DEBUG = False
+MAGIC = b'PYLS'
+HEADER = struct.Struct('<4sIHH') # magic, framerate, nchannels, sampwidth
+FRAME_HEADER = struct.Struct('<I') # number of bytes of PCM data
+
+#=======================================================================
+
+def parseAddress(address):
+    """ Parse socket address string.
+
+    Args:
+        address (str): 'host:port' for TCP, otherwise file path of
+          UNIX socket.
+
+    Returns:
+        (str/ tuple): File path or (host, port).
+    """
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        if port.isdigit(): return (host, int(port))
+    return address
+
+#-----------------------------------------------------------------------
+
+def recvExact(sock, n):
+    """ Receive exactly n bytes (for small headers).
+
+    Args:
+        sock (socket.socket): Connected socket.
+        n (int): Number of bytes to receive.
+
+    Returns:
+        (None/ bytearray): None when the connection closed before.
+    """
+    buf = bytearray(n)
+    mv = memoryview(buf)
+    i = 0
+    while i < n:
+        r = sock.recv_into(mv[i:])
+        if r == 0: return None
+        i += r
+    return buf
+
+#=======================================================================
+
+class SocketPCMSource(AudioSource):
+    """ PCM data from a connected socket as an audio source.
+    A receiving thread writes data into a ring buffer; when the ring
+    buffer is full (listener is too slow), the oldest data is dropped and
+    counted as an overflow.
+
+    Args:
+        sock (socket.socket): Connected socket (after the header).
+        framerate (int): Sampling rate.
+        nchannels (int): Number of channels.
+        name (str): Name of the stream (such as address of the sender).
+        bufDur (float): Duration (in seconds) of the ring buffer.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, sock, framerate, nchannels, name='', bufDur=5.0):
+        if DEBUG: print("SocketPCMSource.__init__()")
+        AudioSource.__init__(self, framerate, nchannels)
+        self.lossless = False # sender doesn't wait for the listener
+        self.sock = sock
+        self.name = name # name of the stream
+        self.frameBytes = 2 * nchannels # number of bytes of one frame
+        nFrames = int(bufDur * framerate)
+        self.ring = np.zeros(nFrames*nchannels, dtype=np.int16) # ring buffer
+        self.ringMV = memoryview(self.ring.view(np.uint8)) # byte view of
+          # the ring buffer to receive into
+        self.cap = len(self.ringMV) # capacity (bytes) of the ring buffer
+        self.wPos = 0 # total number of bytes written
+        self.rPos = 0 # total number of bytes read
+        self.closed = False # whether the connection closed
+        self.cond = Condition()
+        self.th = Thread(target=self.receive, daemon=True)
+        self.th.start()
+
+    #-------------------------------------------------------------------
+
+    def receive(self):
+        """ Function for a thread to receive frames into the ring buffer.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("SocketPCMSource.receive()")
+        try:
+            while True:
+                fh = recvExact(self.sock, FRAME_HEADER.size)
+                if fh == None: break
+                remaining = FRAME_HEADER.unpack(fh)[0]
+                while remaining > 0:
+                    with self.cond:
+                        i = self.wPos % self.cap
+                        n = min(remaining, self.cap-i) # contiguous space
+                        if self.wPos + n - self.rPos > self.cap:
+                        # ring buffer is full; drop the oldest data
+                            self.rPos = self.wPos + n - self.cap
+                            self.rPos += (-self.rPos) % self.frameBytes
+                            self.overflows += 1
+                    r = self.sock.recv_into(self.ringMV[i:i+n])
+                    if r == 0: raise ConnectionError
+                    remaining -= r
+                    with self.cond:
+                        self.wPos += r
+                        self.cond.notify_all()
+        except (OSError, ConnectionError):
+            pass
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.sock.close()
+
+    #-------------------------------------------------------------------
+
+    def read(self, nFrames, timeout=0.1):
+        """ Read a block of audio data (see AudioSource.read).
+        When the block is not received within 'timeout', return None
+        without reaching the end ('eof' is False), so that the listening
+        thread can check its messages.
+        """
+        n = nFrames * self.frameBytes
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.wPos-self.rPos >= n \
+                                                or self.closed, timeout):
+                return None
+        return AudioSource.read(self, nFrames)
+
+    #-------------------------------------------------------------------
+
+    def readData(self, nFrames):
+        n = nFrames * self.frameBytes
+        with self.cond:
+            n = min(n, self.wPos-self.rPos)
+            n -= n % self.frameBytes
+            i = self.rPos % self.cap
+            ring = self.ring.view(np.uint8)
+            if i + n <= self.cap:
+                data = ring[i:i+n].copy()
+            else:
+                data = np.concatenate((ring[i:], ring[:i+n-self.cap]))
+            self.rPos += n
+        return data.view(np.int16)
+
+    #-------------------------------------------------------------------
+
+    def getReadAvailable(self):
+        with self.cond:
+            return int((self.wPos-self.rPos) / self.frameBytes)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class SocketPCMServer(object):
+    """ Server accepting PCM senders over a UNIX or TCP socket.
+    Each accepted connection (with a valid header) becomes
+    a SocketPCMSource, which is given to 'onConnect'.
+
+    Args:
+        address (str/ tuple): File path of UNIX socket or (host, port).
+        onConnect (function): Called with a new SocketPCMSource
+          (in the thread of the connection).
+        logFile (str, optional): File path of log file.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, address, onConnect, logFile=''):
+        if DEBUG: print("SocketPCMServer.__init__()")
+        self.address = address
+        self.onConnect = onConnect
+        self.logFile = logFile
+        if type(address) == str:
+            if path.exists(address): remove(address)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(address)
+        self.sock.listen(8)
+        self.th = None # thread accepting connections
+
+    #-------------------------------------------------------------------
+
+    def start(self):
+        """ Start a thread accepting connections.
+        """
+        if DEBUG: print("SocketPCMServer.start()")
+        self.th = Thread(target=self.accept, daemon=True)
+        self.th.start()
+
+    #-------------------------------------------------------------------
+
+    def accept(self):
+        """ Function for a thread to accept connections.
+        """
+        if DEBUG: print("SocketPCMServer.accept()")
+        while True:
+            try: conn, addr = self.sock.accept()
+            except OSError: break # server socket is closed
+            th = Thread(target=self.handleConnection, args=(conn, addr),
+                        daemon=True)
+            th.start()
+
+    #-------------------------------------------------------------------
+
+    def handleConnection(self, conn, addr):
+        """ Read header of a new connection and make an audio source.
+
+        Args:
+            conn (socket.socket): Connected socket.
+            addr (): Address of the sender.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("SocketPCMServer.handleConnection()")
+        name = str(addr) if addr else str(conn.fileno())
+        h = recvExact(conn, HEADER.size)
+        if h != None: magic, framerate, nchannels, sampwidth = HEADER.unpack(h)
+        if h == None or magic != MAGIC or sampwidth != 2 or nchannels < 1:
+            msg = "%s, [ERROR],"%(get_time_stamp())
+            msg += " Invalid PCM stream header from %s.\n"%(name)
+            writeFile(self.logFile, msg)
+            conn.close()
+            return
+        msg = "%s, [MSG], PCM stream connected from %s"%(get_time_stamp(),
+                                                          name)
+        msg += " (%i Hz, %i channel(s)).\n"%(framerate, nchannels)
+        writeFile(self.logFile, msg)
+        src = SocketPCMSource(conn, framerate, nchannels, name)
+        self.onConnect(src)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Stop accepting connections.
+        """
+        if DEBUG: print("SocketPCMServer.close()")
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+        self.sock.close()
+        if type(self.address) == str and path.exists(self.address):
+            remove(self.address)
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class SocketPCMSender(object):
+    """ Sender of PCM data to SocketPCMServer.
+
+    Args:
+        address (str/ tuple): File path of UNIX socket or (host, port).
+        framerate (int): Sampling rate.
+        nchannels (int): Number of channels.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, address, framerate=44100, nchannels=1):
+        if DEBUG: print("SocketPCMSender.__init__()")
+        if type(address) == str:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.sock.sendall(HEADER.pack(MAGIC, framerate, nchannels, 2))
+
+    #-------------------------------------------------------------------
+
+    def send(self, data):
+        """ Send a frame of PCM data.
+
+        Args:
+            data (numpy.array): int16 data (interleaved, if multi-channel).
+
+        Returns:
+            None
+        """
+        data = np.ascontiguousarray(data, dtype='<i2')
+        self.sock.sendall(FRAME_HEADER.pack(data.nbytes))
+        self.sock.sendall(memoryview(data).cast('B'))
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close the connection.
+        """
+        self.sock.close()
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+def sendWAVFile(wavFP, address, flagRealtime=True, blockDur=0.025):
+    """ Send a WAV file to SocketPCMServer (for testing).
+
+    Args:
+        wavFP (str): File path of WAV file.
+        address (str/ tuple): File path of UNIX socket or (host, port).
+        flagRealtime (bool): Whether to send in real time.
+        blockDur (float): Duration (in seconds) of each frame.
+
+    Returns:
+        None
+    """
+    src = WAVFileSource(wavFP, flagRealtime)
+    sender = SocketPCMSender(address, src.framerate)
+    src.open()
+    nFrames = int(src.framerate * blockDur)
+    while True:
+        data = src.read(nFrames)
+        if data is None: break
+        sender.send(data)
+    src.close()
+    sender.close()
+
+#=======================================================================
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python pyLSocketSource.py WAV_FILE ADDRESS")
+        sys.exit(1)
+    sendWAVFile(sys.argv[1], parseAddress(sys.argv[2]))
+
@@ -123,6 +123,11 @@ class SpectrogramPanel(wx.Panel):
             lbl += " Channels:%i, Data-type:int16,"%(PLL.CHANNELS)
             lbl += " Input-block-time:%.2f,"%(PLL.INPUT_BLOCK_TIME)
             lbl += " Freq.-resolution:%.2f ]"%(PLL.FREQ_RES)
+            if self.pl.isListening:
+                h = self.pl.getHealth()
+                lbl += " [ Overflows:%i,"%(h['overflows'])
+                lbl += " Missed-blocks:%i,"%(h['blocksMissed'])
+                lbl += " Lag:%i ms ]"%(h['lagMs'])
             texts.append(lbl)
             coords.append( (5, 0) )
             fg.append( fCol )
@@ -329,7 +334,8 @@ class PyLSpectrogramFrame(wx.Frame):
         if DEBUG: print("PyLSpectrogramFrame.updateSpectrogram()")
         
         self.pl.procMicAudioData(flagAnalyze=False) 
-        self.panel['sp'].Refresh() # draw spectrogram
+        if self.pl.overload.allowDisplayRefresh():
+            self.panel['sp'].Refresh() # draw spectrogram
 
     #-------------------------------------------------------------------
     
@@ -0,0 +1,404 @@
+# coding: UTF-8
+
+"""
+pyLTemplateLib
+Library of named templates (e.g. phee calls and rapid fire tsik calls),
+so that a sound fragment can be classified in one process.
+Min. and max. values of comparison parameters (compParamList) of all
+templates are stored as rows of NumPy arrays, and parameters of
+a sound fragment are compared with all of them at once.
+With many templates, an index of sorted min. and max. values of each 
+parameter (TemplateRangeIndex) narrows down candidate templates 
+with binary search, and only the candidates are compared 
+(and scored with 'corr2auto').
+
+Example:
+    lib = TemplateLibrary()
+    lib.addFolder('input') # each sub-folder is a template
+    pl.templLib = lib # PyListener reports matched templates in
+      # analyzed parameters ('templates') of each sound fragment
+    print(lib.match(params)) # e.g. ['sample_phee']
+    print(lib.rank(params, data)) # e.g. [('sample_phee', 0.92)]
+
+Dependency:
+    NumPy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys
+from os import path
+from glob import glob
+
+import numpy as np
+from scipy.signal import correlate
+
+import pyListenerLib as PLL
+from fFuncNClasses import chkFPath, get_time_stamp, writeFile
+
+DEBUG = False
+
+#=======================================================================
+
+class TemplateLibrary(object):
+    """ Named templates with their threshold ranges in arrays.
+    Templates are formed (or loaded from the cache) with
+    a PyListener of this library, not with the listening one,
+    so spectrogram arrays of a running listener are not touched.
+    All templates should have the same sampling rate.
+
+    Args:
+        logFile (str, optional): File path of log file.
+        keys (None/ list, optional): Parameters to compare.
+          None means compParamList of PyListener.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, logFile='', keys=None):
+        if DEBUG: print("TemplateLibrary.__init__()")
+        self.pl = PLL.PyListener(None, None, logFile, flagMic=False)
+          # PyListener to form templates
+        self.logFile = self.pl.logFile # log file path
+        if keys == None: keys = list(self.pl.compParamList)
+        self.keys = keys # names of parameters to compare
+        self.framerate = None # sampling rate of templates
+        self.names = [] # names of templates; index is row index
+          # of the arrays below
+        self.templFP = {} # folder (or file) path of each template
+        self.tSpAD = {} # spectrogram data of each template
+        self.templP = {} # analyzed parameters of each template
+        nK = len(keys)
+        self.mins = np.zeros((0, nK)) # min. values; a row per template
+        self.maxs = np.zeros((0, nK)) # max. values; a row per template
+        self.sumAmps = np.zeros(0) # summedAmp of each template,
+          # for summedAmpRatio of a sound fragment to each template
+        self.index = None # TemplateRangeIndex; None means that
+          # it should be built (again) before matching
+        self.acMax = {} # max. value of auto-correlation of spectrogram
+          # of each template (for 'corr2auto')
+        if 'summedAmpRatio' in keys:
+            self.ratioCol = keys.index('summedAmpRatio') # column of
+              # summedAmpRatio, which is different for each template
+        else:
+            self.ratioCol = None
+
+    #-------------------------------------------------------------------
+
+    def add(self, name, wavFP):
+        """ Add (or replace) a template.
+
+        Args:
+            name (str): Name of the template.
+            wavFP (str): Folder path, which contains WAV files,
+              or file path of a WAV file.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateLibrary.add()")
+        chkFPath(wavFP)
+        fileLists = self.pl.templateFiles(wavFP)
+        fr = self.framerate
+        data, params = self.pl.loadTemplateData(fileLists)
+        if fr != None and PLL.RATE != fr:
+            msg = "Sampling rate of %s (%i) is different from"%(wavFP,
+                                                             PLL.RATE)
+            msg += " that of the library (%i)."%(fr)
+            PLL.setAudioRate(fr) # back to the rate of the library
+            raise ValueError(msg)
+        self.framerate = PLL.RATE
+        minV = [params[k+'_min'] for k in self.keys]
+        maxV = [params[k+'_max'] for k in self.keys]
+        if name in self.names: # replace the row
+            i = self.names.index(name)
+            self.mins[i] = minV
+            self.maxs[i] = maxV
+            self.sumAmps[i] = params['summedAmp']
+        else:
+            self.names.append(name)
+            self.mins = np.vstack((self.mins, [minV]))
+            self.maxs = np.vstack((self.maxs, [maxV]))
+            self.sumAmps = np.append(self.sumAmps, params['summedAmp'])
+        self.templFP[name] = wavFP
+        self.tSpAD[name] = data
+        self.templP[name] = params
+        self.acMax.pop(name, None)
+        self.index = None
+        msg = "%s, [MSG], Template '%s' (%s) is added"%(get_time_stamp(),
+                                                        name, wavFP)
+        msg += " to the library.\n"
+        writeFile(self.logFile, msg)
+
+    #-------------------------------------------------------------------
+
+    def addFolder(self, folder):
+        """ Add each sub-folder (which contains WAV files) of a folder
+        as a template, named after the sub-folder.
+
+        Args:
+            folder (str): Folder path.
+
+        Returns:
+            (list): Names of added templates.
+        """
+        if DEBUG: print("TemplateLibrary.addFolder()")
+        names = []
+        for fp in sorted(glob(path.join(folder, "*"))):
+            if not path.isdir(fp): continue
+            if self.pl.templateFiles(fp) == []: continue # no WAV files
+            name = path.basename(fp)
+            self.add(name, fp)
+            names.append(name)
+        return names
+
+    #-------------------------------------------------------------------
+
+    def remove(self, name):
+        """ Remove a template.
+
+        Args:
+            name (str): Name of the template.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateLibrary.remove()")
+        i = self.names.index(name)
+        self.names.pop(i)
+        self.mins = np.delete(self.mins, i, axis=0)
+        self.maxs = np.delete(self.maxs, i, axis=0)
+        self.sumAmps = np.delete(self.sumAmps, i)
+        for d in [self.templFP, self.tSpAD, self.templP]: d.pop(name)
+        self.acMax.pop(name, None)
+        self.index = None
+
+    #-------------------------------------------------------------------
+
+    def paramMatrix(self, sParams, rows=None):
+        """ Parameters of a sound fragment to compare with each template.
+
+        Args:
+            sParams (dict): Parameters of a sound fragment.
+            rows (None/ numpy.array): Row indices of templates.
+              None means all templates.
+
+        Returns:
+            (numpy.array): A row per template; summedAmpRatio is
+              the ratio to summedAmp of each template.
+        """
+        if DEBUG: print("TemplateLibrary.paramMatrix()")
+        if rows is None: rows = np.arange(len(self.names))
+        v = np.array([sParams[k] for k in self.keys], dtype=np.float64)
+        m = np.tile(v, (len(rows), 1))
+        if self.ratioCol != None:
+            m[:,self.ratioCol] = sParams['summedAmp'] / self.sumAmps[rows]
+        return m
+
+    #-------------------------------------------------------------------
+
+    def buildIndex(self):
+        """ Build index of threshold ranges of templates.
+        Range of summedAmpRatio is converted to range of summedAmp 
+        (multiplied by summedAmp of each template), so that the same 
+        value of a sound fragment is compared with all templates.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateLibrary.buildIndex()")
+        mins = self.mins.copy()
+        maxs = self.maxs.copy()
+        if self.ratioCol != None:
+            mins[:,self.ratioCol] *= self.sumAmps
+            maxs[:,self.ratioCol] *= self.sumAmps
+        self.index = TemplateRangeIndex(mins, maxs)
+
+    #-------------------------------------------------------------------
+
+    def candidates(self, sParams):
+        """ Row indices of templates, which may match the sound fragment.
+
+        Args:
+            sParams (dict): Parameters of a sound fragment.
+
+        Returns:
+            (numpy.array): Row indices of candidate templates.
+        """
+        if DEBUG: print("TemplateLibrary.candidates()")
+        if self.index == None: self.buildIndex()
+        v = [sParams[k] for k in self.keys]
+        if self.ratioCol != None: v[self.ratioCol] = sParams['summedAmp']
+        return self.index.candidates(np.array(v, dtype=np.float64))
+
+    #-------------------------------------------------------------------
+
+    def matchMask(self, sParams):
+        """ Compare parameters of a sound fragment with threshold
+        ranges of all templates at once.
+
+        Args:
+            sParams (dict): Parameters of a sound fragment.
+
+        Returns:
+            (numpy.array): Boolean; whether each template matched.
+        """
+        if DEBUG: print("TemplateLibrary.matchMask()")
+        mask = np.zeros(len(self.names), dtype=bool)
+        rows = self.candidates(sParams)
+        if len(rows) == 0: return mask
+        m = self.paramMatrix(sParams, rows)
+        mask[rows] = np.all((m >= self.mins[rows]) & (m <= self.maxs[rows]),
+                            axis=1)
+        return mask
+
+    #-------------------------------------------------------------------
+
+    def match(self, sParams):
+        """ Names of templates, which the sound fragment matched.
+
+        Args:
+            sParams (dict): Parameters of a sound fragment.
+
+        Returns:
+            (list): Names of matched templates.
+        """
+        if DEBUG: print("TemplateLibrary.match()")
+        if self.names == []: return []
+        return [self.names[i] for i in np.nonzero(self.matchMask(sParams))[0]]
+
+    #-------------------------------------------------------------------
+
+    def corr2auto(self, name, data):
+        """ Correlation to auto-correlation ratio of spectrogram of
+        a sound fragment and a template (as 'corr2auto' in 
+        PyListener.analyzeSpectrogramArray). Auto-correlation of
+        each template is calculated only once.
+
+        Args:
+            name (str): Name of the template.
+            data (numpy.array): Spectrogram data of the sound fragment
+              (returned from PyListener.analyzeSpectrogramArray).
+
+        Returns:
+            (float): Ratio; 1.0 is the best.
+        """
+        if DEBUG: print("TemplateLibrary.corr2auto()")
+        _t = self.tSpAD[name].astype(np.int32)
+        if not name in self.acMax:
+            self.acMax[name] = np.max(correlate(_t, _t))
+        cm = np.max(correlate(data.astype(np.int32), _t))
+        r = float(cm) / float(self.acMax[name])
+        if r > 1.0: r = 1.0-(r-1.0)
+        return r
+
+    #-------------------------------------------------------------------
+
+    def rank(self, sParams, data):
+        """ Matched templates, sorted by 'corr2auto' score.
+        Only templates, which matched threshold ranges, are scored.
+
+        Args:
+            sParams (dict): Parameters of a sound fragment.
+            data (numpy.array): Spectrogram data of the sound fragment.
+
+        Returns:
+            (list): (name, score) of matched templates.
+        """
+        if DEBUG: print("TemplateLibrary.rank()")
+        rslt = [(name, self.corr2auto(name, data)) \
+                                            for name in self.match(sParams)]
+        return sorted(rslt, key=lambda x: x[1], reverse=True)
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class TemplateRangeIndex(object):
+    """ Index of threshold ranges (a box per template) for finding
+    candidate templates of a point in sublinear time. 
+    For each parameter (dimension), min. values and max. values are 
+    sorted; binary search of a value gives templates with min. <= value
+    (a prefix of the min. order) and templates with max. >= value
+    (a suffix of the max. order). Templates of the shortest of these
+    prefixes and suffixes (over all dimensions) are the candidates,
+    which include all matching templates.
+
+    Args:
+        mins (numpy.array): Min. values; a row per template.
+        maxs (numpy.array): Max. values; a row per template.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, mins, maxs):
+        if DEBUG: print("TemplateRangeIndex.__init__()")
+        self.n = mins.shape[0] # number of templates
+        self.minOrder = np.argsort(mins, axis=0, kind='stable').T # row 
+          # indices sorted by min. value; a row per dimension
+        self.maxOrder = np.argsort(maxs, axis=0, kind='stable').T # row
+          # indices sorted by max. value; a row per dimension
+        self.minSorted = np.take_along_axis(mins.T, self.minOrder, axis=1)
+          # sorted min. values
+        self.maxSorted = np.take_along_axis(maxs.T, self.maxOrder, axis=1)
+          # sorted max. values
+
+    #-------------------------------------------------------------------
+
+    def candidates(self, v):
+        """ Candidate templates of a point.
+
+        Args:
+            v (numpy.array): Value of each dimension.
+
+        Returns:
+            (numpy.array): Row indices of candidate templates.
+        """
+        if DEBUG: print("TemplateRangeIndex.candidates()")
+        if self.n == 0: return np.zeros(0, dtype=np.int64)
+        nLo = [] # number of templates with min. <= value
+        nHi = [] # number of templates with max. >= value
+        for k in range(len(v)):
+            nLo.append(np.searchsorted(self.minSorted[k], v[k], 'right'))
+            nHi.append(self.n - np.searchsorted(self.maxSorted[k], v[k], 
+                                                'left'))
+        kLo = int(np.argmin(nLo))
+        kHi = int(np.argmin(nHi))
+        if nLo[kLo] <= nHi[kHi]:
+            return self.minOrder[kLo,:nLo[kLo]]
+        else:
+            return self.maxOrder[kHi,self.n-nHi[kHi]:]
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python pyLTemplateLib.py LIBRARY_FOLDER WAV_FILE")
+        sys.exit(1)
+    lib = TemplateLibrary()
+    lib.addFolder(sys.argv[1])
+    pl = PLL.PyListener(None, None, lib.logFile, flagMic=False)
+    for r in pl.scanWAVFile(sys.argv[2], flagCompare=False):
+        print("%.3f-%.3f s: %s"%(r['startTime'], r['endTime'],
+                                 "/ ".join(lib.match(r['params']))))
+
@@ -0,0 +1,257 @@
+# coding: UTF-8
+
+"""
+pyLTemplateWatcher
+Hot-reload of a template folder. The folder is polled for new, changed
+(modification time or size) or deleted WAV files. When it changed
+(and stayed the same for one more poll, so that half-written files are
+not read), the template is formed again in a thread of this watcher,
+with its own PyListener, and handed over to the listening PyListener(s)
+with PyListener.swapTemplate. Listening doesn't stop, and no audio data
+is dropped.
+
+Example:
+    w = TemplateWatcher('input/sample_phee', interval=2.0)
+    w.addListener(pl)
+    w.start()
+    ...
+    w.stop()
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+from os import stat
+from threading import Thread, Event, Lock
+
+import pyListenerLib as PLL
+from pyLWAVFile import WAVFile
+from fFuncNClasses import get_time_stamp, writeFile
+
+DEBUG = False
+
+#=======================================================================
+
+class TemplateWatcher(object):
+    """ Watching a template folder and reloading the template
+    of listening PyListener(s), when WAV files in the folder change.
+    WAV files with a different sampling rate (from the current one)
+    are rejected; the current template is kept.
+
+    Args:
+        folder (str): Template folder path.
+        interval (float): Polling interval in seconds.
+        logFile (str, optional): File path of log file.
+        callback (None/ function, optional): Called with parameters
+          of a reloaded template (in the thread of this watcher).
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, folder, interval=2.0, logFile='', callback=None):
+        if DEBUG: print("TemplateWatcher.__init__()")
+        self.folder = folder # template folder path
+        self.interval = interval # polling interval in seconds
+        self.callback = callback # function to call after reloading
+        self.builder = PLL.PyListener(None, None, logFile, flagMic=False)
+          # PyListener to form template; not the listening one,
+          # so its spectrogram arrays are not touched
+        self.builder.nTemplWorkers = 1 # not to take CPUs from listening
+        self.logFile = self.builder.logFile # log file path
+        self.listeners = [] # PyListeners to hand over a template
+        self.listenersLock = Lock()
+        self.snap = None # modification time and size of each WAV file,
+          # of which the current template was formed
+        self.pending = None # changed snapshot, which is waiting
+          # for one more poll
+        self.quitEvt = Event() # set when the watcher is stopping
+        self.th = None # polling thread
+
+    #-------------------------------------------------------------------
+
+    def addListener(self, pl):
+        """ Add a PyListener to hand over reloaded template.
+
+        Args:
+            pl (PyListener): PyListener to add.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateWatcher.addListener()")
+        with self.listenersLock: self.listeners.append(pl)
+
+    #-------------------------------------------------------------------
+
+    def removeListener(self, pl):
+        """ Remove a PyListener.
+
+        Args:
+            pl (PyListener): PyListener to remove.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateWatcher.removeListener()")
+        with self.listenersLock:
+            if pl in self.listeners: self.listeners.remove(pl)
+
+    #-------------------------------------------------------------------
+
+    def snapshot(self):
+        """ Modification time and size of WAV files in the folder.
+
+        Args: None
+
+        Returns:
+            (dict): (st_mtime_ns, st_size) of each file path.
+        """
+        snap = {}
+        for fp in self.builder.templateFiles(self.folder):
+            try: st = stat(fp)
+            except OSError: continue # deleted in the meantime
+            snap[fp] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    #-------------------------------------------------------------------
+
+    def start(self):
+        """ Start polling in a thread.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateWatcher.start()")
+        self.snap = self.snapshot()
+        self.pending = None
+        self.quitEvt.clear()
+        self.th = Thread(target=self.run, daemon=True)
+        self.th.start()
+        msg = "%s, [MSG], Watching template folder, %s.\n"%(get_time_stamp(),
+                                                            self.folder)
+        writeFile(self.logFile, msg)
+
+    #-------------------------------------------------------------------
+
+    def stop(self):
+        """ Stop polling.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateWatcher.stop()")
+        self.quitEvt.set()
+        if self.th != None:
+            self.th.join()
+            self.th = None
+
+    #-------------------------------------------------------------------
+
+    def run(self):
+        """ Function for the polling thread.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateWatcher.run()")
+        while not self.quitEvt.wait(self.interval): self.poll()
+
+    #-------------------------------------------------------------------
+
+    def poll(self):
+        """ Check the folder once and reload the template, when the
+        folder changed and stayed the same since the last poll.
+
+        Args: None
+
+        Returns:
+            (bool): Whether the template was reloaded.
+        """
+        snap = self.snapshot()
+        if snap == self.snap:
+            self.pending = None
+            return False
+        if snap != self.pending: # changed (again); wait one more poll
+            self.pending = snap
+            return False
+        self.pending = None
+        self.snap = snap
+        return self.reload(sorted(snap.keys()))
+
+    #-------------------------------------------------------------------
+
+    def reload(self, fps):
+        """ Form template of WAV files and hand it over to listeners.
+
+        Args:
+            fps (list): File paths of WAV files.
+
+        Returns:
+            (bool): Whether the template was reloaded.
+        """
+        if DEBUG: print("TemplateWatcher.reload()")
+        msg = ""
+        if fps == []:
+            msg = "No WAV file in %s."%(self.folder)
+        for fp in fps:
+            try:
+                wf = WAVFile(fp)
+                fr = wf.framerate
+                wf.close()
+            except (ValueError, OSError) as e:
+                msg = "%s; %s"%(fp, str(e))
+                break
+            if fr != PLL.RATE:
+                msg = "Sampling rate of %s (%i) is different from"%(fp, fr)
+                msg += " the current one (%i)."%(PLL.RATE)
+                break
+        if msg != "":
+            msg = "%s, [ERROR], %s Template is not reloaded.\n"%(
+                                                        get_time_stamp(), msg)
+            writeFile(self.logFile, msg)
+            return False
+        with self.listenersLock: listeners = list(self.listeners)
+        ### form template with the current settings of a listener
+        if listeners != []:
+            pl = listeners[0]
+            for key in ['pKeys', 'comp_freq_range', 'acThrTol_templ',
+                        'cplInitMargin', 'indCPRange', 'templCacheDir']:
+                setattr(self.builder, key, getattr(pl, key))
+        data, params = self.builder.loadTemplateData(fps)
+        for pl in listeners:
+            pl.swapTemplate(data, params, self.builder.templStats,
+                            self.folder)
+        msg = "%s, [MSG], Template is reloaded from %s"%(get_time_stamp(),
+                                                          self.folder)
+        msg += " (%i file(s)).\n"%(len(fps))
+        writeFile(self.logFile, msg)
+        if self.callback != None: self.callback(params)
+        return True
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__": pass
+
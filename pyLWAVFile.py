@@ -0,0 +1,193 @@
+# coding: UTF-8
+
+"""
+pyLWAVFile
+WAV file reader for pyListener, which parses RIFF header and exposes
+the data chunk as a NumPy memory-map (numpy.memmap), instead of
+reading the whole file into memory. Only requested frames are read
+(and converted to int16) from disk, so that a WAV file of any size can
+be analyzed with bounded memory.
+Supported formats are 16, 24 and 32-bit integer PCM and 32-bit float,
+including WAVE_FORMAT_EXTENSIBLE header.
+
+Example:
+    wf = WAVFile('input/test/m_test.wav')
+    wd = wf.read(0, 1024) # first 1024 frames, int16 (frames, channels)
+    wf.close()
+
+Dependency:
+    NumPy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import struct
+from os import path
+from collections import namedtuple
+
+import numpy as np
+
+DEBUG = False
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# parameters of WAV file (same fields as wave.Wave_read.getparams())
+WAVParams = namedtuple('WAVParams',
+                       'nchannels sampwidth framerate nframes comptype compname')
+
+#=======================================================================
+
+class WAVFile(object):
+    """ Memory-mapped WAV file.
+
+    Args:
+        fp (str): File path of WAV file.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, fp):
+        if DEBUG: print("WAVFile.__init__()")
+        self.fp = fp
+        self.nchannels = None # number of channels
+        self.sampwidth = None # sample width in bytes
+        self.framerate = None # sampling rate
+        self.nframes = None # number of frames
+        self.fmt = None # sample format; 'int16', 'int24', 'int32'
+          # or 'float32'
+        self.dataOffset = None # byte offset of the data chunk
+        self.mm = None # numpy.memmap of the data chunk
+        self.parseHeader()
+        if self.fmt == 'int24':
+            shape = (self.nframes, self.nchannels, 3)
+            dtype = np.uint8
+        else:
+            shape = (self.nframes, self.nchannels)
+            dtype = dict(int16='<i2', int32='<i4', float32='<f4')[self.fmt]
+        if self.nframes > 0:
+            self.mm = np.memmap(fp, dtype=dtype, mode='r',
+                                offset=self.dataOffset, shape=shape)
+
+    #-------------------------------------------------------------------
+
+    def parseHeader(self):
+        """ Parse RIFF header and find 'fmt ' and 'data' chunks.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("WAVFile.parseHeader()")
+        fSize = path.getsize(self.fp)
+        fmtChunk = None
+        with open(self.fp, 'rb') as f:
+            h = f.read(12)
+            if len(h) < 12 or h[:4] != b'RIFF' or h[8:] != b'WAVE':
+                raise ValueError("%s: not a RIFF WAVE file."%(self.fp))
+            while True:
+                h = f.read(8)
+                if len(h) < 8: break
+                cID, cSize = struct.unpack('<4sI', h)
+                if cID == b'fmt ':
+                    fmtChunk = f.read(cSize)
+                    f.seek(cSize % 2, 1) # chunks are word-aligned
+                elif cID == b'data':
+                    self.dataOffset = f.tell()
+                    dataSize = min(cSize, fSize-self.dataOffset) # size in
+                      # header can be wrong when recording was interrupted
+                    break
+                else:
+                    f.seek(cSize + cSize%2, 1)
+        if fmtChunk == None or len(fmtChunk) < 16 or self.dataOffset == None:
+            raise ValueError("%s: 'fmt ' or 'data' chunk is missing."%(self.fp))
+
+        tag, nch, rate, __, blockAlign, bits = struct.unpack('<HHIIHH',
+                                                             fmtChunk[:16])
+        if tag == WAVE_FORMAT_EXTENSIBLE and len(fmtChunk) >= 26:
+            tag = struct.unpack('<H', fmtChunk[24:26])[0] # sub-format
+        if tag == WAVE_FORMAT_PCM and bits in [16, 24, 32]:
+            self.fmt = 'int%i'%(bits)
+        elif tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+            self.fmt = 'float32'
+        else:
+            msg = "%s: unsupported WAV format"%(self.fp)
+            msg += " (format tag %i, %i bits)."%(tag, bits)
+            raise ValueError(msg)
+        self.nchannels = nch
+        self.framerate = rate
+        self.sampwidth = int(bits/8)
+        self.nframes = int(dataSize / (self.sampwidth*nch))
+
+    #-------------------------------------------------------------------
+
+    def getparams(self):
+        """ Get parameters of WAV file (as wave.Wave_read.getparams).
+
+        Args: None
+
+        Returns:
+            (WAVParams): Parameters.
+        """
+        return WAVParams(self.nchannels, self.sampwidth, self.framerate,
+                         self.nframes, 'NONE', 'not compressed')
+
+    #-------------------------------------------------------------------
+
+    def read(self, start=0, n=None):
+        """ Read frames, converted to int16.
+
+        Args:
+            start (int): Frame index to start reading.
+            n (None/ int): Number of frames to read.
+              None means until the end.
+
+        Returns:
+            (numpy.array): int16 data; shape is (frames, channels).
+              It can be shorter than 'n' at the end of the file.
+        """
+        if DEBUG: print("WAVFile.read()")
+        if n == None: n = self.nframes - start
+        end = max(start, min(start+n, self.nframes))
+        if self.mm is None or end == start:
+            return np.zeros((0, self.nchannels), dtype=np.int16)
+        d = self.mm[start:end]
+        if self.fmt == 'int16':
+            return np.array(d, dtype=np.int16)
+        elif self.fmt == 'int24': # upper 2 bytes of each sample
+            return np.ascontiguousarray(d[:,:,1:3]).view('<i2')[:,:,0]
+        elif self.fmt == 'int32':
+            return np.asarray(d >> 16).astype(np.int16)
+        elif self.fmt == 'float32':
+            d = np.clip(np.asarray(d)*32768.0, -32768, 32767)
+            return d.astype(np.int16)
+
+    #-------------------------------------------------------------------
+
+    def close(self):
+        """ Close the memory-map.
+        """
+        if DEBUG: print("WAVFile.close()")
+        self.mm = None # the map is closed when no view refers to it
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__": pass
+
@@ -0,0 +1,217 @@
+# coding: UTF-8
+
+"""
+pyLXCorr
+Detection of sound fragments by sliding the template spectrogram
+(PyListener.tSpAD) over spectrogram columns of a stream or a file,
+instead of RMS amplitude gating. Normalized cross-correlation
+(Pearson correlation between the template and each window of the
+same length) is calculated with FFT in overlapping chunks of columns,
+and peaks above a threshold are reported as sound fragments.
+As the score doesn't depend on the level of the sound, quiet calls
+or calls overlapping background noise can be detected.
+
+Example:
+    det = TemplateXCorrDetector(pl.tSpAD, thr=0.5)
+    for sc, ec, score in det.push(spColumns, flagFlush=True): print(sc, ec)
+
+Dependency:
+    NumPy (1.17),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+DEBUG = False
+
+#=======================================================================
+
+class TemplateXCorrDetector(object):
+    """ Streaming detector of the template spectrogram.
+    Columns are pushed in order; scores are calculated when enough
+    columns for 'chunkCols' lags are collected, keeping the last
+    (template length - 1) columns as overlap for the next chunk.
+    A peak is reported when no higher score appears within the
+    template length after it, and detected fragments don't overlap.
+
+    Args:
+        tSpAD (numpy.array): Template spectrogram (rows, columns).
+        rows (None/ tuple): First and last (exclusive) row indices
+          to use. None means all rows.
+        thr (float): Score (-1.0-1.0) threshold of a peak.
+        chunkCols (int): Number of lags to calculate at once.
+          Small value is for low latency (live stream), large value
+          for throughput (file).
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, tSpAD, rows=None, thr=0.5, chunkCols=1024):
+        if DEBUG: print("TemplateXCorrDetector.__init__()")
+        self.src = tSpAD # template spectrogram, this detector was made of
+        if rows == None: rows = (0, tSpAD.shape[0])
+        self.rows = rows # first and last (exclusive) row indices to use
+        t = tSpAD[rows[0]:rows[1]].astype(np.float64)
+        t -= np.mean(t)
+        self.templ = t # zero-mean template
+        self.tCols = t.shape[1] # length (in columns) of the template
+        self.tNorm = np.sqrt(np.sum(t*t)) # norm of the zero-mean template
+        self.thr = thr # threshold of score
+        self.chunkCols = max(1, int(chunkCols)) # number of lags
+          # to calculate at once
+        self.fTempl = {} # conjugate of FFT of the template for each
+          # FFT length
+        self.lookback = 2*self.tCols + self.chunkCols # number of columns,
+          # which should be kept (by the caller) to get data of
+          # a detected fragment
+        self.reset(0)
+
+    #-------------------------------------------------------------------
+
+    def reset(self, col=0):
+        """ Forget pushed columns (e.g. when there's a gap in columns).
+
+        Args:
+            col (int): Column index of the next column to push.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateXCorrDetector.reset()")
+        self.buf = np.zeros((self.templ.shape[0], 0), dtype=np.float32)
+          # columns, of which scores are not calculated yet
+        self.bufStart = col # column index of the first column of 'buf'
+        self.nextCol = col # column index of the next column to push
+        self.cand = None # candidate of peak; [lag, score]
+        self.minLag = col # lags before this overlap the last detection
+
+    #-------------------------------------------------------------------
+
+    def push(self, cols, flagFlush=False):
+        """ Push spectrogram columns and get detected fragments.
+
+        Args:
+            cols (numpy.array): Spectrogram columns (all rows).
+            flagFlush (bool): Whether this is the end of the data.
+              Then, scores of all remaining lags are calculated and
+              the candidate peak is reported.
+
+        Returns:
+            (list): Each item is (start column index, end column index
+              (exclusive), score) of a detected fragment.
+        """
+        if DEBUG: print("TemplateXCorrDetector.push()")
+        if cols.shape[1] > 0:
+            c = cols[self.rows[0]:self.rows[1]].astype(np.float32)
+            self.buf = np.hstack((self.buf, c))
+            self.nextCol += cols.shape[1]
+        dets = []
+        nLags = self.buf.shape[1] - self.tCols + 1 # number of lags
+          # with full template length
+        if nLags >= self.chunkCols or (flagFlush and nLags > 0):
+            scores = self.scores(self.buf)
+            dets = self.findPeaks(scores, self.bufStart)
+            self.buf = self.buf[:,nLags:] # keep overlap
+            self.bufStart += nLags
+        if flagFlush and self.cand != None:
+            dets.append(self.endCand())
+        return dets
+
+    #-------------------------------------------------------------------
+
+    def scores(self, b):
+        """ Normalized cross-correlation of the template and each
+        window of the given columns.
+
+        Args:
+            b (numpy.array): Spectrogram columns (selected rows).
+
+        Returns:
+            (numpy.array): Scores of (columns - template length + 1) lags.
+        """
+        if DEBUG: print("TemplateXCorrDetector.scores()")
+        k = b.shape[1]
+        T = self.tCols
+        nLags = k - T + 1
+        nfft = 1 << (k-1).bit_length() # no wrap-around for these lags
+        if not nfft in self.fTempl:
+            self.fTempl[nfft] = np.conj(np.fft.rfft(self.templ, nfft, axis=1))
+        ### sum of products of the template and each window;
+        ### rows are summed before the inverse FFT
+        f = np.sum(np.fft.rfft(b, nfft, axis=1) * self.fTempl[nfft], axis=0)
+        num = np.fft.irfft(f, nfft)[:nLags]
+        ### variance (times N) of each window
+        N = b.shape[0] * T
+        c1 = np.concatenate(([0.0], np.cumsum(np.sum(b, axis=0,
+                                                     dtype=np.float64))))
+        c2 = np.concatenate(([0.0], np.cumsum(np.sum(b.astype(np.float64)**2,
+                                                     axis=0))))
+        s1 = c1[T:] - c1[:nLags]
+        s2 = c2[T:] - c2[:nLags]
+        den = self.tNorm * np.sqrt(np.maximum(s2 - s1*s1/N, 0.0))
+        return np.where(den > 1e-6, num/np.maximum(den, 1e-6), 0.0)
+
+    #-------------------------------------------------------------------
+
+    def findPeaks(self, scores, lag0):
+        """ Find peaks of scores above threshold.
+
+        Args:
+            scores (numpy.array): Scores of consecutive lags.
+            lag0 (int): Lag (column index) of the first score.
+
+        Returns:
+            (list): Detected fragments (see push).
+        """
+        if DEBUG: print("TemplateXCorrDetector.findPeaks()")
+        dets = []
+        T = self.tCols
+        for i in np.nonzero(scores >= self.thr)[0]:
+            lag = lag0 + int(i)
+            if self.cand != None and lag - self.cand[0] >= T:
+                dets.append(self.endCand())
+            if lag < self.minLag: continue
+            if self.cand == None or scores[i] > self.cand[1]:
+                self.cand = [lag, float(scores[i])]
+        lastLag = lag0 + len(scores) - 1
+        if self.cand != None and lastLag - self.cand[0] >= T:
+        # no higher score within the template length
+            dets.append(self.endCand())
+        return dets
+
+    #-------------------------------------------------------------------
+
+    def endCand(self):
+        """ Report the candidate peak as a detected fragment.
+
+        Returns:
+            (tuple): Detected fragment (see push).
+        """
+        lag, score = self.cand
+        self.cand = None
+        self.minLag = lag + self.tCols
+        return (lag, lag+self.tCols, score)
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+if __name__ == "__main__": pass
+
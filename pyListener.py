@@ -45,6 +45,8 @@ import numpy as np
 
 import pyListenerLib as PLL
 import pyLSpectrogram as PLSp
+from pyLAudioSource import ReplaySource
+from pyLTemplateWatcher import TemplateWatcher
 from fFuncNClasses import GNU_notice, writeFile, get_time_stamp
 from fFuncNClasses import show_msg, set_img_for_btn, getWXFonts
 from fFuncNClasses import setupStaticText
@@ -126,6 +128,10 @@ class PyListenerFrame(wx.Frame):
         self.pi = pi # store panel information  
         self.panel = {} # dictionary to put panels
         ### init PyListener class 
+        self.templWatcher = None # TemplateWatcher of the template folder
+        self.thrModel = None # PLL.ThresholdModel; threshold values in UI,
+          # compiled when they're edited
+        self.thrErr = None # name of TextCtrl, which has an invalid value
         self.pl = PLL.PyListener(self, self, self.logFile) 
         if self.pl.devIdx == []: self.onClose(None)
         ##### end of class attributes -----
@@ -552,6 +558,23 @@ class PyListenerFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, 
                   lambda event: self.selectTemplate('File'), 
                   selectTemplateFile)
+        addTemplateFile = pyListenerMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Add a file to template",
+                                            )
+        self.Bind(wx.EVT_MENU, self.addTemplateFile, addTemplateFile)
+        removeTemplateFile = pyListenerMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Remove a file from template",
+                                            )
+        self.Bind(wx.EVT_MENU, self.removeTemplateFile, removeTemplateFile)
+        watchTemplate = pyListenerMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Watch template folder (reload on change)",
+                            kind=wx.ITEM_CHECK,
+                                            )
+        self.Bind(wx.EVT_MENU, self.toggleTemplateWatcher, watchTemplate)
+        self.menuWatchTemplate = watchTemplate
         startStopListening = pyListenerMenu.Append(
                             wx.Window.NewControlId(), 
                             item="Start/Stop listening\tSPACE",
@@ -559,6 +582,11 @@ class PyListenerFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, 
                   lambda event: self.onBPButtonPress('startStopListening'),
                   startStopListening)
+        replayWAV = pyListenerMenu.Append(
+                            wx.Window.NewControlId(), 
+                            item="Replay WAV file (load test)\tCTRL+R",
+                                            )
+        self.Bind(wx.EVT_MENU, self.replayWAV, replayWAV)
         quit = pyListenerMenu.Append(
                             wx.Window.NewControlId(), 
                             item="Quit\tCTRL+Q",
@@ -571,6 +599,7 @@ class PyListenerFrame(wx.Frame):
         idSTFolder = wx.Window.NewControlId()
         idSTFile = wx.Window.NewControlId()
         idListen = wx.Window.NewControlId()
+        idReplay = wx.Window.NewControlId()
         idQuit = wx.Window.NewControlId()
         self.Bind(wx.EVT_MENU, 
                   self.selectTemplate, 
@@ -581,11 +610,13 @@ class PyListenerFrame(wx.Frame):
         self.Bind(wx.EVT_MENU,
                   lambda event: self.onBPButtonPress('startStopListening'),
                   id=idListen)
+        self.Bind(wx.EVT_MENU, self.replayWAV, id=idReplay)
         self.Bind(wx.EVT_MENU, self.onClose, id=idQuit)
         accel_tbl = wx.AcceleratorTable([ 
                                     (wx.ACCEL_CMD,  ord('O'), idSTFolder),
                                     (wx.ACCEL_ALT,  ord('O'), idSTFile),
                                     (wx.ACCEL_NORMAL, wx.WXK_SPACE, idListen),
+                                    (wx.ACCEL_CMD,  ord('R'), idReplay),
                                     (wx.ACCEL_CMD,  ord('Q'), idQuit), 
                                         ]) 
         self.SetAcceleratorTable(accel_tbl)
@@ -628,6 +659,7 @@ class PyListenerFrame(wx.Frame):
                             style=wx.CHK_2STATE,
                           )
         chkB.SetValue(True)
+        chkB.Bind(wx.EVT_CHECKBOX, self.onEditThreshold)
         self.chkB_comp.append(chkB)
         gbs.Add(
                     chkB, 
@@ -655,6 +687,7 @@ class PyListenerFrame(wx.Frame):
                             name=baseName+"_min", 
                             size=(80, -1),
                          )
+        txt.Bind(wx.EVT_TEXT, self.onEditThreshold)
         gbs.Add(
                     txt, 
                     pos=(row,col), 
@@ -685,6 +718,7 @@ class PyListenerFrame(wx.Frame):
                             name=baseName+"_max", 
                             size=(80, -1),
                          )
+        txt.Bind(wx.EVT_TEXT, self.onEditThreshold)
         gbs.Add(
                     txt, 
                     pos=(row,col), 
@@ -707,6 +741,60 @@ class PyListenerFrame(wx.Frame):
         obj = event.GetEventObject()
         turnOn = obj.GetValue()
         for chkB in self.chkB_comp: chkB.SetValue(turnOn)
+        self.compileThresholds()
+
+    #-------------------------------------------------------------------
+
+    def onEditThreshold(self, event):
+        """ A threshold value (or its checkbox) was edited.
+
+        Args:
+            event (wx.Event)
+
+        Returns:
+            None
+        """ 
+        if DEBUG: print("PyListenerFrame.onEditThreshold()")
+        self.compileThresholds()
+
+    #-------------------------------------------------------------------
+
+    def compileThresholds(self):
+        """ Retrieve threshold values from wx.TextCtrl in UI and 
+        compile them to self.thrModel, which is used for comparing 
+        each captured sound fragment.
+
+        Args: None
+
+        Returns:
+            None
+        """ 
+        if DEBUG: print("PyListenerFrame.compileThresholds()")
+        model = PLL.ThresholdModel(self.pl.compParamList)
+        self.thrErr = None
+        for param in self.pl.compParamList:
+        # through each comparison parameter 
+            name = "comp_" + param 
+            chkB = wx.FindWindowByName( name+"_chk", self.panel["ip_spT"] )
+            if chkB == None: return # UI is not ready
+            if chkB.GetValue() == False: continue  # this parameter 
+            # is not checked. move on to the next parameter
+            for mmn in ["min", "max"]:
+                _name = name + "_" + mmn
+                txt = wx.FindWindowByName( _name, self.panel["ip_spT"] )
+                if txt == None: return # UI is not ready
+                txtVal = txt.GetValue().strip()
+                if txtVal == "":  # the textCtrl is empty
+                    continue  # move to the next one, 
+                    # considering this one is satisfied
+                try:
+                    th = float(txtVal)  # threshold value
+                except:
+                    self.thrErr = _name
+                    continue
+                model.set(param, mmn, th)
+        model.compile()
+        self.thrModel = model
 
     #-------------------------------------------------------------------
 
@@ -744,22 +832,71 @@ class PyListenerFrame(wx.Frame):
         elif btnName == 'startStopListening':
             if self.pl.isListening == False:
             # Currently not listening. Start listening.
-                set_img_for_btn("input/img_startStopListening_red.png", btn)
-                ### set up a timer for draw spectrogram
-                self.timers["updateSPTimer"] = wx.Timer(self)
-                self.Bind(wx.EVT_TIMER, 
-                          self.updateSpectrogram, 
-                          self.timers["updateSPTimer"])
-                self.timers["updateSPTimer"].Start(5)
-                # start a thread to listen 
-                self.pl.startContMicListening(self.devNames_cho.GetSelection())
+                self.start_listening()
             else:
             # Currently listening. Stop.
-                set_img_for_btn("input/img_startStopListening_blue.png", btn)
                 self.stop_listening()
     
     #-------------------------------------------------------------------
     
+    def start_listening(self, source=None): 
+        """ Start listening from microphone (or the given audio source).
+
+        Args:
+            source (None/ pyLAudioSource.AudioSource): Audio source
+              to listen to, instead of microphone.
+        
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.start_listening()")
+        btn = wx.FindWindowByName("startStopListening", self.panel["bp"])
+        set_img_for_btn("input/img_startStopListening_red.png", btn)
+        ### set up a timer for draw spectrogram
+        self.timers["updateSPTimer"] = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, 
+                  self.updateSpectrogram, 
+                  self.timers["updateSPTimer"])
+        self.timers["updateSPTimer"].Start(5)
+        # start a thread to listen 
+        self.pl.startContMicListening(self.devNames_cho.GetSelection(), 
+                                      source)
+    
+    #-------------------------------------------------------------------
+    
+    def replayWAV(self, event): 
+        """ Replay a WAV file through the live path 
+        (listening thread, processing and spectrogram drawing), 
+        at chosen speed, for load testing.
+
+        Args: event (wx.Event)
+        
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.replayWAV()")
+        dlg = wx.FileDialog(self, "Select a WAV file to replay", CWD, 
+                            wildcard="(*.wav)|*.wav")
+        if dlg.ShowModal() != wx.ID_OK: return
+        fPath = dlg.GetPath()
+        choices = ['1x', '2x', '4x', '8x', 'Maximum']
+        dlg = wx.SingleChoiceDialog(self, "Replay speed", "Replay WAV file", 
+                                    choices)
+        if dlg.ShowModal() != wx.ID_OK: return
+        sel = choices[dlg.GetSelection()]
+        if sel == 'Maximum': speed = 0
+        else: speed = float(sel.rstrip('x'))
+        if self.pl.isListening == True: self.stop_listening()
+        try:
+            source = ReplaySource(fPath, speed)
+        except (ValueError, OSError) as e:
+            show_msg(str(e))
+            return
+        msg = "%s, [MSG], Replaying %s"%(get_time_stamp(), fPath)
+        msg += " at speed %s.\n"%(sel)
+        writeFile(self.logFile, msg)
+        self.start_listening(source)
+    
+    #-------------------------------------------------------------------
+    
     def stop_listening(self): 
         """ Stop listening from microphone.
 
@@ -768,6 +905,8 @@ class PyListenerFrame(wx.Frame):
         Returns: None
         """ 
         if DEBUG: print("PyListenerFrame.stop_listening()")
+        btn = wx.FindWindowByName("startStopListening", self.panel["bp"])
+        set_img_for_btn("input/img_startStopListening_blue.png", btn)
         ### end timer
         self.timers["updateSPTimer"].Stop()
         self.timers["updateSPTimer"] = None
@@ -791,6 +930,12 @@ class PyListenerFrame(wx.Frame):
         Returns: None
         """
         if DEBUG: print("PyListenerFrame.updateSpectrogram()")
+        th = self.pl.th
+        if th != None and th.is_alive() == False \
+          and self.pl.adHandoff.seq == self.pl.adHandoff.lastSeq:
+        # audio source reached its end and all its data was processed
+            self.stop_listening()
+            return
         # process recent mic audio data
         sfFlag, analyzedP, sfD = self.pl.procMicAudioData() 
         
@@ -817,9 +962,10 @@ class PyListenerFrame(wx.Frame):
                 fp = self.pl.writeWAVfile(sfD) 
                 rsltTxt += "WAV file, %s, is saved."%(fp)
             # show info and its comparison result on textCtrl
-            self.txtSFInfo.SetValue(rsltTxt) 
+            self.txtSFInfo.SetValue(str(rsltTxt)) 
         
-        self.panel['sp'].Refresh() # draw spectrogram
+        if self.pl.overload.allowDisplayRefresh():
+            self.panel['sp'].Refresh() # draw spectrogram
     
     #-------------------------------------------------------------------
     
@@ -1007,6 +1153,9 @@ class PyListenerFrame(wx.Frame):
         if dlg.ShowModal() == wx.ID_OK:
             if self.pl.isListening == True:  # if mic. stream is open, 
                 self.onBPButtonPress('startStopListening')  # close it.
+            if self.templWatcher != None: # stop watching the previous 
+              # template folder
+                self.toggleTemplateWatcher(None)
             fPath = dlg.GetPath()
             self.pl.templFP = fPath
             # get analyzed parameters of template file(s).
@@ -1014,34 +1163,144 @@ class PyListenerFrame(wx.Frame):
             ### update template folder name
             txt = wx.FindWindowByName( "comp_fName", self.panel["ip_spT"] )
             txt.SetValue(path.basename(fPath))
-            ### update comparison param. values
-            pList = self.pl.compParamList
-            for p in pList:
-                bName = "comp_" + p
-                if not p in self.pl.indCPL:
-                    txt = wx.FindWindowByName( bName, self.panel["ip_spT"] )
-                    value = params[p]
-                    if type(value) == 'str': value = "%.3f"%(value)
-                    if type(value) == 'list': value = str(value)
-                    txt.SetValue("%s"%(value))
-                txt = wx.FindWindowByName( bName+"_min", self.panel["ip_spT"] )
-                value = params[p+"_min"]
-                if type(value) == 'str': value = "%.3f"%(value)
-                if type(value) == 'list': value = str(value)
-                txt.SetValue("%s"%(value))
-                txt = wx.FindWindowByName( bName+"_max", self.panel["ip_spT"] )
-                value = params[p+"_max"]
+            self.updateTemplParamWidgets(params)
+
+        self.panel['spT'].Refresh()  # draw spectrogram 
+
+    #-------------------------------------------------------------------
+
+    def updateTemplParamWidgets(self, params):
+        """ Update comparison parameter values in UI 
+        with parameters of template.
+
+        Args:
+            params (dict): Parameters of template WAV data.
+
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.updateTemplParamWidgets()")
+        pList = self.pl.compParamList
+        for p in pList:
+            bName = "comp_" + p
+            if not p in self.pl.indCPL:
+                txt = wx.FindWindowByName( bName, self.panel["ip_spT"] )
+                value = params[p]
                 if type(value) == 'str': value = "%.3f"%(value)
                 if type(value) == 'list': value = str(value)
                 txt.SetValue("%s"%(value))
+            txt = wx.FindWindowByName( bName+"_min", self.panel["ip_spT"] )
+            value = params[p+"_min"]
+            if type(value) == 'str': value = "%.3f"%(value)
+            if type(value) == 'list': value = str(value)
+            txt.SetValue("%s"%(value))
+            txt = wx.FindWindowByName( bName+"_max", self.panel["ip_spT"] )
+            value = params[p+"_max"]
+            if type(value) == 'str': value = "%.3f"%(value)
+            if type(value) == 'list': value = str(value)
+            txt.SetValue("%s"%(value))
+
+    #-------------------------------------------------------------------
+
+    def addTemplateFile(self, event):
+        """ Add a WAV file (exemplar) to the current template,
+        without analyzing the other template files again.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.addTemplateFile()")
+        if self.pl.templStats == None:
+            show_msg("Template is not selected.")
+            return
+        dlg = wx.FileDialog(self, "Select a WAV file to add to template", 
+                            CWD, wildcard="(*.wav)|*.wav")
+        if dlg.ShowModal() != wx.ID_OK: return
+        if self.pl.isListening == True:  # if mic. stream is open, 
+            self.onBPButtonPress('startStopListening')  # close it.
+        try:
+            __, params = self.pl.addTemplateFile(dlg.GetPath())
+        except (ValueError, OSError) as e:
+            show_msg(str(e))
+            return
+        self.updateTemplParamWidgets(params)
+        self.panel['spT'].Refresh()  # draw spectrogram 
+
+    #-------------------------------------------------------------------
+
+    def removeTemplateFile(self, event):
+        """ Remove a WAV file (exemplar) from the current template,
+        without analyzing the other template files again.
 
+        Args: event (wx.Event)
+
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.removeTemplateFile()")
+        if self.pl.templStats == None:
+            show_msg("Template is not selected.")
+            return
+        fps = list(self.pl.templStats.fps)
+        choices = [path.basename(fp) for fp in fps]
+        dlg = wx.SingleChoiceDialog(self, "File to remove from template", 
+                                    "Remove a file from template", choices)
+        if dlg.ShowModal() != wx.ID_OK: return
+        if self.pl.isListening == True:  # if mic. stream is open, 
+            self.onBPButtonPress('startStopListening')  # close it.
+        try:
+            __, params = self.pl.removeTemplateFile(fps[dlg.GetSelection()])
+        except ValueError as e:
+            show_msg(str(e))
+            return
+        self.updateTemplParamWidgets(params)
+        self.panel['spT'].Refresh()  # draw spectrogram 
+
+    #-------------------------------------------------------------------
+
+    def toggleTemplateWatcher(self, event):
+        """ Start/ stop watching the template folder. While watching,
+        the template is reloaded (without stopping listening), 
+        when WAV files in the folder change.
+
+        Args: event (wx.Event)
+
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.toggleTemplateWatcher()")
+        if self.templWatcher != None:
+            self.templWatcher.stop()
+            self.templWatcher = None
+        elif self.pl.templFP == None or not path.isdir(self.pl.templFP):
+            show_msg("Template folder is not selected.")
+        else:
+            self.templWatcher = TemplateWatcher(self.pl.templFP, 
+                    logFile=self.logFile,
+                    callback=lambda p: wx.CallAfter(self.onTemplateReloaded))
+            self.templWatcher.addListener(self.pl)
+            self.templWatcher.start()
+        self.menuWatchTemplate.Check(self.templWatcher != None)
+
+    #-------------------------------------------------------------------
+
+    def onTemplateReloaded(self):
+        """ Template was reloaded by TemplateWatcher.
+        Apply it (if it's not applied yet by processing audio data) 
+        and update UI.
+
+        Args: None
+
+        Returns: None
+        """ 
+        if DEBUG: print("PyListenerFrame.onTemplateReloaded()")
+        self.pl.applyTemplateSwap()
+        self.updateTemplParamWidgets(self.pl.templP)
         self.panel['spT'].Refresh()  # draw spectrogram 
 
     #-------------------------------------------------------------------
    
     def compareSF2cParam(self, sfParams):
-        """ Retrieve parameters from wx.TextCtrl in UI
-        and compare parameters of the captured sound fragment with them.
+        """ Compare parameters of the captured sound fragment with
+        thresholds in UI (compiled in self.thrModel).
 
         Args:
             sfParams (dict): Sound parameters of a captured sound fragment.
@@ -1049,61 +1308,44 @@ class PyListenerFrame(wx.Frame):
         Returns:
             rslt (bool): True means that two sounds matched with given 
                 parameters. False means they didn't match.
-            rsltTxt (str): String stored during processes of the function.
-                It could be error message, information, etc.
+            rsltTxt (PLL.ResultText): Text stored during processes 
+                of the function. It could be error message, information, 
+                etc.
         """ 
         if DEBUG: print("PyListenerFrame.compareSF2cParam()")
         rslt = True  # whether satisfying min. & max. value thresholds
         # of all checked parameters
-        rsltTxt = ""
-        tParams2c = {}  # template WAV parameters to compare
+        rsltTxt = PLL.ResultText()
 
         if self.pl.templFP == None:
         # there's no selected template WAV
             _txt = "! Template WAV is not selected."
             _txt += " No comparison was conducted. !"
-            rsltTxt = "[%s]"%(_txt)
+            rsltTxt += "[%s]"%(_txt)
             writeFile(self.logFile, "%s, [MSG], %s\n"%(get_time_stamp(), _txt))
             rslt = False
             return rslt, rsltTxt 
 
         else:
-            mm = ["min", "max"]
-            for param in self.pl.compParamList:
-            # through each comparison parameter 
-                name = "comp_" + param 
-                chkB = wx.FindWindowByName( name+"_chk", self.panel["ip_spT"] )
-                if chkB.GetValue() == False: continue  # this parameter 
-                # is not checked. move on to the next parameter
-
-                ### prepare min. and max. values (extracted from 
-                ### template WAV and editted by user) to compare 
-                ### with sound fragment params. 
-                for mmn in mm:
-                    _name = name + "_" + mmn
-                    txt = wx.FindWindowByName( _name, self.panel["ip_spT"] )
-                    txtVal = txt.GetValue().strip()
-                    if txtVal == "":  # the textCtrl is empty
-                        continue  # move to the next one, 
-                        # considering this one is satisfied
-                    try:
-                        th = float(txtVal)  # threshold value
-                    except:
-                        # stop listening
-                        self.onBPButtonPress('startStopListening') 
-                        _txt = "%s, [MSG],"%(get_time_stamp())
-                        _txt += " !!! Value of %s is not a number."%(_name)
-                        _txt += " Comparison aborted. !!!\n"
-                        writeFile( self.logFile, _txt)
-                        show_msg(_txt)
-                        rsltTxt += _txt
-                        rslt = False
-                        return rslt, rsltTxt 
-                    tParams2c[param+"_"+mmn] = th
-            if len(tParams2c) > 0:
+            if self.thrModel == None: self.compileThresholds()
+            if self.thrErr != None:
+            # a threshold value is not a number
+                # stop listening
+                self.onBPButtonPress('startStopListening') 
+                _txt = "%s, [MSG],"%(get_time_stamp())
+                _txt += " !!! Value of %s is not a number."%(self.thrErr)
+                _txt += " Comparison aborted. !!!\n"
+                writeFile( self.logFile, _txt)
+                show_msg(_txt)
+                rsltTxt += _txt
+                rslt = False
+                return rslt, rsltTxt 
+            if len(self.thrModel.aKeys) > 0:
                 # compare sound fragment parmaeters 
-                rslt, _txt = self.pl.compareParamsOfSF2T(sfParams, tParams2c)
-                rsltTxt += "%s\n"%(_txt) 
+                rslt, _txt = self.pl.compareParamsOfSF2T(sfParams, 
+                                                         self.thrModel)
+                rsltTxt += _txt
+                rsltTxt += "\n"
        
         return rslt, rsltTxt 
      
@@ -1147,6 +1389,7 @@ class PyListenerFrame(wx.Frame):
         Returns: None
         """
         if DEBUG: print("PyListenerFrame.onClose()")
+        if self.templWatcher != None: self.templWatcher.stop()
         if self.pl.th != None:
             self.stop_listening()
             self.pl.pa.terminate()
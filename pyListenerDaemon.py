@@ -0,0 +1,444 @@
+# coding: UTF-8
+
+"""
+pyListenerDaemon
+Command-line (headless) version of pyListener.
+It listens to sound from microphone, captures sound fragments,
+compares them with a loaded template sound and saves a recognized
+sound as WAV file, without any GUI (wxPython is not required).
+
+It keeps running until it receives SIGINT (Ctrl+C) or SIGTERM
+(or the audio source reaches its end), then closes the audio stream 
+and finishes.
+Instead of microphone, a WAV file, raw PCM data (int16) from stdin or 
+a FIFO, or a synthetic signal can be used as the audio source.
+With --listen, it accepts PCM senders over a UNIX or TCP socket 
+(see pyLSocketSource.py) and each connection is processed by 
+its own PyListener.
+
+Usage:
+    python pyListenerDaemon.py -t input/sample_phee
+    python pyListenerDaemon.py -t input/sample_phee -d 1 -l log/daemon.txt
+    python pyListenerDaemon.py -t input/sample_phee --wav input/test/m_test.wav
+    python pyListenerDaemon.py -t input/sample_phee --wav input/test/m_test.wav --speed 4
+    arecord -f S16_LE -r 44100 | python pyListenerDaemon.py -t input/sample_phee --pcm -
+    python pyListenerDaemon.py -t input/sample_phee --synth noise --duration 60
+    python pyListenerDaemon.py -t input/sample_phee --listen /tmp/pyl.sock
+    python pyListenerDaemon.py --list-devices
+
+Dependency:
+    pyAudio (0.2), (optional; only for microphone input)
+    NumPy (1.17),
+    SciPy (1.3),
+    Scikit-image (0.15),
+
+------------------------------------------------------------------------
+Copyright (C) 2019 Jinook Oh, W. Tecumseh Fitch
+- Contact: jinook.oh@univie.ac.at, tecumseh.fitch@univie.ac.at
+
+This program is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by the
+Free Software Foundation, either version 3 of the License, or (at your
+option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program.  If not, see <http://www.gnu.org/licenses/>.
+------------------------------------------------------------------------
+"""
+
+import sys, re, queue, signal, argparse
+from threading import Thread, Event, Lock
+from os import path, mkdir
+
+import pyListenerLib as PLL
+from pyLAudioSource import WAVFileSource, ReplaySource, PCMPipeSource
+from pyLAudioSource import SyntheticSource
+from pyLSocketSource import SocketPCMServer, parseAddress
+from pyLTemplateWatcher import TemplateWatcher
+from fFuncNClasses import GNU_notice, writeFile, get_time_stamp, chkFPath
+
+__version__ = '0.1'
+DEBUG = False
+
+#=======================================================================
+
+class PyListenerDaemon(object):
+    """ Class for running PyListener without GUI.
+
+    Args:
+        templFP (str): Folder (or file) path of template WAV file(s).
+        devIdx (int): Index of input device in PyListener.devIdx.
+        logFile (str, optional): File path of log file.
+        healthInterval (float, optional): Interval (in seconds) to write
+          capture health metrics in log file. 0 means no logging.
+        source (None/ AudioSource, optional): Audio source to use 
+          instead of microphone.
+        listenAddr (None/ str/ tuple, optional): Socket address to 
+          accept PCM senders, instead of listening to a single source.
+        xcorrThr (None/ float, optional): When given, sound fragments
+          are detected by template cross-correlation with this score
+          threshold, instead of amplitude gating.
+        watchInterval (None/ float, optional): When given (and templFP 
+          is a folder), the template folder is polled with this 
+          interval (in seconds), and the template is reloaded 
+          without stopping, when WAV files in it change.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, templFP, devIdx=0, logFile='', healthInterval=60,
+                 source=None, listenAddr=None, xcorrThr=None,
+                 watchInterval=None):
+        if DEBUG: print("PyListenerDaemon.__init__()")
+        if path.isdir('recordings') == False: mkdir('recordings')
+        self.templFP = templFP # template folder (or file) path
+        self.devIdx = devIdx # index of input device to open
+        self.q2p = queue.Queue() # queue to the processing loop
+        self.healthInterval = healthInterval # interval to log health
+        self.quitEvt = Event() # set when the daemon is finishing
+        self.source = source # audio source (None means microphone)
+        self.listenAddr = listenAddr # socket address for PCM senders
+        self.streams = [] # list of [name, PyListener, queue] of 
+          # connected PCM senders
+        self.streamsLock = Lock()
+        self.nConnections = 0 # number of accepted PCM senders so far
+        self.xcorrThr = xcorrThr # score threshold of 'xcorr' detection
+        self.watcher = None # TemplateWatcher of the template folder
+        flagMic = (source == None and listenAddr == None)
+        self.pl = PLL.PyListener(self, None, logFile, 
+                                 flagMic=flagMic) # PyListener
+        self.logFile = self.pl.logFile
+        self.setDetectMode(self.pl)
+        if watchInterval != None and path.isdir(templFP):
+            self.watcher = TemplateWatcher(templFP, watchInterval, 
+                                           self.logFile)
+
+    #-------------------------------------------------------------------
+
+    def setDetectMode(self, pl):
+        """ Set detection mode of a PyListener.
+
+        Args:
+            pl (PyListener): PyListener to set.
+
+        Returns:
+            None
+        """
+        if self.xcorrThr != None:
+            pl.detectMode = 'xcorr'
+            pl.xcorrThr = self.xcorrThr
+
+    #-------------------------------------------------------------------
+
+    def run(self):
+        """ Load template, start listening thread and process audio
+        data until a quit message arrives.
+
+        Args: None
+
+        Returns:
+            (int): Exit code.
+        """
+        if DEBUG: print("PyListenerDaemon.run()")
+
+        if self.listenAddr != None: return self.runServer()
+        if self.source == None and self.pl.devIdx == []: return 1
+        if self.source == None and self.devIdx >= len(self.pl.devIdx):
+            msg = "%s, [ERROR],"%(get_time_stamp())
+            msg += " Device index %i is not available.\n"%(self.devIdx)
+            writeFile(self.logFile, msg)
+            print(msg)
+            return 1
+
+        ### load template
+        if path.isdir(self.templFP): flag = 'templateFolder'
+        else: flag = 'templateFile'
+        self.pl.templFP = self.templFP
+        self.pl.listen(flag=flag, wavFP=self.templFP)
+
+        ### quit cleanly on SIGINT/ SIGTERM
+        signal.signal(signal.SIGINT, self.onSignal)
+        signal.signal(signal.SIGTERM, self.onSignal)
+
+        msg = "%s, [MSG], pyListenerDaemon started"%(get_time_stamp())
+        msg += " with template, %s.\n"%(self.templFP)
+        writeFile(self.logFile, msg)
+        print(msg)
+
+        self.pl.startContMicListening(self.devIdx, self.source)
+        if self.healthInterval > 0:
+            th = Thread(target=self.logHealth, daemon=True)
+            th.start()
+        if self.watcher != None:
+            self.watcher.addListener(self.pl)
+            self.watcher.start()
+        self.pl.contProcMicAudioData(self.q2p) # blocks until quit
+        self.quitEvt.set()
+        if self.watcher != None: self.watcher.stop()
+        self.pl.endContMicListening()
+        if self.pl.pa != None: self.pl.pa.terminate()
+
+        msg = "%s, [MSG], pyListenerDaemon finished.\n"%(get_time_stamp())
+        writeFile(self.logFile, msg)
+        print(msg)
+        return 0
+
+    #-------------------------------------------------------------------
+
+    def runServer(self):
+        """ Accept PCM senders over a socket until a quit message arrives.
+        Each connection is processed in its own thread with its own
+        PyListener.
+
+        Args: None
+
+        Returns:
+            (int): Exit code.
+        """
+        if DEBUG: print("PyListenerDaemon.runServer()")
+        ### load template first; its sampling rate is the rate 
+        ### of all streams
+        if path.isdir(self.templFP): flag = 'templateFolder'
+        else: flag = 'templateFile'
+        self.pl.templFP = self.templFP
+        self.pl.listen(flag=flag, wavFP=self.templFP)
+        server = SocketPCMServer(self.listenAddr, self.onConnect, 
+                                 self.logFile)
+        signal.signal(signal.SIGINT, self.onSignal)
+        signal.signal(signal.SIGTERM, self.onSignal)
+        msg = "%s, [MSG], pyListenerDaemon started"%(get_time_stamp())
+        msg += " with template, %s,"%(self.templFP)
+        msg += " accepting PCM streams at %s.\n"%(str(self.listenAddr))
+        writeFile(self.logFile, msg)
+        print(msg)
+        server.start()
+        if self.healthInterval > 0:
+            th = Thread(target=self.logHealth, daemon=True)
+            th.start()
+        if self.watcher != None: self.watcher.start()
+        while True:
+            try: rData = self.q2p.get(True, 0.5) # wait for quit message
+            except queue.Empty: continue
+            if rData[0] == 'msg' and rData[1] == 'quit': break
+        self.quitEvt.set()
+        if self.watcher != None: self.watcher.stop()
+        server.close()
+        with self.streamsLock: streams = list(self.streams)
+        for name, pl, q, th in streams: # finish all streams
+            q.put(('msg', 'quit'), True, None)
+            th.join()
+        msg = "%s, [MSG], pyListenerDaemon finished.\n"%(get_time_stamp())
+        writeFile(self.logFile, msg)
+        print(msg)
+        return 0
+
+    #-------------------------------------------------------------------
+
+    def onConnect(self, source):
+        """ Start processing a newly connected PCM sender.
+        (Called by SocketPCMServer)
+
+        Args:
+            source (SocketPCMSource): Audio source of the connection.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("PyListenerDaemon.onConnect()")
+        with self.streamsLock:
+            if source.framerate != PLL.RATE:
+            # sampling rate (of the template) is shared by all 
+            # PyListeners in this process
+                msg = "%s, [ERROR], Stream %s is rejected;"%(get_time_stamp(),
+                                                             source.name)
+                msg += " Sampling rate (%i) is different"%(source.framerate)
+                msg += " from that of the template (%i).\n"%(PLL.RATE)
+                writeFile(self.logFile, msg)
+                source.close()
+                return
+            pl = PLL.PyListener(self, None, self.logFile, flagMic=False)
+            self.setDetectMode(pl)
+            self.nConnections += 1
+            pl.recName = "s%i_%s"%(self.nConnections, 
+                                   re.sub(r'[^0-9A-Za-z.-]+', '_', 
+                                          source.name).strip('_'))
+              # stream in file names of saved sound fragments 
+              # (e.g. s1_127.0.0.1_40312)
+            q = queue.Queue() # queue to the processing loop of the stream
+            th = Thread(target=self.procStream, args=(source, pl, q))
+            self.streams.append([source.name, pl, q, th])
+            th.start()
+
+    #-------------------------------------------------------------------
+
+    def procStream(self, source, pl, q):
+        """ Function for a thread to process a PCM stream from a sender.
+
+        Args:
+            source (SocketPCMSource): Audio source of the connection.
+            pl (PyListener): PyListener for this stream.
+            q (Queue): Queue to get sent message to this thread.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("PyListenerDaemon.procStream()")
+        if path.isdir(self.templFP): flag = 'templateFolder'
+        else: flag = 'templateFile'
+        pl.templFP = self.templFP
+        pl.listen(flag=flag, wavFP=self.templFP)
+        pl.startContMicListening(source=source)
+        if self.watcher != None: self.watcher.addListener(pl)
+        pl.contProcMicAudioData(q) # blocks until quit or disconnection
+        if self.watcher != None: self.watcher.removeListener(pl)
+        pl.endContMicListening()
+        with self.streamsLock:
+            for i in range(len(self.streams)):
+                if self.streams[i][1] is pl: 
+                    self.streams.pop(i)
+                    break
+        msg = "%s, [MSG], PCM stream %s finished.\n"%(get_time_stamp(),
+                                                       source.name)
+        writeFile(self.logFile, msg)
+
+    #-------------------------------------------------------------------
+
+    def logHealth(self):
+        """ Periodically write capture health metrics in log file.
+
+        Args: None
+
+        Returns: None
+        """
+        if DEBUG: print("PyListenerDaemon.logHealth()")
+        while not self.quitEvt.wait(self.healthInterval):
+            if self.listenAddr == None: pls = [('', self.pl)]
+            else:
+                with self.streamsLock: 
+                    pls = [(st[0], st[1]) for st in self.streams]
+            for name, pl in pls:
+                h = pl.getHealth()
+                msg = "%s, [HEALTH],"%(get_time_stamp())
+                if name != '': msg += " stream:%s/"%(name)
+                for key in sorted(h.keys()):
+                    if type(h[key]) == float: msg += " %s:%.1f/"%(key, h[key])
+                    else: msg += " %s:%i/"%(key, h[key])
+                writeFile(self.logFile, msg.rstrip('/') + "\n")
+
+    #-------------------------------------------------------------------
+
+    def onSignal(self, signum, frame):
+        """ Signal handler; request the processing loop to quit.
+
+        Args:
+            signum (int): Received signal number.
+            frame (frame): Current stack frame.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("PyListenerDaemon.onSignal()")
+        msg = "%s, [MSG], Received signal %i.\n"%(get_time_stamp(), signum)
+        writeFile(self.logFile, msg)
+        self.q2p.put(('msg', 'quit'), True, None)
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+def main(argv=None):
+    """ Parse command-line arguments and run the daemon.
+
+    Args:
+        argv (None/ list, optional): Command-line arguments.
+
+    Returns:
+        (int): Exit code.
+    """
+    parser = argparse.ArgumentParser(description="Headless pyListener")
+    parser.add_argument('-t', '--template',
+                        help="Folder (or file) path of template WAV file(s)")
+    parser.add_argument('-d', '--device', type=int, default=0,
+                        help="Index of preferred input device to use")
+    parser.add_argument('-l', '--log', default='', help="Log file path")
+    parser.add_argument('--health-interval', type=float, default=60,
+                        help="Interval (in seconds) to log capture health")
+    parser.add_argument('--wav', help="Use WAV file as audio source")
+    parser.add_argument('--pcm', help="Use raw PCM (int16) from stdin ('-')"
+                                      " or a FIFO as audio source")
+    parser.add_argument('--synth', choices=['tone', 'noise', 'silence'],
+                        help="Use synthetic signal as audio source")
+    parser.add_argument('--rate', type=int, default=44100,
+                        help="Sampling rate of --pcm or --synth source")
+    parser.add_argument('--channels', type=int, default=1,
+                        help="Number of channels of --pcm source")
+    parser.add_argument('--freq', type=float, default=7000.0,
+                        help="Frequency (Hz) of --synth tone")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Duration (in seconds) of --synth source")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Deliver --wav or --synth source in real time")
+    parser.add_argument('--speed', type=float, default=None,
+                        help="Replay --wav source through the live path at"
+                             " this speed factor (0 means maximum speed)")
+    parser.add_argument('--listen', 
+                        help="Accept PCM senders at this socket address"
+                             " ('host:port' for TCP, otherwise UNIX socket"
+                             " file path)")
+    parser.add_argument('--xcorr', type=float, default=None, metavar='THR',
+                        help="Detect sound fragments by sliding template"
+                             " spectrogram (normalized cross-correlation"
+                             " score above THR), instead of amplitude"
+                             " gating")
+    parser.add_argument('--watch', type=float, default=None, metavar='SEC',
+                        help="Poll template folder every SEC seconds and"
+                             " reload template without stopping, when WAV"
+                             " files in it change")
+    parser.add_argument('--list-devices', action='store_true',
+                        help="Print found input devices and quit")
+    parser.add_argument('-w', action='store_true', help="Show warranty")
+    parser.add_argument('-c', action='store_true', help="Show conditions")
+    args = parser.parse_args(argv)
+
+    if args.w: GNU_notice(1); return 0
+    if args.c: GNU_notice(2); return 0
+    GNU_notice(0)
+
+    if args.list_devices:
+        pl = PLL.PyListener(None, None, args.log)
+        for i in range(len(pl.devIdx)):
+            print("%i: %s"%(i, pl.devNames[i]))
+        if pl.pa != None: pl.pa.terminate()
+        return 0
+
+    if args.template == None: parser.error("-t/--template is required.")
+    chkFPath(args.template)
+    source = None
+    listenAddr = None
+    if args.listen != None:
+        listenAddr = parseAddress(args.listen)
+    elif args.wav != None and args.speed != None:
+        source = ReplaySource(args.wav, args.speed)
+    elif args.wav != None:
+        source = WAVFileSource(args.wav, flagRealtime=args.realtime)
+    elif args.pcm != None:
+        source = PCMPipeSource(args.pcm, args.rate, args.channels)
+    elif args.synth != None:
+        source = SyntheticSource(args.synth, freq=args.freq, 
+                                 framerate=args.rate, duration=args.duration,
+                                 flagRealtime=args.realtime)
+    daemon = PyListenerDaemon(args.template, args.device, args.log,
+                              args.health_interval, source, listenAddr,
+                              args.xcorr, args.watch)
+    return daemon.run()
+
+#=======================================================================
+
+if __name__ == "__main__":
+    sys.exit(main())
+
@@ -14,7 +14,7 @@ September 2019.
 
 Dependency:
     wxPython (4.0),
-    pyAudio (0.2),
+    pyAudio (0.2), (optional; only for microphone input)
     NumPy (1.17),
     SciPy (1.3),
     Scikit-image (0.15),
@@ -38,28 +38,36 @@ with this program.  If not, see <http://www.gnu.org/licenses/>.
 ------------------------------------------------------------------------
 """
 
-import queue, wave, struct
-from os import path, mkdir, getcwd
-from threading import Thread
-from time import time
+import queue, wave, json, atexit
+from os import path, mkdir, getcwd, stat, rename, getpid, cpu_count
+from hashlib import sha1
+from threading import Thread, Condition, Lock
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from time import time, perf_counter
 from copy import copy
 from glob import glob
 
-import pyaudio
+try:
+    import pyaudio
+except ImportError: # no microphone input; processing files, etc.
+    pyaudio = None
 import numpy as np
 import warnings
 warnings.filterwarnings("ignore")
 from scipy.ndimage.measurements import center_of_mass 
 from scipy.signal import correlate
 from skimage import filters
-from skimage import transform 
 #from pyentrp import entropy as ent
 
 from fFuncNClasses import chkFPath, writeFile, get_time_stamp
 from fFuncNClasses import receiveDataFromQueue
+from pyLAudioSource import PyAudioSource, WAVFileSource
+from pyLWAVFile import WAVFile
+from pyLXCorr import TemplateXCorrDetector
 
 ### Constants (time related contants are in seconds)
-FORMAT = pyaudio.paInt16
+if pyaudio != None: FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 SAMPLE_WIDTH = 2 # 2 bytes
@@ -70,6 +78,152 @@ FREQ_RES = RATE/float(INPUT_FRAMES_PER_BLOCK)  # Frequency Resolution
 
 DEBUG = False
 CWD = getcwd()
+TEMPL_CACHE_VER = 3 # version of template cache file format (and 
+  # template forming procedure); old cache files are not used when
+  # this changes
+TEMPL_PARALLEL_MIN_FILES = 200 # min. number of template WAV files to
+  # analyze them in worker processes (by default); starting (spawning)
+  # workers takes a few seconds, while analyzing a short WAV file 
+  # takes milliseconds
+
+#=======================================================================
+
+def setAudioRate(framerate):
+    """ Update global constants related to sampling rate.
+
+    Args:
+        framerate (int): Sampling rate.
+
+    Returns:
+        None
+    """
+    global RATE, INPUT_FRAMES_PER_BLOCK, FREQ_RES
+    RATE = framerate
+    INPUT_FRAMES_PER_BLOCK = int(framerate * INPUT_BLOCK_TIME)
+    FREQ_RES = framerate / float(INPUT_FRAMES_PER_BLOCK)
+
+#-----------------------------------------------------------------------
+
+def wavSpectrogram(wf, fpb, chunkBlocks=1024):
+    """ Make spectrogram of a WAV file, reading it in chunks 
+    of 'chunkBlocks' blocks, so memory for reading is bounded.
+    Global constants are not changed, so it can be called in threads.
+
+    Args:
+        wf (WAVFile): Memory-mapped WAV file.
+        fpb (int): Number of frames per block (column).
+        chunkBlocks (int): Number of blocks to read at once.
+
+    Returns:
+        data (np.array): Array contains greyscale spectrogram image. 
+    """
+    if DEBUG: print("wavSpectrogram()")
+    cols = int(round(wf.nframes/float(fpb))) # number of
+      # columns for array
+    data = np.zeros((int(fpb/2), cols), 
+                    dtype=np.uint8) # final data array
+    for ci in range(0, cols, chunkBlocks):
+        n = min(chunkBlocks, cols-ci)
+        wd = wf.read(ci*fpb, n*fpb)
+        if wf.nchannels > 1: wd = wd.mean(axis=1) # to mono data
+        else: wd = wd[:,0]
+        ad = wd * SHORT_NORMALIZE
+        nFull = min(n, int(len(ad)/fpb)) # number of full blocks
+        if nFull < n: # the last block is shorter 
+            last = ad[nFull*fpb:]
+            ad = ad[:nFull*fpb]
+        ad = ad.reshape(nFull, fpb)
+        ad = abs(np.fft.fft(ad, axis=1))[:,:int(fpb/2)]
+        if nFull < n:
+            _ad = abs(np.fft.fft(last))[:int(fpb/2)]
+            ad = np.vstack((ad, _ad.reshape(1, -1)))
+        maxVal = np.max(ad, axis=1, keepdims=True)
+        ad = np.where(maxVal > 1.0, ad/maxVal, ad) # maximum value 
+          # should be 1 
+        ad = (ad * 255).astype(np.uint8) # make an array of 0-255 
+          # for amplitude of pixel
+        ad = np.flip(ad, axis=1) # flip to make low frequency is 
+          # placed at the bottom of screen 
+        data[:,ci:ci+n] = ad.T
+    return data  
+
+#-----------------------------------------------------------------------
+
+def resampleLists(lists, dLen):
+    """ Resample lists of values (of different lengths) to the same
+    length with linear interpolation, all in one np.interp call.
+    Sample positions are aligned at centers of elements 
+    (as skimage.transform.resize).
+
+    Args:
+        lists (list): Lists (or 1D arrays) of values.
+        dLen (int): Length to resample to.
+
+    Returns:
+        (numpy.array): Resampled values; shape is (len(lists), dLen).
+    """
+    if DEBUG: print("resampleLists()")
+    lens = np.array([len(l) for l in lists], dtype=np.float64)
+    starts = np.concatenate(([0.0], np.cumsum(lens)[:-1])) # index of 
+      # the first value of each list in concatenated values
+    vals = np.concatenate([np.asarray(l, dtype=np.float64) for l in lists])
+    ### positions (in each list) to sample
+    x = (np.arange(dLen) + 0.5) / dLen # 0.0-1.0
+    x = x[np.newaxis,:] * lens[:,np.newaxis] - 0.5
+    x = np.clip(x, 0, np.maximum(lens-1, 0)[:,np.newaxis])
+    x += starts[:,np.newaxis] # positions in concatenated values
+    return np.interp(x.ravel(), np.arange(len(vals)), 
+                     vals).reshape(len(lists), dLen)
+
+#-----------------------------------------------------------------------
+
+def toBuiltin(v):
+    """ Convert NumPy values to JSON serializable values
+    (for 'default' argument of json.dumps).
+
+    Args:
+        v: NumPy value.
+
+    Returns:
+        Python number or list.
+    """
+    if isinstance(v, np.integer): return int(v)
+    if isinstance(v, np.floating): return float(v)
+    if isinstance(v, np.ndarray): return v.tolist()
+    raise TypeError(type(v))
+
+#-----------------------------------------------------------------------
+
+_tpl = None # PyListener of a worker process of formTemplate
+
+def initTemplateWorker(framerate, settings):
+    """ Initializer of a worker process of formTemplate.
+
+    Args:
+        framerate (int): Sampling rate of template WAV files.
+        settings (dict): Attributes of PyListener (of the main process),
+          which are used in analysis.
+
+    Returns:
+        None
+    """
+    global _tpl
+    setAudioRate(framerate)
+    _tpl = PyListener(None, flagMic=False)
+    for key in settings: setattr(_tpl, key, settings[key])
+
+#-----------------------------------------------------------------------
+
+def analyzeTemplateFile(fp):
+    """ Analyze a template WAV file in a worker process.
+
+    Args:
+        fp (str): File path of WAV file.
+
+    Returns:
+        (tuple): See PyListener.analyzeTemplateFile.
+    """
+    return _tpl.analyzeTemplateFile(fp)
 
 #=======================================================================
 
@@ -81,12 +235,13 @@ class PyListener(object):
             parent (): Parent object
             frame (wx.Frame, optional): wxPython frame for display.
             logFile (str, optional): File path of log file.
-            debug (None/ bool, optional): Debugging mode or not.
+            flagMic (bool, optional): Whether to use microphone (pyAudio).
+              It's False, when pyAudio is not available.
 
         Attributes:
             Each attribute is described on the line in __init__.
     """ 
-    def __init__(self, parent, frame=None, logFile=''):
+    def __init__(self, parent, frame=None, logFile='', flagMic=True):
         if DEBUG: print("PyListener.__init__()")
         self.parent = parent
         self.frame = frame
@@ -173,13 +328,19 @@ class PyListener(object):
           # By default, this is half the smallest difference 
           # between intensity values in image.
         self.acThrTol_nt = 3.0
-        self.rMicData = []  # data read from mic 
+        self.rMicData = []  # data (numpy arrays) read from mic 
         self.spAD = None  # NumPy array to store recent audio data 
           # for drawing spectrogram
         self.tSpAD = None  # NumPy array to store audio data of 
           # selected WAV file 
         self.th = None # thread 
-        self.q2m = queue.Queue()  # queue to main thread
+        self.source = None # audio source (pyLAudioSource.AudioSource)
+        self.adHandoff = AudioDataHandoff()  # handoff of the most recent 
+          # audio data (from the listening thread to main thread)
+        self.health = CaptureHealth()  # counters and gauges of capturing
+          # and processing audio data
+        self.overload = OverloadController(self.logFile)  # lowers 
+          # processing quality when processing falls behind real time
         self.q2t = queue.Queue()  # queue to a child thread
         self.sFragCI = [-1, -1]  # column indices (beginning and end) of 
           # audio data, in which average RMS amplitude went over threshold
@@ -194,9 +355,50 @@ class PyListener(object):
           # when amplitude was over threshold 
         self.sfP = None  # analyzed parameters of the current 
           # sound fragment (most recent fragment captured by amplitude)
+        self.blockCallbacks = []  # functions to be called (in the listening 
+          # thread) with each new spectrogram column and its RMS amplitude
+        self.sfCallbacks = []  # functions to be called with an event 
+          # (dict) of sound fragment in contProcMicAudioData
+        self.detectMode = 'amp'  # how to capture sound fragments;
+          # 'amp' (RMS amplitude gating) or 'xcorr' (sliding template 
+          # spectrogram, tSpAD, with normalized cross-correlation)
+        self.xcorrThr = 0.3  # threshold of cross-correlation score 
+          # (-1.0-1.0) in 'xcorr' mode
+        self.xcorr = None  # TemplateXCorrDetector in 'xcorr' mode
+        self.xcorrDets = []  # detected fragments (in 'xcorr' mode),
+          # which are not processed yet
+        self.templCacheDir = 'cache'  # folder to store formed template
+          # data (tSpAD and templP) for reusing. None means no caching.
+        self.nTemplWorkers = None  # number of processes to analyze
+          # template WAV files in formTemplate. None means serial
+          # analysis for less than TEMPL_PARALLEL_MIN_FILES files and
+          # number of CPUs for more files.
+        self.templStats = None  # TemplateStats of the current template; 
+          # analyzed data of each template WAV file (exemplar)
+        self.templLib = None  # pyLTemplateLib.TemplateLibrary; when
+          # given, sound fragments are also matched with its templates
+        self.templSwap = None  # (data, params, stats, templFP) of 
+          # a template formed in another thread, which will replace 
+          # the current template in the processing thread
+        self.templSwapLock = Lock()
+        self.tACMax = None  # [tSpAD, max. value of its auto-correlation];
+          # cached for 'corr2auto' of each sound fragment
+        self.templThr = None  # [templP, ThresholdModel of it]
+        self.resultLog = DeferredLog(self.logFile)  # writes results of 
+          # sound fragments in log file, in a thread
+        self.flagPrint = True  # whether to print results of sound 
+          # fragments
+        self.recName = ''  # name in file names of saved sound fragments
+          # (e.g. name of the stream)
+        self.savWI = 0  # index number of the last saved sound fragment
         
-        self.pa = pyaudio.PyAudio()
-        self.devIdx, self.devNames = self.find_device(devType='input')
+        if flagMic == True and pyaudio != None:
+            self.pa = pyaudio.PyAudio()
+            self.devIdx, self.devNames = self.find_device(devType='input')
+        else:
+            self.pa = None
+            self.devIdx = []
+            self.devNames = []
 
         self.initSParr('both') # set up initial spectrogram arrays  
 
@@ -208,7 +410,7 @@ class PyListener(object):
         """ Stop streaming
         """ 
         if DEBUG: print("PyListener.stop()")
-        self.stream.close()
+        self.source.close()
         self.rMicData = [] 
         #self.pa.terminate()
         msg = "%s, [MSG], Audio stream is closed.\n"%(get_time_stamp())
@@ -264,22 +466,31 @@ class PyListener(object):
             chosenDevIdx (int): Device index.
 
         Returns:
-            stream (pyaudio.Stream): Opened audio stream.
+            source (PyAudioSource): Opened audio source.
         """ 
         if DEBUG: print("PyListener.open_mic_stream()")
-        stream = self.pa.open(
-                                format = FORMAT,
-                                channels = CHANNELS,
-                                rate = RATE,
-                                input = True,
-                                input_device_index = self.devIdx[chosenDevIdx],
-                                frames_per_buffer = INPUT_FRAMES_PER_BLOCK,
-                             )
+        source = PyAudioSource(self.pa, 
+                               self.devIdx[chosenDevIdx], 
+                               RATE, 
+                               INPUT_FRAMES_PER_BLOCK)
+        source.open()
         msg = "%s, [MSG],"%(get_time_stamp())
         msg += " Stream of %i."%(self.devIdx[chosenDevIdx])
         msg += " %s is opened.\n"%(self.devNames[chosenDevIdx])
         writeFile(self.logFile, msg)
-        return stream
+        return source
+
+    #-------------------------------------------------------------------
+    
+    def getHealth(self):
+        """ Get a snapshot of capture health metrics.
+        
+        Args: None
+
+        Returns:
+            (dict): See CaptureHealth.snapshot.
+        """
+        return self.health.snapshot()
 
     #-------------------------------------------------------------------
     
@@ -304,12 +515,19 @@ class PyListener(object):
 
         amp = None; params= None
         
-        if flag == 'stream': # read from mic. stream
+        if flag == 'stream': # read from mic. stream (or other audio source)
             try: 
-                data = self.stream.read(INPUT_FRAMES_PER_BLOCK, 
-                                        exception_on_overflow=False)
+                ov = self.source.overflows
+                data = self.source.read(INPUT_FRAMES_PER_BLOCK)
+                if self.source.overflows > ov:
+                    ### input buffer overflowed; a block was dropped 
+                    self.health.onOverflow()
+                    msg = "%s, [ERROR], Input overflowed.\n"%(get_time_stamp())
+                    writeFile(self.logFile, msg)
+                if data is None: return None # end of the source
                 self.rMicData.append(data) # store read data
             except IOError as e:
+                self.health.onReadError()
                 msg = str(e)
                 print(msg)
                 msg = "%s, [ERROR], %s\n"%(get_time_stamp(), msg) 
@@ -320,29 +538,19 @@ class PyListener(object):
             if len(self.rMicData) > w: self.rMicData.pop(0) # remove old data 
               # when it's out of current spectrogram width 
             amp = self.get_rms(data) # get rms amp.
-            data = np.frombuffer(data, dtype=np.short) # int16
             data = self.preProcDataFromMic(data)
 
         elif flag == 'wavFile': # read & analyze a (non-template) WAV file
-            wavData = wave.open(wavFP, 'rb')
-            wp = wavData.getparams()
-            wd = wavData.readframes(wp.nframes)
-            wavData.close()
-            wd = np.frombuffer(wd, dtype=np.dtype('i2'))
-            data = self.preProcDataFromFile(wd, wp, flagInitArr=False)
+            wf = WAVFile(wavFP)
+            data = self.preProcDataFromFile(wf, flagInitArr=False)
+            wf.close()
             params, data = self.analyzeSpectrogramArray(data,
                                         flagTemplate=False) # analyze the sound
 
         elif flag in ['templateFolder', 'templateFile']: 
         # read a WAV file or WAV files in a template folder 
             chkFPath(wavFP) # check folder (file) path's existence
-            if flag == 'templateFolder':
-                p1 = path.join(wavFP, "*.wav")
-                p2 = path.join(wavFP, "*.WAV")
-                fileLists = glob(p1) + glob(p2)
-            elif flag == 'templateFile':
-                fileLists = [ wavFP ]
-            data, params = self.formTemplate(fileLists)
+            data, params = self.loadTemplateData(self.templateFiles(wavFP))
             self.templP = params 
             self.tSpAD = data
         
@@ -350,6 +558,46 @@ class PyListener(object):
 
     #-------------------------------------------------------------------
 
+    def templateFiles(self, wavFP):
+        """ List WAV files of a template.
+
+        Args:
+            wavFP (str): Folder path, which contains WAV files, 
+              or file path of a WAV file.
+
+        Returns:
+            (list): File paths of WAV files.
+        """
+        if DEBUG: print("PyListener.templateFiles()")
+        if path.isdir(wavFP):
+            p1 = path.join(wavFP, "*.wav")
+            p2 = path.join(wavFP, "*.WAV")
+            return glob(p1) + glob(p2)
+        else:
+            return [ wavFP ]
+
+    #-------------------------------------------------------------------
+
+    def loadTemplateData(self, fileLists):
+        """ Get template data of WAV files from the cache, 
+        or form it (and cache it).
+
+        Args:
+            fileLists (list): List of wave files.
+
+        Returns:
+            data (numpy.array): Spectrogram data after analysis.
+            params (dict): Parameters of template WAV data.
+        """
+        if DEBUG: print("PyListener.loadTemplateData()")
+        data, params = self.loadTemplateCache(fileLists)
+        if data is None: # not cached
+            data, params = self.formTemplate(fileLists)
+            self.saveTemplateCache(fileLists, data, params)
+        return data, params
+
+    #-------------------------------------------------------------------
+
     def preProcDataFromMic(self, data):
         """ Pre-process wave data read from microphone.
 
@@ -372,48 +620,27 @@ class PyListener(object):
     
     #-------------------------------------------------------------------
 
-    def preProcDataFromFile(self, wd, wp, flagInitArr=True): 
-        """ Update constants, resize array , etc on the wave file (wd) 
+    def preProcDataFromFile(self, wf, flagInitArr=True, chunkBlocks=1024): 
+        """ Update constants, resize array , etc on the wave file (wf) 
+        and make its spectrogram. The file is read in chunks 
+        of 'chunkBlocks' blocks, so memory for reading is bounded.
 
         Args:
-            wd (np.array): WAV data read from a wave file.
-            wp (namedtuple): WAV parameters such as framerate, nchannels, .. 
+            wf (WAVFile): Memory-mapped WAV file.
             flagInitArr (bool): Whether initialize spectrogram arrays. 
+            chunkBlocks (int): Number of blocks to read at once.
 
         Returns:
             data (np.array): Array contains greyscale spectrogram image. 
         """ 
         if DEBUG: print("PyListener.preProcDataFromFile()")
-        ### update global constants
-        global RATE, INPUT_FRAMES_PER_BLOCK, FREQ_RES
-        RATE = wp.framerate
-        INPUT_FRAMES_PER_BLOCK = int(wp.framerate * INPUT_BLOCK_TIME)
-        FREQ_RES = wp.framerate / float(INPUT_FRAMES_PER_BLOCK)
+        setAudioRate(wf.framerate) # update global constants
 
         ### resize arrays
         if flagInitArr == True: self.initSParr('both')
         if self.frame != None: self.frame.onUpdateRate()
 
-        if wp.nchannels == 2: # stereo
-            wd = (wd[1::2] + wd[::2]) / 2 # stereo data to mono data
-        cols = int(round(wp.nframes/float(INPUT_FRAMES_PER_BLOCK))) # number of
-          # columns for array
-        data = np.zeros((int(INPUT_FRAMES_PER_BLOCK/2), cols), 
-                        dtype=np.uint8) # final data array
-        for ci in range(cols):
-            off = ci * INPUT_FRAMES_PER_BLOCK 
-            ad = wd[off:off+INPUT_FRAMES_PER_BLOCK]
-            ad = ad * SHORT_NORMALIZE
-            ad = abs(np.fft.fft(ad))[:int(INPUT_FRAMES_PER_BLOCK/2)]
-            maxVal = np.max(ad)
-            if maxVal > 1.0: ad = ad/maxVal # maximum value should be 1 
-            ad = (ad * 255).astype(np.uint8) # make an array of 0-255 
-              # for amplitude of pixel
-            ad = np.flip(ad) # flip to make low frequency is placed at 
-              # the bottom of screen 
-            data[:,ci] = ad
-
-        return data  
+        return wavSpectrogram(wf, INPUT_FRAMES_PER_BLOCK, chunkBlocks)
    
     #-------------------------------------------------------------------
     
@@ -444,6 +671,8 @@ class PyListener(object):
         if targetSP in ['sp', 'both']:
             self.sFragCI = [-1, -1]
             self.lastTimeAmpOverThr = None
+            self.xcorr = None
+            self.xcorrDets = []
             # numpy array for spectrogram
             self.spAD = np.zeros((rows, spCols), dtype=np.uint8)
         if targetSP in ['spT', 'both']:
@@ -453,11 +682,14 @@ class PyListener(object):
 
     #-------------------------------------------------------------------
   
-    def startContMicListening(self, chosenDevIdx):
-        """ Start a thread for continuous listening via microphone.
+    def startContMicListening(self, chosenDevIdx=0, source=None):
+        """ Start a thread for continuous listening via microphone
+        (or the given audio source).
 
         Args:
             chosenDevIdx (int): Audio device index to open a stream.
+            source (None/ AudioSource, optional): Audio source to listen
+              to, instead of microphone.
 
         Returns:
             None
@@ -466,65 +698,112 @@ class PyListener(object):
 
         if not isinstance(self.spAD, np.ndarray): return
         self.isListening = True
+        if source != None and source.framerate != RATE:
+            setAudioRate(source.framerate)
+            if self.frame != None: self.frame.onUpdateRate()
         self.initSParr('sp')
+        self.adHandoff = AudioDataHandoff()
+        self.health = CaptureHealth()
+        self.overload = OverloadController(self.logFile)
         self.th = Thread(target=self.contMicListening, 
-                         args=(self.spAD, self.q2m, self.q2t, chosenDevIdx))
+                         args=(self.spAD, self.adHandoff, self.q2t, 
+                               chosenDevIdx, source))
         self.th.start() # start the thread 
 
     #-------------------------------------------------------------------
     
-    def contMicListening(self, spAD, q2m, q2t, chosenDevIdx):
+    def contMicListening(self, spAD, adHandoff, q2t, chosenDevIdx, 
+                         source=None):
         """ Function for a thread for continuous listening to the microphone
-        update data in a column of spAD (spectrogram data in numpy array)
-        It keeps sending data via queue, 
-        spAD, list of RMS amplitudes (amps), current column index of spAD (cci)
+        update data in a column of spectrogram data (numpy array).
+        For each audio block, it puts an immutable snapshot, 
+        (spAD, amps, cci, rMicData, tCap), with a block sequence number 
+        into adHandoff; spectrogram array, tuple of RMS amplitudes (amps), 
+        current column index of spAD (cci), tuple of raw audio data 
+        blocks of the spectrogram columns and time (perf_counter) when 
+        the block was captured. 
 
         Args:
             spAD (np.array): Spectrogram array.
-            q2m (Queue): Queue to send message back.
+            adHandoff (AudioDataHandoff): Handoff to send data back.
             q2t (Queue): Queue to get sent message to this thread.
             chosenDevIdx (int): Audio device index to open.
+            source (None/ AudioSource, optional): Audio source to listen
+              to, instead of microphone. The thread finishes when 
+              the source reaches its end.
 
         Returns:
             None
         """
         if DEBUG: print("PyListener.contMicListening()")
-        cci = 0 # current column index for putting a audio-data column
+        seq = 0 # sequence number of the audio block
+        cols = spAD.shape[1]
+        ring = np.zeros(spAD.shape, dtype=np.uint8) # spectrogram columns;
+          # column of the block 'seq' is stored at 'seq % cols'
         amps = [] # list of RMS amplitudes of recent audio data
-        self.stream = self.open_mic_stream(chosenDevIdx)
+        if source == None:
+            self.source = self.open_mic_stream(chosenDevIdx)
+        else:
+            source.open()
+            self.source = source
         while True:
             rData = receiveDataFromQueue(q2t, self.logFile)
             if rData != None:
                 if rData[0] == 'msg' and rData[1] == 'quit': break
             
-            ad, amp, __ = self.listen('stream') # Listen to the mic  
+            rslt = self.listen('stream') # Listen to the mic  
+            if rslt == None: 
+                if self.source.eof: break
+                continue
+            ad, amp, __ = rslt
+            tCap = perf_counter() # time when this block was captured
+            avail = self.source.getReadAvailable()
+            self.health.onCapture(avail/float(RATE))
+            for cb in self.blockCallbacks: cb(ad, amp)
 
             amps.append(amp)
             if len(amps) > self.ampRecLen: amps.pop(0) 
 
-            if cci < spAD.shape[1]:
-                spAD[:,cci] = ad 
-                cci += 1
+            ring[:,seq%cols] = ad 
+            seq += 1
+            if seq <= cols: 
+                _spAD = ring.copy()
             else:
-                ### remove 1st column and append the column of 
-                ### new audio-data at the end of array
-                _tmp = np.copy(spAD[:,1:])
-                spAD = np.zeros(spAD.shape, dtype=np.uint8)
-                spAD[:,:-1] = _tmp
-                spAD[:,-1] = ad 
-
-            if isinstance(ad, np.ndarray):
-                q2m.put(('aData', (spAD, amps, cci)), True, None)
+                ### oldest column first 
+                i = seq % cols
+                _spAD = np.concatenate((ring[:,i:], ring[:,:i]), axis=1)
+            _spAD.flags.writeable = False
+            cci = min(seq, cols)
+            if self.source.lossless:
+            # wait for the previous block to be processed
+                flagQuit = False
+                while not adHandoff.waitTaken(INPUT_BLOCK_TIME*4):
+                    rData = receiveDataFromQueue(q2t, self.logFile)
+                    if rData != None and rData[0] == 'msg' \
+                      and rData[1] == 'quit': 
+                        flagQuit = True
+                        break
+                if flagQuit: break
+            adHandoff.put(seq, (_spAD, tuple(amps), cci, tuple(self.rMicData),
+                                tCap))
         self.stop() 
 
     #-------------------------------------------------------------------
     
-    def contProcMicAudioData(self, q2t):
+    def contProcMicAudioData(self, q2t, timeout=INPUT_BLOCK_TIME*4):
         """ This function is for when 
         there's no GUI frame to continuously process microphone data.
+        Instead of polling queues, it blocks (up to 'timeout') until 
+        the listening thread sends new audio data.
+        Each event is sent to functions in self.sfCallbacks as a dict;
+          dict(event='started'/'stopped', time=...) or 
+          dict(event='fragment', time=..., params=..., matched=..., 
+               fp=..., txt=...).
 
         Args:
             q2t (Queue): Queue to get sent message to this thread.
+            timeout (float): Maximum time (in seconds) to wait for 
+              audio data before checking 'q2t' again.
 
         Returns:
             None
@@ -534,42 +813,100 @@ class PyListener(object):
             rData = receiveDataFromQueue(q2t, self.logFile)
             if rData != None:
                 if rData[0] == 'msg' and rData[1] == 'quit': break
+            if self.th != None and self.th.is_alive() == False \
+              and self.adHandoff.seq == self.adHandoff.lastSeq:
+            # listening thread finished and all its data was processed
+                msg = "%s, [MSG],"%(get_time_stamp())
+                msg += " Listening thread is not running.\n"
+                self.resultLog.write(msg)
+                print(msg)
+                break
 
             # process recent audio data from mic.
-            sfFlag, analyzedP, sfD = self.procMicAudioData()
+            sfFlag, analyzedP, sfD = self.procMicAudioData(timeout=timeout)
 
             if sfFlag == 'started': print("Sound fragment started.")
             elif sfFlag == 'stopped': print ("Sound fragment stopped.")
+            if sfFlag != "":
+                for cb in self.sfCallbacks: cb(dict(event=sfFlag, time=time()))
             if analyzedP != None:
             # there are analyzed parameters of sound fragment
-                rsltTxt = self.logSFParms(analyzedP) # log parameters of sound
-                tParams2c = {}
-                for param in self.compParamList:
-                    tParams2c[param+'_min'] = self.templP[param+"_min"]
-                    tParams2c[param+'_max'] = self.templP[param+"_max"]
-                # compare sound fragment parmaeters with template 
-                rslt, _txt = self.compareParamsOfSF2T(analyzedP, tParams2c) 
-                if rslt == True: # matched
-                    rsltTxt += "%s\n"%(_txt) 
-                    fp = self.writeWAVfile(sfD) # save the captured sound 
-                      # to a wave file
-                    rsltTxt += "WAV file, %s, is saved."%(fp)
-                else: # didn't match
-                    rsltTxt += "%s\n"%(_txt) 
-                print(rsltTxt)
+                rslt, rsltTxt, fp = self.compareSF2Template(analyzedP, sfD,
+                                                        self.recordingFP())
+                if self.flagPrint: print(rsltTxt)
+                evt = dict(event='fragment', time=time(), params=analyzedP, 
+                           matched=rslt, fp=fp, txt=rsltTxt)
+                for cb in self.sfCallbacks: cb(evt)
+
+    #-------------------------------------------------------------------
+
+    def templThresholds(self):
+        """ Compiled threshold ranges of the current template.
+        They're compiled once for a template (templP).
+
+        Args: None
+
+        Returns:
+            (ThresholdModel): Thresholds of compParamList.
+        """
+        if self.templThr == None or self.templThr[0] is not self.templP:
+            if DEBUG: print("PyListener.templThresholds()")
+            tm = ThresholdModel(self.compParamList, self.templP)
+            self.templThr = [self.templP, tm]
+        return self.templThr[1]
+
+    #-------------------------------------------------------------------
+    
+    def compareSF2Template(self, analyzedP, sfD, fp="", flagSave=True):
+        """ Log parameters of a captured sound fragment, compare them 
+        with the template parameters and save the sound fragment 
+        as a WAV file when it matched.
+
+        Args:
+            analyzedP (dict): Parameters of the captured sound fragment.
+            sfD (list): Raw audio data blocks of the sound fragment.
+            fp (str, optional): File path to save WAV file.
+            flagSave (bool, optional): Whether to save the matched sound
+              fragment as a WAV file.
+
+        Returns:
+            rslt (bool): Whether the sound fragment matched.
+            rsltTxt (ResultText): Result text; formatted when it's read
+              (str).
+            fp (str): File path of the saved WAV file ('' if not saved).
+        """
+        if DEBUG: print("PyListener.compareSF2Template()")
+        rsltTxt = self.logSFParms(analyzedP) # log parameters of sound
+        # compare sound fragment parmaeters with template 
+        rslt, _txt = self.compareParamsOfSF2T(analyzedP, 
+                                              self.templThresholds()) 
+        rsltTxt += _txt
+        if self.templLib != None:
+            # names of matched templates in the library
+            analyzedP['templates'] = self.templLib.match(analyzedP)
+            rsltTxt += "Matched templates in library: %s\n\n"%(
+                                        "/ ".join(analyzedP['templates']))
+        if rslt == True and flagSave: # matched
+            fp = self.writeWAVfile(sfD, fp) # save the captured sound 
+              # to a wave file
+            rsltTxt += "WAV file, %s, is saved.\n\n"%(fp)
+        else:
+            fp = ""
+        return rslt, rsltTxt, fp
 
     #-------------------------------------------------------------------
     
     def procMicAudioData(self, isWavFile=False,
                          isLastCall=False, spAD=None, amps=None, 
-                         cci=None, flagAnalyze=True):
+                         cci=None, flagAnalyze=True, timeout=None,
+                         cciOffset=0):
         """ Receive mic. audio data from running thread (contMicListening), 
         and process it. This function is called by a function 
         'frame.updateSpectrogram', which runs periodically using wx.Timer.
 
         When a long WAV file was loaded, this function is directly called,
-        without using Queue. In this case, 'data', 'amps' and 'ci' arguments
-        are given.
+        without using AudioDataHandoff. In this case, 'data', 'amps' and 
+        'ci' arguments are given.
 
         Args:
             isWavFile (bool): When this is True, data, amps and cci arguments 
@@ -580,14 +917,20 @@ class PyListener(object):
             amps (list, optional): List of RMS amplitudes.
             cci (int, optional): Current column index.
             flagAnalyze (bool): Whether analyze audio data or not. 
+            timeout (None/ float, optional): When given, wait for audio 
+              data from the thread up to this time (in seconds), 
+              instead of returning immediately.
+            cciOffset (int, optional): Block index of the first column 
+              of spAD (when spAD is a sliding window of a WAV file).
 
         Returns:
             sfFlag (bool): Whether sound fragment captureing started or stopped
             params (dict): Parameters of the cpatured sound fragment.
-            sfD (list): Each item is string read from mic. stream. Length of 
-                each item is INPUT_FRAMES_PER_BLOCK. 
+            sfD (list): Each item is int16 data (numpy array) read from mic.
+                stream. Length of each item is INPUT_FRAMES_PER_BLOCK. 
         """ 
         if DEBUG: print("PyListener.procMicAudioData()")
+        self.applyTemplateSwap()
         rData = None
         sfci = self.sFragCI
         sfFlag = ""
@@ -597,19 +940,19 @@ class PyListener(object):
         if isWavFile == False:
         # Mic. data
             ### get the most recent data
-            missing_msg_cnt = -1  
-            while self.q2m.empty() == False:
-                rData = receiveDataFromQueue(self.q2m, self.logFile)
-                missing_msg_cnt += 1 # count how many queued messages 
-                  # were missed 
-            if rData != None and rData[0] == 'aData':
-                self.spAD = rData[1][0] # spectrogram data from mic
-                amps = rData[1][1] 
-                cci = rData[1][2] # current column index
+            rData = self.adHandoff.get(timeout)
+            if rData != None:
+                seq, (self.spAD, amps, cci, rmd, tCap), missed = rData
+                self.health.onProcess(seq, missed, tCap)
+                self.overload.update(self.health.snapshot()['lagMs'])
+                  # cci: current column index 
                   # (in which the last audio stream data was stored)
-                if cci >= self.spAD.shape[1]: # spectrogram is moving
+                ### number of columns the spectrogram moved since 
+                ### the last received data 
+                w = self.spAD.shape[1]
+                num = max(0, seq-w) - max(0, seq-missed-1-w)
+                if num > 0: # spectrogram is moving
                     ### move column indcies of spectrogram
-                    num = 1 + missing_msg_cnt
                     if sfci[0] > -1: sfci[0] -= num 
                     else: sfci = [-1, -1]
                     if sfci[1] > -1: sfci[1] -= num
@@ -623,27 +966,35 @@ class PyListener(object):
                     while None in self.sfRslts: self.sfRslts.remove(None)
         else:
         # processing WAV file
-            missing_msg_cnt = 0
             self.spAD = spAD 
+            rmd = self.rMicData
 
         if flagAnalyze == False: return # return if no analysis is requested.
 
-        if (rData != None and rData[0] == 'aData') or isWavFile == True:
+        if self.detectMode == 'xcorr' and (rData != None or isWavFile):
+            if isWavFile: # columns up to cci are available
+                return self.procXCorr(cciOffset, cci+1, rmd, isLastCall)
+            else: # columns before cci are available
+                return self.procXCorr(seq-cci, cci, rmd)
+
+        if rData != None or isWavFile == True:
             if isWavFile and isLastCall: amps = [0]
-            if amps != [] and np.average(amps) > self.ampThr:
+            if len(amps) > 0 and np.average(amps) > self.ampThr:
             # average of RMS amplitude of recent audio data is over threshold
                 if self.lastTimeAmpOverThr == None:
                     sfFlag = 'started' 
                     sfci = [ max(0, cci-self.ampRecLen), -1 ] # store the 
                       # beginning index of data
-                if isWavFile: self.lastTimeAmpOverThr = cci * INPUT_BLOCK_TIME
-                else: self.lastTimeAmpOverThr = time()
+                if isWavFile: 
+                    self.lastTimeAmpOverThr = (cci+cciOffset) * INPUT_BLOCK_TIME
+                else: self.lastTimeAmpOverThr = seq * INPUT_BLOCK_TIME
                 
             else:
             # RMS amp. is under threshold
                 isEndOfSF = False
-                if self.lastTimeAmpOverThr != None \
-                  and time()-self.lastTimeAmpOverThr > self.maxDurLowerThr:
+                if not isWavFile and self.lastTimeAmpOverThr != None \
+                  and seq*INPUT_BLOCK_TIME - self.lastTimeAmpOverThr \
+                    > self.maxDurLowerThr:
                 # sound fragment started and 
                 # amplitude was below threshold for 
                 # long enough time (> self.maxDurLowerThr)
@@ -651,7 +1002,7 @@ class PyListener(object):
                 
                 if isWavFile and self.lastTimeAmpOverThr != None:
                 # processing WAV file and sound fragment already started.
-                    _time = cci * INPUT_BLOCK_TIME 
+                    _time = (cci+cciOffset) * INPUT_BLOCK_TIME 
                     if _time-self.lastTimeAmpOverThr > self.maxDurLowerThr \
                       or isLastCall:
                     # amplitude was below threshold for long enough
@@ -664,16 +1015,7 @@ class PyListener(object):
                     sfci[1] = cci-1 # record the last column index
                     if (sfci[1]-sfci[0]) * INPUT_BLOCK_TIME >= self.minDur4SF:
                     # reached the minimum duration
-                        _d = self.spAD[:,sfci[0]:sfci[1]] # sound fragment data
-                          # to analyze
-                        params, _d = self.analyzeSpectrogramArray(_d,
-                                        flagTemplate=False) # analyze the sound
-                        self.sfP = params 
-                        self.spAD[:,sfci[0]:sfci[1]] = _d
-                        sfD = self.rMicData[sfci[0]:sfci[1]] # get raw data
-                              # (from mic.) of the analyzed sound fragment 
-                        self.sfcis.append( copy(sfci) ) # store column index
-                        if self.templFP == None: self.sfRslts.append('N/A')
+                        params, sfD = self.procSoundFragment(sfci, rmd)
                     else: # didn't reach minimum duration
                         sfci = [-1, -1]
            
@@ -681,6 +1023,121 @@ class PyListener(object):
         return sfFlag, params, sfD
 
     #-------------------------------------------------------------------
+
+    def procSoundFragment(self, sfci, rmd):
+        """ Analyze a captured sound fragment in the current spectrogram
+        (or save it without analysis when processing is overloaded).
+
+        Args:
+            sfci (list): Column indices (beginning and end) of the sound
+              fragment in self.spAD.
+            rmd (list/ tuple): Raw audio data blocks of the columns 
+              of self.spAD.
+
+        Returns:
+            params (None/ dict): Parameters of the sound fragment.
+              None when it was saved without analysis.
+            sfD (list): Raw audio data blocks of the sound fragment.
+        """
+        if DEBUG: print("PyListener.procSoundFragment()")
+        params = None
+        ol = self.overload
+        sfD = list(rmd[sfci[0]:sfci[1]]) # get raw data
+          # (from mic.) of the sound fragment 
+        if ol.level >= ol.RMS_ONLY:
+        # it's overloaded. Save sound fragment without analysis.
+            fp = self.writeWAVfile(sfD, self.recordingFP())
+            msg = "%s, [RESULT],"%(get_time_stamp())
+            msg += " (RMS-only gating due to overload)"
+            msg += " Sound fragment is saved without comparison;"
+            msg += " %s\n"%(fp)
+            self.resultLog.write(msg)
+            self.sfcis.append( copy(sfci) ) # store column index
+            self.sfRslts.append('N/A')
+        else:
+            _d = self.spAD[:,sfci[0]:sfci[1]] # sound fragment data
+              # to analyze
+            if ol.level >= ol.COARSE_ROWS: rowStep = 2
+            else: rowStep = 1
+            params, _d = self.analyzeSpectrogramArray(_d,
+                            flagTemplate=False, rowStep=rowStep,
+                            flagCorr=(ol.level<ol.SKIP_CORR2AUTO)
+                                        ) # analyze the sound
+            self.sfP = params 
+            if self.spAD.flags.writeable == False:
+                self.spAD = self.spAD.copy() # received snapshot
+            self.spAD[:,sfci[0]:sfci[1]] = _d
+            self.sfcis.append( copy(sfci) ) # store column index
+            if self.templFP == None: self.sfRslts.append('N/A')
+        return params, sfD
+
+    #-------------------------------------------------------------------
+
+    def initXCorrDetector(self, chunkCols):
+        """ Make a TemplateXCorrDetector with the current template 
+        spectrogram, using rows in self.comp_freq_range.
+
+        Args:
+            chunkCols (int): Number of lags to calculate at once.
+
+        Returns:
+            (TemplateXCorrDetector): Detector.
+        """
+        if DEBUG: print("PyListener.initXCorrDetector()")
+        rows = self.tSpAD.shape[0]
+        cutI1 = max(0, rows-int(self.comp_freq_range[1]/FREQ_RES))
+        cutI2 = rows-int(self.comp_freq_range[0]/FREQ_RES)
+        return TemplateXCorrDetector(self.tSpAD, (cutI1, cutI2), 
+                                     self.xcorrThr, chunkCols)
+
+    #-------------------------------------------------------------------
+
+    def procXCorr(self, first, nCols, rmd, isLastCall=False):
+        """ Capture sound fragments by sliding the template spectrogram
+        over new columns of self.spAD ('xcorr' mode of procMicAudioData).
+        Detected fragments are processed one per call, while their data
+        is still in self.spAD.
+
+        Args:
+            first (int): Block index of the first column of self.spAD.
+            nCols (int): Number of available columns in self.spAD.
+            rmd (list/ tuple): Raw audio data blocks of the columns 
+              of self.spAD.
+            isLastCall (bool): Whether it's the end of the audio data.
+
+        Returns:
+            (tuple): Same with procMicAudioData. Cross-correlation 
+              score is stored in params as 'xcorr'.
+        """
+        if DEBUG: print("PyListener.procXCorr()")
+        if self.templP == None: return "", None, None
+        if self.xcorr == None or self.xcorr.src is not self.tSpAD:
+        # no detector or template was changed
+            self.xcorr = self.initXCorrDetector(4)
+            self.xcorr.reset(first)
+            self.xcorrDets = []
+        det = self.xcorr
+        if det.nextCol < first or det.nextCol > first+nCols:
+        # missed columns (or a new stream); start over
+            det.reset(first)
+        blocks = rmd[det.nextCol-first:nCols]
+        if len(blocks) > 0: cols = self.xcorrColumns(np.array(blocks))
+        else: cols = np.zeros((int(INPUT_FRAMES_PER_BLOCK/2), 0))
+        self.xcorrDets += det.push(cols, isLastCall)
+        while self.xcorrDets != []:
+            sc, ec, score = self.xcorrDets.pop(0)
+            if sc < first: 
+                msg = "%s, [ERROR], Detected sound fragment"%(get_time_stamp())
+                msg += " (blocks %i-%i) is out of"%(sc, ec)
+                msg += " the spectrogram, and was not processed.\n"
+                self.resultLog.write(msg)
+                continue
+            params, sfD = self.procSoundFragment([sc-first, ec-first], rmd)
+            if params != None: params['xcorr'] = score
+            return "", params, sfD
+        return "", None, None
+
+    #-------------------------------------------------------------------
     
     def endContMicListening(self):
         """ Finish the thread for continuous listening via mic.
@@ -694,6 +1151,7 @@ class PyListener(object):
         self.q2t.put(('msg', 'quit'), True, None) 
         self.th.join()
         self.th = None
+        self.resultLog.flush()
 
         self.isListening = False
         self.sFragCI = [-1, -1]
@@ -712,86 +1170,351 @@ class PyListener(object):
         Returns:
             None
         """
-        wavData = wave.open(wavFP, 'rb') # read WAV file
-        wp = wavData.getparams() # get wave parameters 
-        
-        global RATE, INPUT_FRAMES_PER_BLOCK
-        RATE = wp.framerate
-        INPUT_FRAMES_PER_BLOCK = int(RATE*INPUT_BLOCK_TIME)
+        self.compareSource2Template(WAVFileSource(wavFP))
+
+    #-------------------------------------------------------------------
+
+    def compareSource2Template(self, source):
+        """ Read an audio source, which has a known length, block by block
+          (as if it's Mic. stream) to compare its audio data contents 
+          to template WAV data.
+
+        Args:
+            source (AudioSource): Audio source to read. 
+
+        Returns:
+            None
+        """
+        for __ in self.iterCompareSource2Template(source): pass
+    
+    #-------------------------------------------------------------------
+
+    def iterCompareWAV2Template(self, wavFP, winCols=2400):
+        """ Streaming version of compareWAV2Template, 
+        which yields each sound fragment (see iterCompareSource2Template).
+
+        Args:
+            wavFP (str): File path of a WAV file. 
+            winCols (int): Initial number of blocks in the sliding window.
+
+        Yields:
+            (dict): Result of a sound fragment.
+        """
+        return self.iterCompareSource2Template(WAVFileSource(wavFP), winCols)
+
+    #-------------------------------------------------------------------
+
+    def iterCompareSource2Template(self, source, winCols=2400):
+        """ Read an audio source, which has a known length, block by block
+          (as if it's Mic. stream) to compare its audio data contents 
+          to template WAV data, yielding each sound fragment.
+          Only a sliding window of spectrogram and raw audio data 
+          (of 'winCols' blocks) is kept, so memory doesn't grow with 
+          the length of the source. The window grows only when a single
+          sound fragment is longer than the window.
+
+        Args:
+            source (AudioSource): Audio source to read. 
+            winCols (int): Initial number of blocks in the sliding window.
 
-        cols = int(round(wp.nframes/float(INPUT_FRAMES_PER_BLOCK))) # number of
-          # columns for array
+        Yields:
+            (dict): Result of a sound fragment; startCol, endCol (block
+              indices), startTime, endTime (in seconds), params, 
+              matched, fp (file path of saved WAV file).
+        """
+        if DEBUG: print("PyListener.iterCompareSource2Template()")
+        if source.nframes == None:
+            raise ValueError("Length of the audio source should be known.")
+        source.open()
+        setAudioRate(source.framerate)
+
+        cols = int(round(source.nframes/float(INPUT_FRAMES_PER_BLOCK))) 
+          # number of blocks of the source
+        L = self.ampRecLen
+        back = L # number of columns to keep when the window slides
+        self.xcorr = None
+        self.xcorrDets = []
+        if self.detectMode == 'xcorr' and self.templP != None:
+            self.xcorr = self.initXCorrDetector(64)
+            back = max(L, self.xcorr.lookback) # keep data of 
+              # detected (and not processed yet) sound fragments
         amps = []
-        spAD = np.zeros((int(INPUT_FRAMES_PER_BLOCK/2), cols), 
-                        dtype=np.uint8) # spectrogram data array
+        spAD = np.zeros((int(INPUT_FRAMES_PER_BLOCK/2), 
+                         max(winCols, back+1)), 
+                        dtype=np.uint8) # spectrogram data array (window)
+        off = 0 # block index of the first column of the window
+        self.rMicData = [] # raw audio data of the window
+        self.lastTimeAmpOverThr = None
+        self.sFragCI = [-1, -1]
+        self.sfcis = []
+        self.sfRslts = []
         isLastCall = False 
         savWI = 1 # index number for WAV file to save
 
+        def result(analyzedP, sfD):
+        # compare analyzed parameters (of the last sound fragment)
+            nonlocal savWI
+            fp = "recordings/rec_%s_%03i.wav"%(get_time_stamp(), savWI)
+            rslt, rsltTxt, fp = self.compareSF2Template(analyzedP, sfD, fp)
+            if rslt == True: savWI += 1
+            if self.flagPrint: print(rsltTxt)
+            sc, ec = self.sfcis[-1]
+            return dict(startCol=sc+off, endCol=ec+off, 
+                        startTime=(sc+off)*INPUT_BLOCK_TIME,
+                        endTime=(ec+off)*INPUT_BLOCK_TIME,
+                        params=analyzedP, matched=rslt, fp=fp)
+
         ### process WAV audio data as if it's a streaming data from Mic.
-        for cci in range(cols):
-            wd = wavData.readframes(INPUT_FRAMES_PER_BLOCK)
+        for bi in range(cols):
+            cci = bi - off # column index in the window
+            if cci == spAD.shape[1]: # window is full
+                if self.lastTimeAmpOverThr != None: k = self.sFragCI[0]
+                else: k = cci - back # keep data to look back for a new
+                  # sound fragment
+                if k <= 0: # a sound fragment fills the window
+                    spAD = np.hstack((spAD, np.zeros_like(spAD)))
+                else: # slide the window by k blocks
+                    spAD[:,:cci-k] = spAD[:,k:cci]
+                    del self.rMicData[:k]
+                    off += k
+                    cci -= k
+                    if self.sFragCI[0] > -1: self.sFragCI[0] -= k
+                    self.sfcis = []
+                    self.sfRslts = []
+            wd = source.read(INPUT_FRAMES_PER_BLOCK)
+            if wd is None: wd = np.zeros(INPUT_FRAMES_PER_BLOCK, np.int16)
             self.rMicData.append(wd) # store read WAV data
             amp = self.get_rms(wd) # get rms amp.
             amps.append(amp)
-            if len(amps) > self.ampRecLen: amps.pop(0)
-            wd = np.frombuffer(wd, dtype=np.short) # int16
+            if len(amps) > L: amps.pop(0)
             ad = self.preProcDataFromMic(wd)
             spAD[:,cci] = ad
-            if cci == cols-1: isLastCall = True
+            if bi == cols-1: isLastCall = True
             sfFlag, analyzedP, sfD = self.procMicAudioData(True, isLastCall,
                                                            spAD, amps,
-                                                           cci)
+                                                           cci, 
+                                                           cciOffset=off)
             if analyzedP != None:
             # analyzed parameters are available
-                rsltTxt = self.logSFParms(analyzedP) # log paraemters 
-                  # of sound fragment
-                ### prepare parameters to prepare
-                tParams2c = {}
-                for param in self.compParamList:
-                    tParams2c[param+'_min'] = self.templP[param+"_min"]
-                    tParams2c[param+'_max'] = self.templP[param+"_max"]
-                # compare sound fragment parmaeters with template 
-                rslt, _txt = self.compareParamsOfSF2T(analyzedP, tParams2c) 
-                if rslt == True:
-                # matched
-                    rsltTxt += "%s"%(_txt) 
-                    fp = "recordings/rec_%s_%03i.wav"%(get_time_stamp(), savWI)
-                    savWI += 1
-                    self.writeWAVfile(sfD, fp) # save the captured sound 
-                      # to a wave file
-                    rsltTxt += "WAV file, %s, is saved.\n\n"%(fp)
-                else:
-                # didn't match
-                    rsltTxt += "%s"%(_txt) 
-                print(rsltTxt)
-        wavData.close()
+                yield result(analyzedP, sfD)
+        while self.xcorrDets != []:
+        # sound fragments detected at the end of the source
+            __, analyzedP, sfD = self.procMicAudioData(True, True, spAD, 
+                                                       amps, cci, 
+                                                       cciOffset=off)
+            if analyzedP != None: yield result(analyzedP, sfD)
+        source.close()
+        self.resultLog.flush()
+        self.rMicData = []
     
     #-------------------------------------------------------------------
 
+    def scanWAVFile(self, wavFP, flagCompare=True, chunkBlocks=4096,
+                    flagSave=True):
+        """ Offline (faster than real time) version of compareWAV2Template.
+        RMS amplitudes of all blocks are calculated at once (reading 
+        the file in chunks), sound fragments are found from runs of 
+        blocks above threshold (with the same ampThr, maxDurLowerThr 
+        and minDur4SF semantics as procMicAudioData), then only the 
+        blocks of the fragments are read again for spectrogram and 
+        analysis.
+        In 'xcorr' detectMode, sound fragments are found by sliding 
+        the template spectrogram over the spectrogram of the file,
+        and the score is stored in params as 'xcorr'.
+
+        Args:
+            wavFP (str): File path of a WAV file. 
+            flagCompare (bool): Whether to compare fragments with 
+              template.
+            chunkBlocks (int): Number of blocks to read at once.
+            flagSave (bool): Whether to save matched fragments as 
+              WAV files, named after wavFP and the starting block.
+
+        Returns:
+            (list): Each item is a dict of a sound fragment; 
+              startCol, endCol (block indices), startTime, endTime
+              (in seconds), params, matched (None when not compared), 
+              fp (file path of saved WAV file).
+        """
+        if DEBUG: print("PyListener.scanWAVFile()")
+        source = WAVFileSource(wavFP)
+        source.open()
+        setAudioRate(source.framerate)
+        fpb = INPUT_FRAMES_PER_BLOCK
+        cols = int(round(source.nframes/float(fpb))) # number of blocks
+
+        scores = {} # cross-correlation score of each sound fragment
+        if self.detectMode == 'xcorr' and self.templP != None:
+            ### slide template spectrogram over the file
+            det = self.initXCorrDetector(chunkBlocks)
+            frags = []
+            for i in range(0, cols, chunkBlocks):
+                n = min(chunkBlocks, cols-i)
+                wd = source.read(n*fpb)
+                if wd is None: wd = np.zeros(n*fpb, np.int16)
+                _d = self.xcorrColumns(wd.reshape(n, fpb))
+                for sc, ec, score in det.push(_d, i+n == cols):
+                    frags.append((sc, ec))
+                    scores[sc] = score
+        else:
+            ### RMS amplitude of each block
+            amps = np.zeros(cols)
+            for i in range(0, cols, chunkBlocks):
+                n = min(chunkBlocks, cols-i)
+                wd = source.read(n*fpb)
+                if wd is None: break # the rest is silence
+                d = wd.astype(np.float64) * SHORT_NORMALIZE
+                d = d.reshape(n, fpb)
+                amps[i:i+n] = np.sqrt(np.einsum('ij,ij->i', d, d) / fpb)
+            frags = self.segmentAmps(amps)
+
+        rslts = []
+        fn = path.splitext(path.basename(wavFP))[0]
+        for sc, ec in frags:
+            ### spectrogram of the sound fragment
+            source.seek(sc*fpb)
+            wd = source.read((ec-sc)*fpb)
+            if wd is None: wd = np.zeros((ec-sc)*fpb, np.int16)
+            blocks = wd.reshape(ec-sc, fpb)
+            _d = self.blocks2Spectrogram(blocks)
+            params, __ = self.analyzeSpectrogramArray(_d, flagTemplate=False)
+            if sc in scores: params['xcorr'] = scores[sc]
+            rslt = dict(startCol=sc, endCol=ec, 
+                        startTime=sc*INPUT_BLOCK_TIME, 
+                        endTime=ec*INPUT_BLOCK_TIME, 
+                        params=params, matched=None, fp="")
+            if flagCompare:
+                fp = "recordings/rec_%s_%08i.wav"%(fn, sc)
+                sfD = list(blocks)
+                matched, rsltTxt, fp = self.compareSF2Template(params, sfD, fp,
+                                                               flagSave)
+                rslt['matched'] = matched
+                rslt['fp'] = fp
+                if self.flagPrint: print(rsltTxt)
+            rslts.append(rslt)
+        source.close()
+        self.resultLog.flush()
+        return rslts
+
+    #-------------------------------------------------------------------
+
+    def blocks2Spectrogram(self, blocks):
+        """ Make spectrogram columns of audio data blocks at once 
+        (same as preProcDataFromMic on each block).
+
+        Args:
+            blocks (numpy.array): int16 audio data; shape is
+              (number of blocks, INPUT_FRAMES_PER_BLOCK).
+
+        Returns:
+            (numpy.array): Greyscale spectrogram; a column per block.
+        """
+        if DEBUG: print("PyListener.blocks2Spectrogram()")
+        fpb = blocks.shape[1]
+        d = np.abs(np.fft.fft(blocks*SHORT_NORMALIZE, axis=1))
+        d = d[:,:int(fpb/2)]
+        maxVals = np.max(d, axis=1, keepdims=True)
+        d = d / np.maximum(maxVals, 1) # maximum value should be 1;
+          # columns with maximum <= 1 are kept as they are
+        return np.flip((d * 255).astype(np.uint8), axis=1).T
+
+    #-------------------------------------------------------------------
+
+    def xcorrColumns(self, blocks):
+        """ Spectrogram columns of audio data blocks for 
+        TemplateXCorrDetector. Same as blocks2Spectrogram, except that
+        each column is normalized with its maximum and not quantized
+        to 0-255, so the score doesn't depend on the level of the sound.
+
+        Args:
+            blocks (numpy.array): int16 audio data; shape is
+              (number of blocks, INPUT_FRAMES_PER_BLOCK).
+
+        Returns:
+            (numpy.array): float32 spectrogram; a column per block.
+        """
+        if DEBUG: print("PyListener.xcorrColumns()")
+        fpb = blocks.shape[1]
+        d = np.abs(np.fft.rfft(blocks*SHORT_NORMALIZE, axis=1))
+        d = d[:,:int(fpb/2)]
+        maxVals = np.max(d, axis=1, keepdims=True)
+        d = d / np.maximum(maxVals, 1e-12)
+        return np.flip(d, axis=1).T.astype(np.float32)
+
+    #-------------------------------------------------------------------
+
+    def segmentAmps(self, amps):
+        """ Find sound fragments in RMS amplitudes of all blocks of 
+        a (finished) audio data. A block is above threshold, when the 
+        average of RMS amplitudes of recent 'ampRecLen' blocks is over 
+        'ampThr'. A sound fragment starts 'ampRecLen' blocks before
+        the first block above threshold, ends when blocks are below
+        threshold for longer than 'maxDurLowerThr' (or at the last 
+        block), and is kept only when its duration reaches 'minDur4SF'.
+
+        Args:
+            amps (numpy.array): RMS amplitude of each block.
+
+        Returns:
+            (list): Each item is (start block index, end block index)
+              of a sound fragment. The end index is exclusive.
+        """
+        if DEBUG: print("PyListener.segmentAmps()")
+        n = len(amps)
+        if n == 0: return []
+        L = self.ampRecLen
+        BT = INPUT_BLOCK_TIME
+        ### moving average of recent (up to L) amplitudes
+        cs = np.concatenate(([0.0], np.cumsum(amps)))
+        idx = np.arange(n)
+        lo = np.maximum(0, idx+1-L)
+        avg = (cs[idx+1]-cs[lo]) / (idx+1-lo)
+        above = avg > self.ampThr
+        above[-1] = False # the last block ends any sound fragment
+        ### runs of blocks above threshold
+        d = np.diff(above.astype(np.int8), prepend=0, append=0)
+        starts = np.where(d == 1)[0]
+        lasts = np.where(d == -1)[0] - 1 # last index of each run
+
+        frags = []
+        i = 0
+        while i < len(starts):
+            sc = max(0, starts[i]-L)
+            while True:
+                j = lasts[i]
+                ### the first block after the run, when below threshold 
+                ### was long enough (or the last block)
+                m = j + 1
+                while m < n-1 and not (m*BT - j*BT > self.maxDurLowerThr):
+                    m += 1
+                if i+1 < len(starts) and starts[i+1] <= m:
+                # the next run started before; continue the fragment
+                    i += 1
+                else:
+                    break
+            ec = m - 1
+            if (ec-sc) * BT >= self.minDur4SF: frags.append((sc, ec))
+            i += 1
+        return frags
+
+    #-------------------------------------------------------------------
+
     def get_rms(self, data):
         """ Calculates Root Mean Square amplitude.
 
         Args:
-            data (string): Read from mic. stream.
+            data (numpy.array/ bytes): int16 audio data (or bytes read 
+              from mic. stream).
 
         Returns:
             (float): Root mean square amplitude.
         """ 
         if DEBUG: print("PyListener.get_rms()")
-        ### get one short out for each two chars in the string.
-        count = len(data)/2
-        frmt = "%dh"%(count)
-        shorts = struct.unpack( frmt , data )
-
-        # iterate over the block.
-        sum_squares = 0.0
-        for sample in shorts:
-            # sample is a signed short in +/- 32768. 
-            # normalize it to 1.0
-            n = sample * SHORT_NORMALIZE
-            sum_squares += n*n
-
-        return np.sqrt( sum_squares / count )
+        if isinstance(data, bytes): data = np.frombuffer(data, dtype=np.int16)
+        if len(data) == 0: return 0.0
+        # normalize samples (signed short in +/- 32768) to 1.0
+        n = data.astype(np.float64) * SHORT_NORMALIZE
+        return np.sqrt( np.dot(n, n) / len(n) )
 
     #-------------------------------------------------------------------
     
@@ -825,12 +1548,18 @@ class PyListener(object):
     
     #-------------------------------------------------------------------
 
-    def analyzeSpectrogramArray(self, inputData, flagTemplate=False):
+    def analyzeSpectrogramArray(self, inputData, flagTemplate=False, 
+                                rowStep=1, flagCorr=True):
         """ Extract parameters from spectrogram data. 
 
         Args:
             inputData (numpy.array): Spectrogram data to analyze.
             flagTemplate (bool): Whether this is WAV data for template.
+            rowStep (int, optional): When larger than 1, analysis is 
+              done on coarser rows (max. value of every 'rowStep' rows), 
+              and row related parameters are scaled back to the original 
+              rows. This is for reducing processing time.
+            flagCorr (bool, optional): Whether to calculate 'corr2auto'.
 
         Returns:
             params (dict): Analyzed parameters. 
@@ -851,6 +1580,14 @@ class PyListener(object):
         data[:cutI1,:] = 0 # delete high frequency range
         data[cutI2:,:] = 0 # delete low frequency range
 
+        rows = data.shape[0] # number of rows of the original data
+        rs = rowStep
+        if rs > 1:
+            ### coarser rows
+            _r = rows - rows%rs
+            data = data[:_r].reshape(int(_r/rs), rs, data.shape[1]).max(axis=1)
+        ro = (rs-1)/2.0 # offset to the center of coarse row
+
         # auto contrasting
         data = self.autoContrast(data, 20, flagTemplate=flagTemplate) 
 
@@ -862,13 +1599,13 @@ class PyListener(object):
         for ci in range(data.shape[1]):
             a = data[:,ci]
             _nz = np.nonzero(a)[0]
-            nonZeroPts.append(len(_nz))
+            nonZeroPts.append(len(_nz)*rs)
             if len(_nz) > 0:
-                nonZeroLowestFreqRowList.append(np.max(_nz))
-                nonZeroHighestFreqRowList.append(np.min(_nz))
+                nonZeroLowestFreqRowList.append(np.max(_nz)*rs + rs-1)
+                nonZeroHighestFreqRowList.append(np.min(_nz)*rs)
             cm = center_of_mass(a)[0]
             if np.isnan(cm) == True: cms.append(-1)
-            else: cms.append(int(cm))
+            else: cms.append(int(cm*rs + ro))
         ### change -1 values from CenterOfMass list to its neighbor value
         for i in range(len(cms)):
             if cms[i] == -1:
@@ -885,12 +1622,12 @@ class PyListener(object):
         ### calculate duration
         params["duration"] = INPUT_BLOCK_TIME * data.shape[1] 
         ### summed amplitude ratio
-        params["summedAmp"] = np.sum(data.astype(np.int32))
+        params["summedAmp"] = np.sum(data.astype(np.int32)) * rs
         if flagTemplate == True: # loading a template WAV
             params["summedAmpRatio"] = 1.0
         else:
             if self.templP != None: # there's a template file params.
-                _sumD = np.sum(data.astype(np.int32))
+                _sumD = params["summedAmp"]
                 params["summedAmpRatio"] = _sumD / self.templP["summedAmp"]
         ### store center-of-mass in each column
         params["cmInColList"] = cms  
@@ -898,9 +1635,9 @@ class PyListener(object):
         ### and in terms of relative position (0.0-1.0) 
         row, col = center_of_mass(data)
         params["centerOfMassX"] = int(col)
-        params["centerOfMassY"] = int(row)
+        params["centerOfMassY"] = int(row*rs + ro)
         params["cmxN"] = params["centerOfMassX"]/data.shape[1]
-        params["cmyN"] = 1.0-params["centerOfMassY"]/data.shape[0]
+        params["cmyN"] = 1.0-params["centerOfMassY"]/rows
         ### calculate permutation entropy value
         #params["permEnt"] = ent.permutation_entropy(params["cmInColList"], 
         #                                            order=5, 
@@ -914,20 +1651,21 @@ class PyListener(object):
             params["lowFreq"] = -1
         else:
             params["lowFreqRow"] = int(np.average(nonZeroLowestFreqRowList))
-            _t = data.shape[0] - params["lowFreqRow"]
+            _t = rows - params["lowFreqRow"]
             params["lowFreq"] = _t * FREQ_RES / 1000
         if nonZeroHighestFreqRowList == []:
             params["highFreqRow"] = -1
             params["highFreq"] = -1
         else:
             params["highFreqRow"] = int(np.average(nonZeroHighestFreqRowList))
-            _t = data.shape[0] - params["highFreqRow"]
+            _t = rows - params["highFreqRow"]
             params["highFreq"] = _t * FREQ_RES / 1000
         ### distance between lowFreqRow and highFreqRow
         params["distLowRow2HighRow"] = params["lowFreqRow"] - params["highFreqRow"]
         ### calculates parameters about relation between 
         ### the current sound to the template sound 
-        if self.templP != None: # there's a template file params. 
+        if self.templP != None and flagCorr == True: 
+        # there's a template file params. 
             if flagTemplate == False: # this is not a template file loading
                 r = -1
                 _d = data.astype(np.int32) # spectrogram data of 
@@ -935,18 +1673,41 @@ class PyListener(object):
                 _t = self.tSpAD.astype(np.int32) # spectrogram data of 
                   # template sound
                 ### calculates correlation to auto-correlation ratio
-                autocorr = correlate(_t, _t) # auto-correlation of template
                 corr = correlate(_d, _t) # correlation between two sounds 
-                acm = np.max(autocorr) # max. overlapping of auto-correlation
+                acm = self.templAutoCorrMax() # max. overlapping of 
+                  # auto-correlation
                 cm = np.max(corr) # max. overlapping value of correlation 
                 r = float(cm) / acm
                 if r > 1.0: r = 1.0-(r-1.0)
                 params["corr2auto"] = r
         ##### end: calculating and storing analyzed params. -----
+
+        if rs > 1:
+            ### back to the original rows
+            _d = np.zeros((rows, data.shape[1]), dtype=data.dtype)
+            _d[:data.shape[0]*rs] = np.repeat(data, rs, axis=0)
+            data = _d
         
         return params, data
 
     #-------------------------------------------------------------------
+
+    def templAutoCorrMax(self):
+        """ Max. value of auto-correlation of template spectrogram.
+        It's calculated once for a template (tSpAD).
+
+        Args: None
+
+        Returns:
+            (int): Max. value of auto-correlation.
+        """
+        if DEBUG: print("PyListener.templAutoCorrMax()")
+        if self.tACMax == None or self.tACMax[0] is not self.tSpAD:
+            _t = self.tSpAD.astype(np.int32)
+            self.tACMax = [self.tSpAD, np.max(correlate(_t, _t))]
+        return self.tACMax[1]
+
+    #-------------------------------------------------------------------
   
     def formTemplate(self, fileLists):
         """ Process list of wave files to form template WAV data
@@ -959,105 +1720,128 @@ class PyListener(object):
             tParams (dict): Parameters of template WAV data.
         """ 
         if DEBUG: print("PyListener.formTemplate()")
-        for i in range(len(fileLists)): # go through all files
+        ### check framerates (and lengths) in headers first
+        fps = []
+        nFrames = [] # number of frames of each file
+        for i in range(len(fileLists)):
             fp = fileLists[i]
-            ### read wave file
-            wavData = wave.open(fp, 'rb')
-            params = wavData.getparams()
-            wd = wavData.readframes(params.nframes)
-            wavData.close()
-            wd = np.frombuffer(wd, dtype=np.dtype('i2'))
+            wf = WAVFile(fp)
+            fr = wf.framerate
+            nf = wf.nframes
+            wf.close()
             if i == 0:
                 ### the 1st file, initilization
-                initFR = params.framerate
-                data = np.zeros((1,1), dtype=np.uint16) # final 'data'
-                d = self.preProcDataFromFile(wd, 
-                                         params, 
-                                         flagInitArr=True) # currnet data, 'd'
-                tParams = {} # result params dictionary 
-                for key in self.pKeys: tParams[key] = [] # temporarily make it 
-                  # as a list to append data from all WAV files 
-            else:
-                ### validity checking
-                if initFR != params.framerate:
-                    msg =  "File '%s' was not loaded"%(fp)
-                    msg += " due to its different framerate"
-                    msg += " %i from the framerate"%(params.framerate)
-                    msg += " %i of the first file.\n"%(initFR)
-                    print(msg)
-                    writeFile(self.logFile,
-                              "%s, [ERROR] %s"%(get_time_stamp(), msg))
-                    continue
-                d = self.preProcDataFromFile(wd, 
-                                         params, 
-                                         flagInitArr=False) # current data, 'd'
-            # analyze the current data 
-            params, d = self.analyzeSpectrogramArray(d, flagTemplate=True)
-            ### (temporarily) append obtained params in tParams
-            for key in self.pKeys: tParams[key].append(params[key])
-            ### keep the spectrogram array size same.
-            if data.shape[1] != d.shape[1]: # length of current data, 'd',
-              # is different from 'data'
-                if data.shape[1] < d.shape[1]:
-                    od = np.copy(data)
-                    data = np.zeros(d.shape, dtype=np.uint16)
-                    data[:od.shape[0], :od.shape[1]] = od 
-                else:
-                    _d = np.copy(d)
-                    d = np.zeros(data.shape, dtype=np.uint8)
-                    d[:_d.shape[0], :_d.shape[1]] = _d
-            # store average 'data'; average pixel value for final spectrogram
-            data = np.array( (data+d)/2.0, dtype=np.uint16 ) 
-        data = self.autoContrast(data, adjVal=40, flagTemplate=True)
+                initFR = fr
+                setAudioRate(initFR) # update global constants
+                self.initSParr('both')
+                if self.frame != None: self.frame.onUpdateRate()
+            elif initFR != fr:
+                msg =  "File '%s' was not loaded"%(fp)
+                msg += " due to its different framerate"
+                msg += " %i from the framerate"%(fr)
+                msg += " %i of the first file.\n"%(initFR)
+                print(msg)
+                writeFile(self.logFile,
+                          "%s, [ERROR] %s"%(get_time_stamp(), msg))
+                continue
+            fps.append(fp)
+            nFrames.append(nf)
+
+        ### analyze each file; in worker processes when there're 
+        ### many files (and multiple CPUs). Results are in the order 
+        ### of files. Workers are spawned (not forked), as this process 
+        ### may have other threads (GUI, audio capture, log writer).
+        nWorkers = self.nTemplWorkers
+        if nWorkers == None:
+            if len(fps) < TEMPL_PARALLEL_MIN_FILES: nWorkers = 1
+            else: nWorkers = cpu_count()
+        nWorkers = min(nWorkers, len(fps))
+        if nWorkers > 1:
+            settings = dict(pKeys=self.pKeys, 
+                            comp_freq_range=self.comp_freq_range,
+                            acThrTol_templ=self.acThrTol_templ, 
+                            logFile=self.logFile)
+            with ProcessPoolExecutor(max_workers=nWorkers,
+                                     mp_context=get_context('spawn'),
+                                     initializer=initTemplateWorker,
+                                     initargs=(initFR, settings)) as ex:
+                rslts = list(ex.map(analyzeTemplateFile, fps))
+        else:
+            rslts = [self.analyzeTemplateFile(fp) for fp in fps]
+
+        fpb = INPUT_FRAMES_PER_BLOCK
+        maxCols = max([int(round(nf/float(fpb))) for nf in nFrames]+[0])
+        stats = TemplateStats(initFR, int(fpb/2), maxCols) # accumulator 
+          # is allocated for the longest file
+        for i in range(len(fps)): stats.add(fps[i], rslts[i][0], rslts[i][1])
+        self.templStats = stats
+        return self.aggregateTemplate(stats)
+
+    #-------------------------------------------------------------------
+
+    def aggregateTemplate(self, stats):
+        """ Form template WAV data from analyzed data of exemplars;
+        average spectrogram and min., max. and average values of 
+        parameters (with margins).
+        Scalar parameters come from running sum, min. and max. values 
+        of the stats, but list parameters (cmInColList) need values 
+        of all exemplars, as levelFarOffValues uses their standard 
+        deviation.
+
+        Args:
+            stats (TemplateStats): Analyzed data of template WAV files.
+
+        Returns:
+            data (numpy.array): Spectrogram data after analysis.
+            tParams (dict): Parameters of template WAV data.
+        """ 
+        if DEBUG: print("PyListener.aggregateTemplate()")
+        # average pixel value for final spectrogram
+        data = self.autoContrast(stats.meanSpectrogram(), adjVal=40, 
+                                 flagTemplate=True)
+        params0 = stats.params[stats.fps[0]] # params of the 1st exemplar
+        keys = list(self.pKeys)
+        listDataKeys = [key for key in keys if type(params0[key]) == list]
+        tParams = stats.paramLists(listDataKeys) # result params 
+          # dictionary; lists of values of all WAV files for now
         
         ##### beginning of getting parameter's 
         ##### min, max and average values. -----
-        keys = list(self.pKeys)
         ### - process list data items (currently only cmInColList) 
         ### first (for other items depending on list data)
-        listDataKeys = []
         initM = self.cplInitMargin
-        for key in keys:
-            if type(tParams[key][0]) == list:
-            # data type is list
-                minKey = key + "_min"
-                maxKey = key + "_max"
-                ### get element-wise average values of lists
-                tpLen = len(tParams[key])
-                tmp = []
-                for i in range(tpLen): tmp.append(len(tParams[key][i]))
-                dLen = int(np.average(tmp)) # final length is average length 
-                  # of items of tParams[key]
-                tmpArr = np.zeros((tpLen, dLen))
-                for i in range(tpLen):
-                    # resize data of each item to the dLen
-                    tmpArr[i,:] = transform.resize( 
-                                                np.asarray(tParams[key][i]),
-                                                output_shape=(dLen,), 
-                                                preserve_range=True, 
-                                                anti_aliasing=True 
-                                                  )
-                tmpArr = self.levelFarOffValues(tmpArr) # make center-of-mass
-                  # values, which are out of standard deviation, 
-                  # to average value 
-                ### min. & max. values 
-                tParams[minKey] = np.min(tmpArr, axis=0)
-                tParams[maxKey] = np.max(tmpArr, axis=0)
-                if key in initM.keys():
-                    ### give margin to min. & max. values
-                    tp = tParams[minKey] - initM[minKey]
-                    tParams[minKey] = list(tp.astype(np.int16))
-                    tp = tParams[maxKey] + initM[maxKey]
-                    tParams[maxKey] = list(tp.astype(np.int16))
-                # final values in the list will be average values
-                tp = np.average(tmpArr, axis=0)
-                tParams[key] = list(tp.astype(np.int16))
-                listDataKeys.append(key)
+        for key in listDataKeys:
+            minKey = key + "_min"
+            maxKey = key + "_max"
+            ### get element-wise average values of lists
+            tpLen = len(tParams[key])
+            tmp = []
+            for i in range(tpLen): tmp.append(len(tParams[key][i]))
+            dLen = int(np.average(tmp)) # final length is average length 
+              # of items of tParams[key]
+            # resample data of all items to the dLen
+            tmpArr = resampleLists(tParams[key], dLen)
+            tmpArr = self.levelFarOffValues(tmpArr) # make center-of-mass
+              # values, which are out of standard deviation, 
+              # to average value 
+            ### min. & max. values 
+            tParams[minKey] = np.min(tmpArr, axis=0)
+            tParams[maxKey] = np.max(tmpArr, axis=0)
+            if key in initM.keys():
+                ### give margin to min. & max. values
+                tp = tParams[minKey] - initM[minKey]
+                tParams[minKey] = list(tp.astype(np.int16))
+                tp = tParams[maxKey] + initM[maxKey]
+                tParams[maxKey] = list(tp.astype(np.int16))
+            # final values in the list will be average values
+            tp = np.average(tmpArr, axis=0)
+            tParams[key] = list(tp.astype(np.int16))
         for key in listDataKeys: keys.remove(key)
         ### - process other items 
         for key in keys:
             minKey = key + "_min"
             maxKey = key + "_max"
+            avgV, minV, maxV = stats.scalarStats(key)
             if key in self.compParamList:
                 #if key == 'permEnt': # cmInColList was adjusted in 
                 #  # this function. Calculate its permutation entroy here.
@@ -1076,143 +1860,1140 @@ class PyListener(object):
                     tParams[key] = (tParams[minKey]+tParams[maxKey]) / 2.0
 
                 else: # other parameters in compParamList
-                    tParams[minKey] = np.min(tParams[key]) - initM[minKey]
-                    tParams[maxKey] = np.max(tParams[key]) + initM[maxKey]
-                    tParams[key] = np.average(tParams[key]) # store 
-                      # average value of all wave files
+                    tParams[minKey] = minV - initM[minKey]
+                    tParams[maxKey] = maxV + initM[maxKey]
+                    tParams[key] = avgV # store average value 
+                      # of all wave files
 
             else:
             # this is just for internal calculations, just store average value.
-                tParams[key] = np.average(tParams[key])
+                tParams[key] = avgV
         ##### end of getting parameter's min, max and average values. -----
         
         return data, tParams
 
     #-------------------------------------------------------------------
-    
-    def compareParamsOfSF2T(self, sParams, tParams, fName=''):
-        """ Compare parameters of sound fragment to parameters of template WAV
+
+    def swapTemplate(self, data, params, stats=None, templFP=None):
+        """ Hand over a template formed in another thread (while 
+        listening). It replaces the current template at the beginning 
+        of the next procMicAudioData call, so a sound fragment is 
+        never compared with a half-replaced template and listening 
+        doesn't stop.
 
         Args:
-            sParams (dict): Parameters of sound frament, 
-                captured from mic. streaming.
-            tParams (dict): Parameters of template WAV data.
-            fName (string): Name of the wave file, when sParams is not 
-                a captured sound from mic. streaming, but a wave file.
-        """ 
-        if DEBUG: print("PyListener.compareParamsOfSF2T()")
-        rslt = True # whether params. of two sounds match or not
-        rsltTxt = "" 
-        matchedKeys = []
-        for key in tParams.keys():
-            if key[-4:] == '_max': continue # work with _min key
-            key = key[:-4] 
-            sfV = sParams[key]
-            rsltTxt += "/ %s"%(key)
-            minV = tParams[key+'_min']
-            maxV = tParams[key+'_max']
-            if sfV < minV or sfV > maxV:
-                rslt = False
-                rsltTxt += " [NOT]"
-            else:
-                matchedKeys.append(key)
-            rsltTxt += " (%.3f <= %.3f <= %.3f)"%(minV, sfV, maxV)
-        rsltTxt = rsltTxt.lstrip("/")
-        _txt = "Sound fragment"
-        if fName != '': _txt += " (%s)"%(fName)
-        if rslt == True:
-            _str =  str(matchedKeys).strip('[]')
-            _str = _str.replace("'","").replace(",","/")
-            _txt += " [MATCHED] with following parameters ( %s )"%(_str)
-            _txt += rsltTxt
-            rsltTxt = "%s, [RESULT], %s\n\n"%(get_time_stamp(), _txt)
-        else:
-            _txt += " did [NOT] match/ " + rsltTxt
-            rsltTxt = "%s, [RESULT], %s\n\n"%(get_time_stamp(), _txt)
-        writeFile( self.logFile, rsltTxt )
+            data (numpy.array): Spectrogram data of the template.
+            params (dict): Parameters of the template.
+            stats (None/ TemplateStats): Analyzed data of exemplars.
+            templFP (None/ str): Folder (or file) path of the template.
 
-        if rslt == True: self.sfRslts.append('Matched')
-        else: self.sfRslts.append('Unmatched')
+        Returns:
+            None
+        """
+        if DEBUG: print("PyListener.swapTemplate()")
+        with self.templSwapLock:
+            self.templSwap = (data, params, stats, templFP)
+
+    #-------------------------------------------------------------------
+
+    def applyTemplateSwap(self):
+        """ Replace the current template with the one handed over 
+        with swapTemplate (if there is). This should be called 
+        in the thread, which processes audio data.
+
+        Args: None
 
-        return rslt, rsltTxt
+        Returns:
+            (bool): Whether the template was replaced.
+        """
+        if self.templSwap == None: return False
+        if DEBUG: print("PyListener.applyTemplateSwap()")
+        with self.templSwapLock:
+            swap = self.templSwap
+            self.templSwap = None
+        if swap == None: return False
+        data, params, stats, templFP = swap
+        self.tSpAD = data
+        self.templP = params
+        if stats != None: self.templStats = stats
+        if templFP != None: self.templFP = templFP
+        msg = "%s, [MSG], Template is replaced while listening.\n"%(
+                                                            get_time_stamp())
+        writeFile(self.logFile, msg)
+        return True
 
     #-------------------------------------------------------------------
-    
-    def levelFarOffValues(self, arr, stdF=1.0):
-        """ Make value out of standard deviation(s) to average value.
-        
+
+    def addTemplateFile(self, fp):
+        """ Add a WAV file (exemplar) to the current template.
+        Only the added file is analyzed.
+
         Args:
-            arr (numpy.array): Data to process.
-            stdF (float): Number of SD for keeping original data.
+            fp (str): File path of WAV file.
 
         Returns:
-            arr (numpy.array): Data after processing.
-        """ 
-        if DEBUG: print("PyListener.eliminateFarOffValues()")
-        avg = np.average(arr)
-        std = np.std(arr)
-        arr[arr<(avg-std)*stdF] = avg
-        arr[arr>(avg+std)*stdF] = avg
-        return arr
+            data (numpy.array): Spectrogram data of the updated template.
+            tParams (dict): Parameters of the updated template.
+        """
+        if DEBUG: print("PyListener.addTemplateFile()")
+        stats = self.templStats
+        if stats == None: raise ValueError("No template is loaded.")
+        wf = WAVFile(fp)
+        fr = wf.framerate
+        wf.close()
+        if fr != stats.framerate:
+            msg = "File '%s' has a different framerate %i"%(fp, fr)
+            msg += " from the framerate %i of the template."%(stats.framerate)
+            raise ValueError(msg)
+        params, d = self.analyzeTemplateFile(fp)
+        stats.add(fp, params, d)
+        return self.updateTemplate()
 
     #-------------------------------------------------------------------
-    
-    def logSFParms(self, analyzedP):
-        """ Records analyzed parameters of sound fragment in log file.
+
+    def removeTemplateFile(self, fp):
+        """ Remove a WAV file (exemplar) from the current template.
 
         Args:
-            analyzedP (dict): Parameters of sound fragment.
+            fp (str): File path of WAV file.
 
         Returns:
-            logTxt (string): Recorded string.
-        """ 
-        if DEBUG: print("PyListener.logSFParms()")
+            data (numpy.array): Spectrogram data of the updated template.
+            tParams (dict): Parameters of the updated template.
+        """
+        if DEBUG: print("PyListener.removeTemplateFile()")
+        stats = self.templStats
+        if stats == None: raise ValueError("No template is loaded.")
+        if len(stats.fps) == 1:
+            raise ValueError("The last file of template can't be removed.")
+        stats.remove(fp)
+        return self.updateTemplate()
 
-        ### record the captured sound fragment parameters 
-        logTxt = "%s, [RESULT],"%(get_time_stamp())
-        logTxt += " Captured sound fragment parameters./ "
-        for param in self.compParamList:
-            _txt = "%s:%.3f/ "%(param, analyzedP[param])
-            logTxt += _txt
-        logTxt = logTxt.rstrip('/ ') + "\n" 
-        writeFile( self.logFile, logTxt )
-        return logTxt 
+    #-------------------------------------------------------------------
+
+    def updateTemplate(self):
+        """ Form template from the current exemplars (self.templStats),
+        after an exemplar was added or removed, and cache it.
+
+        Args: None
+
+        Returns:
+            data (numpy.array): Spectrogram data of the updated template.
+            tParams (dict): Parameters of the updated template.
+        """
+        if DEBUG: print("PyListener.updateTemplate()")
+        data, tParams = self.aggregateTemplate(self.templStats)
+        self.tSpAD = data
+        self.templP = tParams
+        self.saveTemplateCache(self.templStats.fps, data, tParams)
+        msg = "%s, [MSG], Template was updated;"%(get_time_stamp())
+        msg += " %i file(s).\n"%(len(self.templStats.fps))
+        writeFile(self.logFile, msg)
+        return data, tParams
 
     #-------------------------------------------------------------------
 
-    def writeWAVfile(self, wData, fp=""):
-        """ Save given WAV data to a file.
+    def analyzeTemplateFile(self, fp):
+        """ Make spectrogram of a template WAV file and analyze it.
+        (Audio rate should be already set with the file's framerate.)
 
         Args:
-            wData (list): Each item is string read from mic. stream. 
-              Length of each item is INPUT_FRAMES_PER_BLOCK. 
-            fp (str, optional): File path to save WAV file.
+            fp (str): File path of WAV file.
 
         Returns:
-            fp (str): File path of the saved wave file. 
-        """ 
-        if DEBUG: print("PyListener.writeWAVfile()")
+            params (dict): Analyzed parameters. 
+            data (numpy.array): Spectrogram data after analysis.
+        """
+        if DEBUG: print("PyListener.analyzeTemplateFile()")
+        wf = WAVFile(fp)
+        d = wavSpectrogram(wf, INPUT_FRAMES_PER_BLOCK)
+        wf.close()
+        return self.analyzeSpectrogramArray(d, flagTemplate=True)
 
-        if fp == "": fp = "recordings/rec_%s.wav"%(get_time_stamp())
-        w = wave.open( fp, 'wb' )
-        w.setparams((
-                        CHANNELS, 
-                        SAMPLE_WIDTH, 
-                        RATE, 
-                        len(wData)*INPUT_FRAMES_PER_BLOCK, 
+    #-------------------------------------------------------------------
+
+    def templateCacheFP(self, fileLists):
+        """ File path of template cache for the given WAV files.
+        The file name is a hash of file paths, their sizes and 
+        modification times and the parameters used for forming template,
+        so that a changed file or setting leads to a different cache file.
+
+        Args:
+            fileLists (list): List of wave files of template.
+
+        Returns:
+            (str): File path of cache (.npz) file.
+        """
+        if DEBUG: print("PyListener.templateCacheFP()")
+        files = []
+        for fp in fileLists:
+            st = stat(fp)
+            files.append([path.abspath(fp), st.st_size, st.st_mtime_ns])
+        config = dict(ver=TEMPL_CACHE_VER, files=files, pKeys=self.pKeys,
+                      compParamList=self.compParamList, indCPL=self.indCPL,
+                      cplInitMargin=self.cplInitMargin, 
+                      indCPRange=self.indCPRange,
+                      comp_freq_range=self.comp_freq_range,
+                      acThrTol_templ=self.acThrTol_templ,
+                      blockTime=INPUT_BLOCK_TIME)
+        key = sha1(json.dumps(config, sort_keys=True).encode('utf-8'))
+        return path.join(self.templCacheDir, "templ_%s.npz"%(key.hexdigest()))
+
+    #-------------------------------------------------------------------
+
+    def loadTemplateCache(self, fileLists):
+        """ Load template data formed (by formTemplate) with the same
+        WAV files and parameters before. Audio rate and spectrogram
+        arrays are updated as formTemplate does.
+
+        Args:
+            fileLists (list): List of wave files of template.
+
+        Returns:
+            data (None/ numpy.array): Spectrogram data of template.
+              None when there's no (valid) cache.
+            tParams (None/ dict): Parameters of template WAV data.
+        """
+        if DEBUG: print("PyListener.loadTemplateCache()")
+        if self.templCacheDir == None or fileLists == []: return None, None
+        fp = self.templateCacheFP(fileLists)
+        if not path.isfile(fp): return None, None
+        try:
+            with np.load(fp, allow_pickle=False) as z:
+                data = z['tSpAD']
+                tParams = json.loads(str(z['templP']))
+                rate = int(z['rate'])
+                stats = TemplateStats(rate)
+                eFPs = json.loads(str(z['exemplarFiles']))
+                eParams = json.loads(str(z['exemplarParams']))
+                for i in range(len(eFPs)):
+                    stats.add(eFPs[i], eParams[i], z['spec_%i'%(i)])
+        except Exception as e: # broken cache file; form template again
+            msg = "%s, [ERROR], Template cache, %s,"%(get_time_stamp(), fp)
+            msg += " was not loaded; %s\n"%(str(e))
+            writeFile(self.logFile, msg)
+            return None, None
+        setAudioRate(rate)
+        self.initSParr('both')
+        if self.frame != None: self.frame.onUpdateRate()
+        self.templStats = stats
+        msg = "%s, [MSG], Template was loaded from cache,"%(get_time_stamp())
+        msg += " %s\n"%(fp)
+        writeFile(self.logFile, msg)
+        return data, tParams
+
+    #-------------------------------------------------------------------
+
+    def saveTemplateCache(self, fileLists, data, tParams):
+        """ Save formed template data, to be loaded by loadTemplateCache.
+        The file is written with a temporary name and renamed, so that 
+        other processes, loading the same template, never read 
+        a partially written file.
+
+        Args:
+            fileLists (list): List of wave files of template.
+            data (numpy.array): Spectrogram data of template.
+            tParams (dict): Parameters of template WAV data.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("PyListener.saveTemplateCache()")
+        if self.templCacheDir == None or fileLists == []: return
+        stats = self.templStats
+        try:
+            if path.isdir(self.templCacheDir) == False: 
+                mkdir(self.templCacheDir)
+            fp = self.templateCacheFP(fileLists)
+            tmpFP = "%s.%i.tmp"%(fp, getpid())
+            specs = {} # analyzed spectrogram of each exemplar
+            for i in range(len(stats.fps)): 
+                specs['spec_%i'%(i)] = stats.specs[stats.fps[i]]
+            eParams = [stats.params[_fp] for _fp in stats.fps]
+            with open(tmpFP, 'wb') as f:
+                np.savez(f, tSpAD=data, rate=RATE,
+                         templP=json.dumps(tParams, default=toBuiltin),
+                         exemplarFiles=json.dumps(stats.fps),
+                         exemplarParams=json.dumps(eParams, default=toBuiltin),
+                         **specs)
+            rename(tmpFP, fp)
+        except (OSError, TypeError) as e:
+            msg = "%s, [ERROR], Template cache was not saved;"%(get_time_stamp())
+            msg += " %s\n"%(str(e))
+            writeFile(self.logFile, msg)
+
+    #-------------------------------------------------------------------
+    
+    def compareParamsOfSF2T(self, sParams, tParams, fName=''):
+        """ Compare parameters of sound fragment to parameters of template WAV
+
+        Args:
+            sParams (dict): Parameters of sound frament, 
+                captured from mic. streaming.
+            tParams (dict/ ThresholdModel): Parameters of template WAV 
+                data (min. and max. values), or compiled thresholds.
+            fName (string): Name of the wave file, when sParams is not 
+                a captured sound from mic. streaming, but a wave file.
+
+        Returns:
+            rslt (bool): Whether params. of two sounds match or not.
+            rsltTxt (CompareResult): Result; text is formatted when 
+                it's read (str) or logged.
+        """ 
+        if DEBUG: print("PyListener.compareParamsOfSF2T()")
+        if not isinstance(tParams, ThresholdModel):
+            keys = [k[:-4] for k in tParams.keys() if k[-4:] == '_min']
+            tParams = ThresholdModel(keys, tParams)
+        rsltTxt = tParams.compare(sParams, fName)
+        self.resultLog.write(rsltTxt)
+
+        if rsltTxt.matched == True: self.sfRslts.append('Matched')
+        else: self.sfRslts.append('Unmatched')
+
+        return rsltTxt.matched, rsltTxt
+
+    #-------------------------------------------------------------------
+    
+    def levelFarOffValues(self, arr, stdF=1.0):
+        """ Make value out of standard deviation(s) to average value.
+        
+        Args:
+            arr (numpy.array): Data to process.
+            stdF (float): Number of SD for keeping original data.
+
+        Returns:
+            arr (numpy.array): Data after processing.
+        """ 
+        if DEBUG: print("PyListener.eliminateFarOffValues()")
+        avg = np.average(arr)
+        std = np.std(arr)
+        arr[arr<(avg-std)*stdF] = avg
+        arr[arr>(avg+std)*stdF] = avg
+        return arr
+
+    #-------------------------------------------------------------------
+    
+    def logSFParms(self, analyzedP):
+        """ Records analyzed parameters of sound fragment in log file.
+
+        Args:
+            analyzedP (dict): Parameters of sound fragment.
+
+        Returns:
+            logTxt (ResultText): Recorded text; formatted when it's 
+              read (str) or logged.
+        """ 
+        if DEBUG: print("PyListener.logSFParms()")
+        ts = get_time_stamp()
+        pList = list(self.compParamList)
+        vals = [analyzedP[param] for param in pList]
+        def fmt():
+        # record the captured sound fragment parameters 
+            logTxt = "%s, [RESULT],"%(ts)
+            logTxt += " Captured sound fragment parameters./ "
+            for i in range(len(pList)):
+                _txt = "%s:%.3f/ "%(pList[i], vals[i])
+                logTxt += _txt
+            return logTxt.rstrip('/ ') + "\n" 
+        logTxt = ResultText(fmt)
+        self.resultLog.write(logTxt)
+        return logTxt 
+
+    #-------------------------------------------------------------------
+
+    def recordingFP(self):
+        """ File path to save a sound fragment. An index number is 
+        appended to the time stamp, as sources faster than real time 
+        can save several sound fragments in a second.
+
+        Args: None
+
+        Returns:
+            (str): File path of WAV file.
+        """
+        self.savWI += 1
+        fn = "rec"
+        if self.recName != '': fn += "_%s"%(self.recName)
+        return "recordings/%s_%s_%03i.wav"%(fn, get_time_stamp(), self.savWI)
+
+    #-------------------------------------------------------------------
+
+    def writeWAVfile(self, wData, fp=""):
+        """ Save given WAV data to a file.
+
+        Args:
+            wData (list): Each item is int16 data (numpy array) read from 
+              mic. stream. Length of each item is INPUT_FRAMES_PER_BLOCK. 
+            fp (str, optional): File path to save WAV file.
+              Empty string means a path from recordingFP.
+
+        Returns:
+            fp (str): File path of the saved wave file. 
+        """ 
+        if DEBUG: print("PyListener.writeWAVfile()")
+
+        if fp == "": fp = self.recordingFP()
+        w = wave.open( fp, 'wb' )
+        w.setparams((
+                        CHANNELS, 
+                        SAMPLE_WIDTH, 
+                        RATE, 
+                        sum([len(block) for block in wData]), 
                         'NONE', 
                         'NONE'
                     ))
-        for block in wData: w.writeframes(block)
+        for block in wData: 
+            w.writeframes(np.asarray(block, dtype=np.int16).tobytes())
         w.close()
         msg = "%s, [RESULT],"%(get_time_stamp())
         msg += " Saved to WAV file, %s\n\n"%(fp)
-        writeFile(self.logFile, msg)
+        self.resultLog.write(msg)
         return fp
     
     #-------------------------------------------------------------------
 
 #=======================================================================
 
+class TemplateStats(object):
+    """ Mergeable statistics of template WAV files (exemplars);
+    analyzed parameters and spectrogram of each exemplar, sum of 
+    the spectrograms and number of exemplars in each column, 
+    so that an exemplar can be added or removed without analyzing 
+    the other exemplars again.
+
+    Args:
+        framerate (int): Sampling rate of the exemplars.
+        rows (int): Number of rows of spectrogram.
+        cols (int): Number of columns to allocate for sum of 
+          spectrograms (length of the longest exemplar, if known).
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, framerate, rows=0, cols=0):
+        if DEBUG: print("TemplateStats.__init__()")
+        self.framerate = framerate
+        self.fps = [] # file paths of exemplars, in order of addition
+        self.params = {} # analyzed parameters of each exemplar
+        self.specs = {} # analyzed spectrogram of each exemplar
+        self.sumArr = np.zeros((rows, cols), dtype=np.float64) # sum of 
+          # spectrograms 
+        self.cnts = np.zeros(cols, dtype=np.int64) # number of 
+          # exemplars, which have each column
+        self.sums = {} # sum of each scalar parameter over exemplars
+        self.mins = {} # min. value of each scalar parameter
+        self.maxs = {} # max. value of each scalar parameter
+        self.staleKeys = set() # keys of which min./max. values should 
+          # be recalculated, as an exemplar with the value was removed
+
+    #-------------------------------------------------------------------
+
+    def add(self, fp, params, d):
+        """ Add an exemplar. An exemplar with the same file path is 
+        replaced.
+
+        Args:
+            fp (str): File path of WAV file.
+            params (dict): Analyzed parameters.
+            d (numpy.array): Analyzed spectrogram.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateStats.add()")
+        if fp in self.params: self.remove(fp)
+        r, c = self.sumArr.shape
+        if d.shape[0] > r or d.shape[1] > c: # enlarge arrays; only when
+          # an exemplar, longer than allocated, is added later
+            sa = np.zeros((max(r, d.shape[0]), max(c, d.shape[1])), 
+                          dtype=np.float64)
+            sa[:r,:c] = self.sumArr
+            self.sumArr = sa
+            cnts = np.zeros(sa.shape[1], dtype=np.int64)
+            cnts[:c] = self.cnts
+            self.cnts = cnts
+        self.sumArr[:d.shape[0],:d.shape[1]] += d
+        self.cnts[:d.shape[1]] += 1
+        for key in params.keys():
+            v = params[key]
+            if type(v) == list: continue
+            if not key in self.sums:
+                self.sums[key] = v
+                self.mins[key] = v
+                self.maxs[key] = v
+            else:
+                self.sums[key] += v
+                self.mins[key] = min(self.mins[key], v)
+                self.maxs[key] = max(self.maxs[key], v)
+        self.fps.append(fp)
+        self.params[fp] = params
+        self.specs[fp] = d
+
+    #-------------------------------------------------------------------
+
+    def remove(self, fp):
+        """ Remove an exemplar.
+
+        Args:
+            fp (str): File path of WAV file.
+
+        Returns:
+            None
+        """
+        if DEBUG: print("TemplateStats.remove()")
+        if not fp in self.params:
+            raise ValueError("'%s' is not in the template."%(fp))
+        d = self.specs.pop(fp)
+        self.sumArr[:d.shape[0],:d.shape[1]] -= d
+        self.cnts[:d.shape[1]] -= 1
+        params = self.params.pop(fp)
+        self.fps.remove(fp)
+        for key in list(self.sums.keys()):
+            if len(self.fps) == 0 or not key in params:
+            # no exemplar left or the key is missing; start over 
+                self.sums.pop(key)
+                self.mins.pop(key)
+                self.maxs.pop(key)
+                self.staleKeys.discard(key)
+                continue
+            v = params[key]
+            self.sums[key] -= v
+            if v <= self.mins[key] or v >= self.maxs[key]:
+                self.staleKeys.add(key)
+
+    #-------------------------------------------------------------------
+
+    def meanSpectrogram(self):
+        """ Average of spectrograms of exemplars. Each column is 
+        averaged over the exemplars, which are long enough to have it.
+
+        Args: None
+
+        Returns:
+            (numpy.array): Average spectrogram; as long as the longest
+              spectrogram.
+        """
+        if DEBUG: print("TemplateStats.meanSpectrogram()")
+        cols = max([self.specs[fp].shape[1] for fp in self.fps])
+        return self.sumArr[:,:cols] / self.cnts[:cols]
+
+    #-------------------------------------------------------------------
+
+    def paramLists(self, keys):
+        """ Values of parameters of all exemplars.
+
+        Args:
+            keys (list): Parameter keys.
+
+        Returns:
+            (dict): List of values (in order of exemplars) of each key.
+        """
+        if DEBUG: print("TemplateStats.paramLists()")
+        lists = {}
+        for key in keys: 
+            lists[key] = [self.params[fp][key] for fp in self.fps]
+        return lists
+
+    #-------------------------------------------------------------------
+
+    def scalarStats(self, key):
+        """ Average, min. and max. values of a scalar parameter 
+        of exemplars, from the running sum, min. and max. values.
+        Only when an exemplar with the min. or max. value was removed,
+        they're recalculated from all exemplars.
+
+        Args:
+            key (str): Parameter key.
+
+        Returns:
+            (tuple): Average, min. and max. values.
+        """
+        if DEBUG: print("TemplateStats.scalarStats()")
+        if key in self.staleKeys:
+            vals = [self.params[fp][key] for fp in self.fps]
+            self.mins[key] = min(vals)
+            self.maxs[key] = max(vals)
+            self.staleKeys.remove(key)
+        avg = self.sums[key] / float(len(self.fps))
+        return avg, self.mins[key], self.maxs[key]
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class ThresholdModel(object):
+    """ Threshold ranges (min. and max. values) of comparison parameters,
+    compiled to arrays, so parameters of a sound fragment are compared
+    with one vectorized mask. It's updated when thresholds are edited,
+    not for each sound fragment.
+
+    Args:
+        keys (list): Names of parameters.
+        tParams (None/ dict, optional): Threshold values; key is 
+          parameter name + '_min' or '_max'. Parameters without 
+          any of them are not compared.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, keys, tParams=None):
+        if DEBUG: print("ThresholdModel.__init__()")
+        self.keys = list(keys) # names of parameters
+        n = len(self.keys)
+        self.mins = np.full(n, -np.inf) # min. values; -inf means no limit
+        self.maxs = np.full(n, np.inf) # max. values; inf means no limit
+        self.active = np.zeros(n, dtype=bool) # whether to compare
+          # each parameter
+        self.aIdx = np.zeros(0, dtype=np.int64) # indices of active 
+          # parameters
+        self.aKeys = [] # names of active parameters
+        if tParams != None:
+            for i in range(n):
+                for mmn in ['min', 'max']:
+                    key = self.keys[i] + '_' + mmn
+                    if key in tParams: self.set(self.keys[i], mmn, 
+                                                tParams[key])
+            self.compile()
+
+    #-------------------------------------------------------------------
+
+    def set(self, key, mmn, value):
+        """ Set a threshold value and make the parameter active.
+        (compile should be called after setting values)
+
+        Args:
+            key (str): Name of parameter.
+            mmn (str): 'min' or 'max'.
+            value (None/ float): Threshold value. None means no limit.
+
+        Returns:
+            None
+        """
+        i = self.keys.index(key)
+        if mmn == 'min':
+            if value == None: value = -np.inf
+            self.mins[i] = value
+        else:
+            if value == None: value = np.inf
+            self.maxs[i] = value
+        self.active[i] = True
+
+    #-------------------------------------------------------------------
+
+    def compile(self):
+        """ Update indices of active parameters.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if DEBUG: print("ThresholdModel.compile()")
+        self.aIdx = np.nonzero(self.active)[0]
+        self.aKeys = [self.keys[i] for i in self.aIdx]
+
+    #-------------------------------------------------------------------
+
+    def compare(self, sParams, fName=''):
+        """ Compare parameters of a sound fragment with thresholds.
+
+        Args:
+            sParams (dict): Parameters of a sound fragment.
+            fName (str, optional): Name of the wave file 
+              (see PyListener.compareParamsOfSF2T).
+
+        Returns:
+            (CompareResult): Result of comparison.
+        """
+        if DEBUG: print("ThresholdModel.compare()")
+        vals = np.array([sParams[k] for k in self.aKeys], dtype=np.float64)
+        mins = self.mins[self.aIdx]
+        maxs = self.maxs[self.aIdx]
+        inRange = (vals >= mins) & (vals <= maxs)
+        return CompareResult(self.aKeys, vals, mins, maxs, inRange, fName)
+
+#=======================================================================
+
+class CompareResult(object):
+    """ Result of comparing parameters of a sound fragment with 
+    thresholds. The result text is formatted only when it's read 
+    (str) or logged.
+
+    Args:
+        keys (list): Names of compared parameters.
+        vals (numpy.array): Values of the sound fragment.
+        mins (numpy.array): Min. thresholds.
+        maxs (numpy.array): Max. thresholds.
+        inRange (numpy.array): Whether each value is in range.
+        fName (str, optional): Name of the wave file.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, keys, vals, mins, maxs, inRange, fName=''):
+        self.keys = keys # names of compared parameters
+        self.vals = vals # values of the sound fragment
+        self.mins = mins # min. thresholds
+        self.maxs = maxs # max. thresholds
+        self.inRange = inRange # whether each value is in range
+        self.matched = bool(np.all(inRange)) # whether all are in range
+        self.fName = fName # name of the wave file
+        self.ts = get_time_stamp() # time of comparison
+        self.txt = None # formatted result text
+
+    #-------------------------------------------------------------------
+
+    def __str__(self):
+        if self.txt != None: return self.txt
+        rsltTxt = ""
+        for i in range(len(self.keys)):
+            rsltTxt += "/ %s"%(self.keys[i])
+            if not self.inRange[i]: rsltTxt += " [NOT]"
+            rsltTxt += " (%.3f <= %.3f <= %.3f)"%(self.mins[i], self.vals[i],
+                                                  self.maxs[i])
+        rsltTxt = rsltTxt.lstrip("/")
+        _txt = "Sound fragment"
+        if self.fName != '': _txt += " (%s)"%(self.fName)
+        if self.matched == True:
+            matchedKeys = [self.keys[i] for i in range(len(self.keys)) \
+                                                        if self.inRange[i]]
+            _str = "/ ".join(matchedKeys)
+            _txt += " [MATCHED] with following parameters ( %s )"%(_str)
+            _txt += rsltTxt
+        else:
+            _txt += " did [NOT] match/ " + rsltTxt
+        self.txt = "%s, [RESULT], %s\n\n"%(self.ts, _txt)
+        return self.txt
+
+    #-------------------------------------------------------------------
+
+    def __add__(self, other):
+        return ResultText(self, other)
+
+    #-------------------------------------------------------------------
+
+    def __radd__(self, other):
+        return ResultText(other, self)
+
+#=======================================================================
+
+class ResultText(object):
+    """ Text made of parts, which are formatted only when it's read
+    (str). A part is a string or an object with __str__ 
+    (e.g. CompareResult, or a function without arguments, 
+    which returns string).
+
+    Args:
+        parts: Parts of the text.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, *parts):
+        self.parts = list(parts) # parts of the text
+        self.txt = None # formatted text
+
+    #-------------------------------------------------------------------
+
+    def __add__(self, other):
+        return ResultText(*(self.parts + [other]))
+
+    #-------------------------------------------------------------------
+
+    def __radd__(self, other):
+        return ResultText(*([other] + self.parts))
+
+    #-------------------------------------------------------------------
+
+    def __str__(self):
+        if self.txt == None:
+            txt = ""
+            for p in self.parts:
+                if callable(p): txt += p()
+                else: txt += str(p)
+            self.txt = txt
+        return self.txt
+
+#=======================================================================
+
+class DeferredLog(object):
+    """ Log file writer, which formats (str) and writes items 
+    in a thread, so that formatting result texts and opening 
+    the log file are not done in processing audio data.
+
+    Args:
+        logFile (str): File path of log file.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self, logFile):
+        self.logFile = logFile # log file path
+        self.q = queue.Queue() # items to write
+        self.th = None # writing thread; started with the first item
+        self.lock = Lock()
+
+    #-------------------------------------------------------------------
+
+    def write(self, item):
+        """ Queue an item to write.
+
+        Args:
+            item: String or an object with __str__.
+
+        Returns:
+            None
+        """
+        if self.th == None:
+            with self.lock:
+                if self.th == None:
+                    self.th = Thread(target=self.run, daemon=True)
+                    self.th.start()
+                    atexit.register(self.flush)
+        self.q.put(item)
+
+    #-------------------------------------------------------------------
+
+    def run(self):
+        """ Function for the writing thread.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        while True:
+            items = [self.q.get()]
+            while True: # write all queued items at once
+                try: items.append(self.q.get_nowait())
+                except queue.Empty: break
+            try:
+                writeFile(self.logFile, "".join([str(i) for i in items]))
+            except OSError as e:
+                print("%s, [ERROR], %s"%(get_time_stamp(), str(e)))
+            for i in items: self.q.task_done()
+
+    #-------------------------------------------------------------------
+
+    def flush(self):
+        """ Wait until all queued items are written.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self.th != None: self.q.join()
+
+#=======================================================================
+
+class AudioDataHandoff(object):
+    """ Bounded handoff of audio data from the listening thread 
+    to the main thread. Only the most recent data is kept, with its 
+    monotonically increasing block sequence number, so that memory does 
+    not grow when the main thread stalls, and the receiver knows 
+    exactly how many blocks it missed.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self):
+        if DEBUG: print("AudioDataHandoff.__init__()")
+        self.cond = Condition() 
+        self.seq = 0 # sequence number of the most recent data
+        self.data = None # the most recent data
+        self.lastSeq = 0 # sequence number of data last taken by receiver
+        self.missed = 0 # total number of blocks the receiver missed
+
+    #-------------------------------------------------------------------
+
+    def put(self, seq, data):
+        """ Store data (called by the listening thread). 
+        Data should not be modified after this call.
+
+        Args:
+            seq (int): Block sequence number (starting from 1).
+            data (): Data to send.
+
+        Returns:
+            None
+        """
+        with self.cond:
+            self.seq = seq
+            self.data = data
+            self.cond.notify_all()
+
+    #-------------------------------------------------------------------
+
+    def waitTaken(self, timeout):
+        """ Wait until the receiver takes the most recent data
+        (called by the listening thread, to process every block of 
+        a source which doesn't need to be real time).
+
+        Args:
+            timeout (float): Maximum time (in seconds) to wait.
+
+        Returns:
+            (bool): Whether the data was taken.
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.lastSeq == self.seq, 
+                                      timeout)
+
+    #-------------------------------------------------------------------
+
+    def get(self, timeout=None):
+        """ Get the most recent data, if it wasn't taken already.
+
+        Args:
+            timeout (None/ float, optional): When given, wait for new data
+              up to this time (in seconds). Otherwise, return immediately.
+
+        Returns:
+            (None/ tuple): None if there's no new data. Otherwise, 
+              (seq, data, missed); missed is number of blocks which were 
+              put, but not taken, since the last call.
+        """
+        with self.cond:
+            if self.seq == self.lastSeq:
+                if timeout == None: return None
+                if not self.cond.wait_for(lambda: self.seq != self.lastSeq, 
+                                          timeout):
+                    return None
+            missed = self.seq - self.lastSeq - 1
+            self.lastSeq = self.seq
+            self.missed += missed
+            self.cond.notify_all()
+            return self.seq, self.data, missed
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class CaptureHealth(object):
+    """ Counters and gauges of capturing audio data (in the listening 
+    thread) and processing it (in the main thread).
+    Updating is cheap (a few additions under a lock), so that it can be 
+    called for every audio block.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    def __init__(self):
+        if DEBUG: print("CaptureHealth.__init__()")
+        self.lock = Lock()
+        self.startTime = time() # time when measuring started
+        self.overflows = 0 # number of input overflows (dropped blocks)
+        self.readErrors = 0 # number of other errors while reading stream
+        self.blocksCaptured = 0 # number of captured blocks
+        self.blocksProcessed = 0 # number of blocks taken by main thread
+        self.blocksMissed = 0 # number of blocks main thread didn't take
+        self.headSeq = 0 # sequence number of the last captured block
+        self.procSeq = 0 # sequence number of the last processed block
+        self.captureLag = 0.0 # time (in seconds) of audio data waiting 
+          # in the input buffer when the last block was read; i.e. how far 
+          # capturing is behind the input device
+        self.procDelay = 0.0 # time (in seconds) between capturing 
+          # the last processed block and processing it
+
+    #-------------------------------------------------------------------
+
+    def onCapture(self, captureLag):
+        """ A block was captured (listening thread).
+
+        Args:
+            captureLag (float): Time (in seconds) of audio data waiting 
+              in the input buffer.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.blocksCaptured += 1
+            self.headSeq += 1
+            self.captureLag = captureLag
+
+    #-------------------------------------------------------------------
+
+    def onOverflow(self):
+        """ Input buffer overflowed (listening thread).
+        """
+        with self.lock: self.overflows += 1
+
+    #-------------------------------------------------------------------
+
+    def onReadError(self):
+        """ Reading stream failed (listening thread).
+        """
+        with self.lock: self.readErrors += 1
+
+    #-------------------------------------------------------------------
+
+    def onProcess(self, seq, missed, tCap):
+        """ A block was taken for processing (main thread).
+
+        Args:
+            seq (int): Sequence number of the block.
+            missed (int): Number of blocks missed since the last one.
+            tCap (float): Time (perf_counter) when the block was captured.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.blocksProcessed += 1
+            self.blocksMissed += missed
+            self.procSeq = seq
+            self.procDelay = perf_counter() - tCap
+
+    #-------------------------------------------------------------------
+
+    def snapshot(self):
+        """ Get current values.
+
+        Args: None
+
+        Returns:
+            (dict): Current counters and gauges. 'lagMs' is how far 
+              analysis is behind the capture head (input device) in 
+              milliseconds; blocks captured but not processed yet,
+              delay of processing and audio data waiting in input buffer.
+        """
+        with self.lock:
+            behind = max(0, self.headSeq - self.procSeq)
+            lag = behind*INPUT_BLOCK_TIME + self.procDelay + self.captureLag
+            return dict(
+                        uptime = time() - self.startTime,
+                        overflows = self.overflows,
+                        readErrors = self.readErrors,
+                        blocksCaptured = self.blocksCaptured,
+                        blocksProcessed = self.blocksProcessed,
+                        blocksMissed = self.blocksMissed,
+                        blocksBehind = behind,
+                        captureLagMs = self.captureLag * 1000,
+                        lagMs = lag * 1000,
+                       )
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
+class OverloadController(object):
+    """ Controls processing quality level with lag between capturing and 
+    analysis (CaptureHealth 'lagMs'). 
+    When lag grows, it steps down the quality level by level; 
+      skipping display refreshes, skipping 'corr2auto', using coarser 
+      spectrogram rows and finally RMS-only gating 
+      (sound fragment is saved without analysis and comparison).
+    It steps back up when lag stays low for 'holdTime' seconds.
+    Every level change is logged.
+
+    Args:
+        logFile (str): File path of log file.
+        upThr (tuple): Lag (in milliseconds) to go over, 
+          to step down from each level to the next level.
+        downRatio (float): Lag should be lower than 
+          upThr[level-1]*downRatio to step back up.
+        holdTime (float): Time (in seconds) lag should stay low 
+          to step back up.
+        minDwell (float): Minimum time (in seconds) between 
+          stepping down.
+        displayEvery (int): When display refreshes are skipped, 
+          refresh only once in this number of calls.
+
+    Attributes:
+        Each attribute is described on the line in __init__.
+    """
+    ### quality levels
+    NORMAL = 0
+    SKIP_DISPLAY = 1
+    SKIP_CORR2AUTO = 2
+    COARSE_ROWS = 3
+    RMS_ONLY = 4
+    levelNames = ['normal', 'skipDisplay', 'skipCorr2auto', 'coarseRows', 
+                  'rmsOnly']
+
+    def __init__(self, logFile='', upThr=(200, 400, 800, 1600), 
+                 downRatio=0.5, holdTime=3.0, minDwell=0.5, displayEvery=10):
+        if DEBUG: print("OverloadController.__init__()")
+        self.logFile = logFile
+        self.upThr = upThr 
+        self.downRatio = downRatio 
+        self.holdTime = holdTime 
+        self.minDwell = minDwell 
+        self.displayEvery = displayEvery 
+        self.level = self.NORMAL # current quality level
+        self.lastChange = 0 # time when level was changed last time
+        self.clearSince = None # time since lag is low enough to step up
+        self.displayCnt = 0 # counter for skipping display refreshes
+
+    #-------------------------------------------------------------------
+
+    def update(self, lagMs):
+        """ Update quality level with the current lag.
+
+        Args:
+            lagMs (float): Lag between capturing and analysis 
+              in milliseconds.
+
+        Returns:
+            level (int): Current quality level.
+        """
+        now = time()
+        lvl = self.level
+        if lvl < self.RMS_ONLY and lagMs > self.upThr[lvl]:
+            self.clearSince = None
+            if now-self.lastChange >= self.minDwell:
+                self.setLevel(lvl+1, lagMs, now)
+        elif lvl > self.NORMAL and lagMs < self.upThr[lvl-1]*self.downRatio:
+            if self.clearSince == None:
+                self.clearSince = now
+            elif now-self.clearSince >= self.holdTime:
+                self.clearSince = None
+                self.setLevel(lvl-1, lagMs, now)
+        else:
+            self.clearSince = None
+        return self.level
+
+    #-------------------------------------------------------------------
+
+    def setLevel(self, level, lagMs, now):
+        """ Change quality level and log it.
+
+        Args:
+            level (int): New quality level.
+            lagMs (float): Current lag in milliseconds.
+            now (float): Current time.
+
+        Returns:
+            None
+        """
+        msg = "%s, [MSG], Overload level changed;"%(get_time_stamp())
+        msg += " %i (%s)"%(self.level, self.levelNames[self.level])
+        msg += " -> %i (%s)"%(level, self.levelNames[level])
+        msg += ", lag: %.1f ms\n"%(lagMs)
+        if self.logFile != '': writeFile(self.logFile, msg)
+        if DEBUG: print(msg)
+        self.level = level
+        self.lastChange = now
+
+    #-------------------------------------------------------------------
+
+    def allowDisplayRefresh(self):
+        """ Whether display can be refreshed now.
+
+        Args: None
+
+        Returns:
+            (bool): Whether display can be refreshed.
+        """
+        if self.level < self.SKIP_DISPLAY: return True
+        self.displayCnt += 1
+        return self.displayCnt % self.displayEvery == 0
+
+    #-------------------------------------------------------------------
+
+#=======================================================================
+
 if __name__ == "__main__": pass
 
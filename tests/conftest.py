@@ -0,0 +1,12 @@
+# coding: UTF-8
+
+"""
+Test configuration; modules of pyListener are in the parent folder
+(not installed as a package).
+"""
+
+import sys
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
@@ -0,0 +1,93 @@
+# coding: UTF-8
+
+"""
+Tests of AsyncPyListener (pyLAsync.py) with a synthetic audio source;
+async iterators should finish at the end of the source.
+"""
+
+import asyncio
+from os import path
+
+import pytest
+
+import pyListenerLib as PLL
+from pyLAsync import AsyncPyListener
+from pyLAudioSource import SyntheticSource
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+#=======================================================================
+
+@pytest.fixture
+def pl(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'recordings').mkdir()
+    pl = PLL.PyListener(None, None, str(tmp_path / 'log.txt'), 
+                        flagMic=False)
+    pl.templCacheDir = None
+    pl.flagPrint = False
+    pl.templFP = path.join(ROOT, 'input', 'sample_phee')
+    pl.listen(flag='templateFolder', wavFP=pl.templFP)
+    return pl
+
+#-----------------------------------------------------------------------
+
+def source(duration):
+    """ Tone bursts (on for 0.6 s, off for 1.0 s). """
+    return SyntheticSource('tone', freq=7000.0, amp=0.5, 
+                           framerate=PLL.RATE, duration=duration, 
+                           onDur=0.6, offDur=1.0)
+
+#-----------------------------------------------------------------------
+
+def nBlocks(duration):
+    """ Number of audio blocks of the source. """
+    return -(-int(duration*PLL.RATE) // PLL.INPUT_FRAMES_PER_BLOCK)
+
+#=======================================================================
+
+def test_iterators_finish_at_end_of_source(pl):
+    async def main():
+        apl = AsyncPyListener(pl, maxCols=100000, maxEvents=1000)
+        src = source(4.0)
+        await apl.start(source=src)
+        cols = [c async for c in apl.columns()]
+        evts = [e async for e in apl.events()]
+        await apl.stop()
+        return apl, cols, evts
+    apl, cols, evts = asyncio.run(asyncio.wait_for(main(), 60))
+    assert len(cols) == nBlocks(4.0)
+    ad, amp = cols[0]
+    assert ad.ndim == 1 and amp > 0
+    kinds = [e['event'] for e in evts]
+    assert 'started' in kinds and 'stopped' in kinds
+    assert 'fragment' in kinds
+    assert kinds.index('started') < kinds.index('stopped')
+    assert apl.dropped == dict(cols=0, events=0)
+    assert apl.isRunning == False
+
+#-----------------------------------------------------------------------
+
+def test_oldest_items_dropped(pl):
+    maxCols = 5
+    maxEvents = 3
+    async def main():
+        apl = AsyncPyListener(pl, maxCols=maxCols, maxEvents=maxEvents)
+        await apl.start(source=source(4.0))
+        # not consuming anything until the processing thread finished
+        await asyncio.get_running_loop().run_in_executor(None, 
+                                                         apl.procTh.join)
+        await asyncio.sleep(0.1)
+        cols = [c async for c in apl.columns()]
+        evts = [e async for e in apl.events()]
+        await apl.stop()
+        return apl, cols, evts
+    apl, cols, evts = asyncio.run(asyncio.wait_for(main(), 60))
+    n = nBlocks(4.0)
+    # the end mark (None) also takes a slot of each queue
+    assert len(cols) == maxCols-1
+    assert apl.dropped['cols'] == n - (maxCols-1)
+    assert len(evts) == maxEvents-1
+    assert apl.dropped['events'] > 0
+    # the newest event (start of the last tone burst) is kept
+    assert evts[-1]['event'] == 'started'
@@ -0,0 +1,104 @@
+# coding: UTF-8
+
+"""
+Tests of checkpoint and resume of BatchScanner; output of a resumed
+scan should be the same as that of an uninterrupted scan.
+"""
+
+import json, shutil
+from os import path
+
+import pytest
+
+from pyLBatch import BatchScanner, findWAVFiles
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+TEMPL = path.join(ROOT, 'input', 'sample_phee')
+WAVS = ['m_phee01.wav', 'm_rapFTsik01.wav', 'm_test.wav', 'm_trill01.wav']
+
+#=======================================================================
+
+@pytest.fixture
+def recDir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # 'log' folder is made in cwd
+    d = tmp_path / 'rec'
+    d.mkdir()
+    for fn in WAVS: shutil.copy(path.join(ROOT, 'input', 'test', fn), str(d))
+    return d
+
+def scan(outFP, fps, flagResume=True):
+    bs = BatchScanner(TEMPL, outFP, nWorkers=2, logFile='log.txt',
+                      flagResume=flagResume)
+    bs.run(fps)
+    return bs
+
+def readLines(fp):
+    with open(fp, 'rb') as f: return f.read().splitlines()
+
+def manifestEntries(outFP):
+    with open(outFP + '.manifest', 'r') as f:
+        return [json.loads(l) for l in f][1:]
+
+def recFiles(outFP):
+    return [path.abspath(json.loads(l)['file']) for l in readLines(outFP)]
+
+#=======================================================================
+
+def test_rerun_of_completed_scan_changes_nothing(recDir):
+    fps = findWAVFiles([str(recDir)])
+    scan('out.jsonl', fps)
+    with open('out.jsonl', 'rb') as f: out = f.read()
+    bs = scan('out.jsonl', fps)
+    assert bs.nFiles == 0
+    with open('out.jsonl', 'rb') as f: assert f.read() == out
+    assert len(manifestEntries('out.jsonl')) == len(WAVS)
+
+def test_resume_after_interruption(recDir):
+    fps = findWAVFiles([str(recDir)])
+    scan('full.jsonl', fps, flagResume=False)
+    full = readLines('full.jsonl')
+    assert len(full) > len(WAVS) # some files have multiple fragments
+    ### interrupted run; the last two files are not checkpointed and
+    ### records after the last checkpoint were written partially
+    scan('out.jsonl', fps)
+    entries = manifestEntries('out.jsonl')
+    with open('out.jsonl.manifest', 'r') as f: lines = f.readlines()
+    with open('out.jsonl.manifest', 'w') as f:
+        f.writelines(lines[:3]) # header and two entries
+        f.write('{"file": "par') # partially written entry
+    size = path.getsize('out.jsonl')
+    assert size > entries[1]['offset'] + 5
+    with open('out.jsonl', 'rb+') as f:
+        f.truncate(size - 5) # cut in the middle of a record
+    bs = scan('out.jsonl', fps)
+    assert bs.nFiles == 2
+    assert sorted(readLines('out.jsonl')) == sorted(full)
+    entries = manifestEntries('out.jsonl')
+    assert len(entries) == len(WAVS)
+    assert entries[-1]['offset'] == path.getsize('out.jsonl')
+
+def test_modified_file_is_rescanned_without_duplicates(recDir):
+    fps = findWAVFiles([str(recDir)])
+    scan('out.jsonl', fps)
+    modFP = path.abspath(str(recDir / 'm_phee01.wav'))
+    nBefore = recFiles('out.jsonl').count(modFP)
+    shutil.copy(path.join(ROOT, 'input', 'test', 'm_rapFTsik06.wav'), modFP)
+    bs = scan('out.jsonl', fps)
+    assert bs.nFiles == 1
+    scan('fresh.jsonl', fps, flagResume=False)
+    assert sorted(readLines('out.jsonl')) == sorted(readLines('fresh.jsonl'))
+    assert recFiles('out.jsonl').count(modFP) != nBefore
+    ### each file has one manifest entry and its records are in its
+    ### byte range of the output
+    entries = manifestEntries('out.jsonl')
+    assert sorted([e['file'] for e in entries]) == \
+                                    sorted([path.abspath(fp) for fp in fps])
+    with open('out.jsonl', 'rb') as f: data = f.read()
+    prev = 0
+    for e in entries:
+        recs = data[prev:e['offset']].splitlines()
+        assert len(recs) == e['nFrags']
+        for r in recs:
+            assert path.abspath(json.loads(r)['file']) == e['file']
+        prev = e['offset']
+    assert prev == len(data)
@@ -0,0 +1,152 @@
+# coding: UTF-8
+
+"""
+Tests of PyListener.compareParamsOfSF2T (with ThresholdModel); result
+and its text should be the same as those of the loop over threshold
+keys, which it replaced.
+"""
+
+from os import path
+
+import numpy as np
+import pytest
+
+import pyListenerLib as PLL
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+#=======================================================================
+
+def baselineCompare(sParams, tParams, fName, ts):
+    """ Comparison of the previous version (without logging),
+    with the given time stamp. """
+    rslt = True
+    rsltTxt = ""
+    matchedKeys = []
+    for key in tParams.keys():
+        if key[-4:] == '_max': continue
+        key = key[:-4]
+        sfV = sParams[key]
+        rsltTxt += "/ %s"%(key)
+        minV = tParams[key+'_min']
+        maxV = tParams[key+'_max']
+        if sfV < minV or sfV > maxV:
+            rslt = False
+            rsltTxt += " [NOT]"
+        else:
+            matchedKeys.append(key)
+        rsltTxt += " (%.3f <= %.3f <= %.3f)"%(minV, sfV, maxV)
+    rsltTxt = rsltTxt.lstrip("/")
+    _txt = "Sound fragment"
+    if fName != '': _txt += " (%s)"%(fName)
+    if rslt == True:
+        _str = str(matchedKeys).strip('[]')
+        _str = _str.replace("'","").replace(",","/")
+        _txt += " [MATCHED] with following parameters ( %s )"%(_str)
+        _txt += rsltTxt
+    else:
+        _txt += " did [NOT] match/ " + rsltTxt
+    return rslt, "%s, [RESULT], %s\n\n"%(ts, _txt)
+
+#-----------------------------------------------------------------------
+
+@pytest.fixture(scope='module')
+def pl(tmp_path_factory):
+    logFile = str(tmp_path_factory.mktemp('log') / 'log.txt')
+    pl = PLL.PyListener(None, None, logFile, flagMic=False)
+    pl.templCacheDir = None
+    pl.flagPrint = False
+    pl.templFP = path.join(ROOT, 'input', 'sample_phee')
+    pl.listen(flag='templateFolder', wavFP=pl.templFP)
+    return pl
+
+def thresholds(pl):
+    """ Thresholds as they were given to compareParamsOfSF2T. """
+    tParams = {}
+    for param in pl.compParamList:
+        tParams[param+'_min'] = pl.templP[param+'_min']
+        tParams[param+'_max'] = pl.templP[param+'_max']
+    return tParams
+
+def fragments(pl, tParams):
+    """ Parameters of real sound fragments and of synthetic ones;
+    in range, on the bounds and out of range. """
+    sps = []
+    for fn in ['m_test.wav', 'm_phee01.wav', 'm_rapFTsik01.wav']:
+        fp = path.join(ROOT, 'input', 'test', fn)
+        for r in pl.scanWAVFile(fp, flagCompare=False, flagSave=False):
+            sps.append(r['params'])
+    keys = list(pl.compParamList)
+    mid = dict([(k, (tParams[k+'_min']+tParams[k+'_max'])/2.0) \
+                                                            for k in keys])
+    sps.append(mid)
+    sps.append(dict([(k, tParams[k+'_min']) for k in keys]))
+    sps.append(dict([(k, tParams[k+'_max']) for k in keys]))
+    for k in keys:
+        for v in [tParams[k+'_min']-1e-6, tParams[k+'_max']+1e-6]:
+            sp = dict(mid)
+            sp[k] = v
+            sps.append(sp)
+    return sps
+
+#=======================================================================
+
+def test_same_result_as_baseline_loop(pl):
+    tParams = thresholds(pl)
+    sps = fragments(pl, tParams)
+    nMatched = 0
+    for i, sp in enumerate(sps):
+        fName = 'f%i.wav'%(i) if i % 2 else ''
+        for tp in [tParams, pl.templThresholds()]:
+            rslt, r = pl.compareParamsOfSF2T(sp, tp, fName)
+            bRslt, bTxt = baselineCompare(sp, tParams, fName, r.ts)
+            assert rslt == bRslt == r.matched
+            assert str(r) == bTxt
+        nMatched += int(rslt)
+    assert 0 < nMatched < len(sps) # both results are tested
+
+def test_result_log_and_counts(pl):
+    tParams = thresholds(pl)
+    sps = fragments(pl, tParams)
+    pl.resultLog.flush()
+    with open(pl.logFile, 'r') as f: logLen = len(f.read())
+    nRslts = len(pl.sfRslts)
+    expected = ""
+    for sp in sps:
+        rslt, r = pl.compareParamsOfSF2T(sp, tParams)
+        expected += baselineCompare(sp, tParams, '', r.ts)[1]
+    pl.resultLog.flush()
+    with open(pl.logFile, 'r') as f: assert f.read()[logLen:] == expected
+    assert len(pl.sfRslts) == nRslts + len(sps)
+
+def test_saved_wav_logged_after_result(pl, tmp_path):
+    tParams = thresholds(pl)
+    mid = dict([(k, (tParams[k+'_min']+tParams[k+'_max'])/2.0) \
+                                            for k in pl.compParamList])
+    sfD = [np.zeros(PLL.INPUT_FRAMES_PER_BLOCK, np.int16)]*4
+    pl.resultLog.flush()
+    with open(pl.logFile, 'r') as f: logLen = len(f.read())
+    fp = str(tmp_path / 'saved.wav')
+    rslt, __, _fp = pl.compareSF2Template(mid, sfD, fp)
+    assert rslt == True and _fp == fp
+    pl.resultLog.flush()
+    with open(pl.logFile, 'r') as f: log = f.read()[logLen:]
+    iRslt = log.index("[MATCHED]")
+    iSaved = log.index("Saved to WAV file, %s"%(fp))
+    assert iRslt < iSaved
+
+def test_result_text_concatenation(pl):
+    tParams = thresholds(pl)
+    rslt, r = pl.compareParamsOfSF2T(fragments(pl, tParams)[0], tParams)
+    txt = PLL.ResultText("a") + r + "\n"
+    assert str(txt) == "a" + str(r) + "\n"
+    assert str("a" + r) == "a" + str(r)
+
+def test_threshold_model_without_limits():
+    tm = PLL.ThresholdModel(['a', 'b', 'c'])
+    tm.set('a', 'min', 1.0)
+    tm.set('b', 'max', None) # no limit
+    tm.compile()
+    assert tm.aKeys == ['a', 'b'] # 'c' is not compared
+    assert tm.compare(dict(a=1.0, b=1e9, c=-1.0)).matched == True
+    assert tm.compare(dict(a=0.5, b=0.0, c=0.0)).matched == False
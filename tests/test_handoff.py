@@ -0,0 +1,101 @@
+# coding: UTF-8
+
+"""
+Tests of AudioDataHandoff; sequence numbers and missed blocks.
+"""
+
+from threading import Thread
+
+from pyListenerLib import AudioDataHandoff
+
+#=======================================================================
+
+def test_get_without_data():
+    h = AudioDataHandoff()
+    assert h.get() == None
+    assert h.get(timeout=0.01) == None
+
+def test_each_block_is_taken_once():
+    h = AudioDataHandoff()
+    h.put(1, 'a')
+    assert h.get() == (1, 'a', 0)
+    assert h.get() == None
+    h.put(2, 'b')
+    assert h.get() == (2, 'b', 0)
+    assert h.missed == 0
+
+def test_only_latest_block_is_kept():
+    h = AudioDataHandoff()
+    h.put(1, 'a')
+    assert h.get() == (1, 'a', 0)
+    for seq, d in [(2, 'b'), (3, 'c'), (4, 'd')]: h.put(seq, d)
+    assert h.get() == (4, 'd', 2) # 2 and 3 were missed
+    h.put(5, 'e')
+    h.put(6, 'f')
+    assert h.get() == (6, 'f', 1)
+    assert h.missed == 3
+    assert h.lastSeq == 6
+
+def test_missed_blocks_before_first_get():
+    h = AudioDataHandoff()
+    for seq in range(1, 6): h.put(seq, seq)
+    assert h.get() == (5, 5, 4)
+    assert h.missed == 4
+
+def test_get_waits_for_data():
+    h = AudioDataHandoff()
+    th = Thread(target=lambda: h.put(1, 'a'))
+    th.start()
+    assert h.get(timeout=5.0) == (1, 'a', 0)
+    th.join()
+
+def test_wait_taken():
+    h = AudioDataHandoff()
+    h.put(1, 'a')
+    assert h.waitTaken(0.01) == False
+    h.get()
+    assert h.waitTaken(0.01) == True
+
+def test_no_missed_blocks_when_sender_waits():
+    """ A sender, which waits until each block is taken (as for
+    sources, which don't need to be real time), loses no block.
+    """
+    h = AudioDataHandoff()
+    n = 200
+    def send():
+        for seq in range(1, n+1):
+            h.put(seq, seq*10)
+            assert h.waitTaken(5.0)
+    th = Thread(target=send)
+    th.start()
+    rslts = []
+    while len(rslts) < n:
+        r = h.get(timeout=5.0)
+        assert r != None
+        rslts.append(r)
+    th.join()
+    assert [r[0] for r in rslts] == list(range(1, n+1))
+    assert [r[1] for r in rslts] == [seq*10 for seq in range(1, n+1)]
+    assert h.missed == 0
+
+def test_missed_blocks_are_accounted_with_slow_receiver():
+    """ With a sender, which doesn't wait, every block is either taken 
+    or counted as missed.
+    """
+    h = AudioDataHandoff()
+    n = 2000
+    def send():
+        for seq in range(1, n+1): h.put(seq, seq)
+    th = Thread(target=send)
+    th.start()
+    taken = []
+    while True:
+        r = h.get(timeout=0.5)
+        if r == None: break
+        taken.append(r)
+    th.join()
+    seqs = [r[0] for r in taken]
+    assert seqs == sorted(seqs)
+    assert seqs[-1] == n
+    assert len(taken) + h.missed == n
+    assert sum([r[2] for r in taken]) == h.missed
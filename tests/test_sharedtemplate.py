@@ -0,0 +1,115 @@
+# coding: UTF-8
+
+"""
+Tests of SharedTemplatePublisher and SharedTemplateReader; publish,
+refresh (also in a worker process) and publish again.
+"""
+
+import json
+from os import path, getpid
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import pyListenerLib as PLL
+from pyLSharedTemplate import SharedTemplatePublisher, SharedTemplateReader
+from pyLSharedTemplate import shared_memory, attachSharedMemory
+
+pytestmark = pytest.mark.skipif(shared_memory == None,
+                                reason="no multiprocessing.shared_memory")
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+#=======================================================================
+
+def loadTemplate(folder, logFile):
+    pl = PLL.PyListener(None, None, logFile, flagMic=False)
+    pl.templCacheDir = None
+    pl.templFP = path.join(ROOT, 'input', folder)
+    pl.listen(flag='templateFolder', wavFP=pl.templFP)
+    return pl
+
+def jsonValue(v):
+    return json.loads(json.dumps(v, default=PLL.toBuiltin))
+
+def readInWorker(prefix, logFile):
+    """ Refresh template of a PyListener in a worker process. """
+    pl = PLL.PyListener(None, None, logFile, flagMic=False)
+    reader = SharedTemplateReader(prefix)
+    flag = reader.refresh(pl)
+    rslt = (flag, reader.version, pl.tSpAD.copy(), pl.templP, 
+            pl.templAutoCorrMax())
+    del pl
+    reader.close()
+    return rslt
+
+def checkTemplate(pl, src):
+    assert np.array_equal(pl.tSpAD, src.tSpAD)
+    assert pl.templP == jsonValue(src.templP)
+    assert pl.templFP == src.templFP
+    assert pl.templAutoCorrMax() == src.templAutoCorrMax()
+
+@pytest.fixture
+def logFile(tmp_path):
+    return str(tmp_path / 'log.txt')
+
+@pytest.fixture
+def pub():
+    pub = SharedTemplatePublisher("pyl_test_%i"%(getpid()))
+    yield pub
+    if pub.ctl.buf != None: pub.close()
+
+#=======================================================================
+
+def test_publish_refresh_republish(pub, logFile):
+    phee = loadTemplate('sample_phee', logFile)
+    rfts = loadTemplate('sample_rfts', logFile)
+    reader = SharedTemplateReader(pub.prefix)
+    pl = PLL.PyListener(None, None, logFile, flagMic=False)
+    assert reader.refresh(pl) == False # nothing is published yet
+
+    assert pub.publish(phee) == 1
+    assert reader.refresh(pl) == True
+    assert reader.version == 1
+    checkTemplate(pl, phee)
+    assert pl.tSpAD.flags.writeable == False # read-only snapshot
+    keys = list(phee.compParamList)
+    assert np.array_equal(reader.arrays['mins'],
+                          [phee.templP[k+'_min'] for k in keys])
+    assert np.array_equal(reader.arrays['maxs'],
+                          [phee.templP[k+'_max'] for k in keys])
+    assert reader.refresh(pl) == False # same version
+
+    assert pub.publish(rfts) == 2
+    assert reader.refresh(pl) == True
+    assert reader.version == 2
+    checkTemplate(pl, rfts)
+    assert reader.oldShm == [] # old block was closed
+    reader.close()
+
+def test_refresh_in_worker_process(pub, logFile):
+    phee = loadTemplate('sample_phee', logFile)
+    rfts = loadTemplate('sample_rfts', logFile)
+    ctx = get_context('fork')
+    with ProcessPoolExecutor(1, mp_context=ctx) as ex:
+        pub.publish(phee)
+        flag, v, tSpAD, templP, acMax = ex.submit(readInWorker, pub.prefix,
+                                                  logFile).result()
+        assert (flag, v) == (True, 1)
+        assert np.array_equal(tSpAD, phee.tSpAD)
+        assert templP == jsonValue(phee.templP)
+        assert acMax == phee.templAutoCorrMax()
+        pub.publish(rfts)
+        flag, v, tSpAD, templP, acMax = ex.submit(readInWorker, pub.prefix,
+                                                  logFile).result()
+        assert (flag, v) == (True, 2)
+        assert np.array_equal(tSpAD, rfts.tSpAD)
+
+def test_close_unlinks_blocks(pub, logFile):
+    pub.publish(loadTemplate('sample_phee', logFile))
+    names = [pub.prefix, pub.shm.name]
+    pub.close()
+    for name in names:
+        with pytest.raises(FileNotFoundError): attachSharedMemory(name)
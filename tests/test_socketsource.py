@@ -0,0 +1,99 @@
+# coding: UTF-8
+
+"""
+Tests of SocketPCMServer, SocketPCMSender and SocketPCMSource on
+a loopback (UNIX) socket; received data should be intact and in order,
+and the oldest data should be dropped (and counted) when the reader 
+stalls.
+"""
+
+import queue
+from time import time, sleep
+
+import numpy as np
+import pytest
+
+from pyLSocketSource import SocketPCMServer, SocketPCMSender
+
+#=======================================================================
+
+@pytest.fixture
+def server(tmp_path):
+    sources = queue.Queue()
+    srv = SocketPCMServer(str(tmp_path / 'pcm.sock'), sources.put,
+                          str(tmp_path / 'log.txt'))
+    srv.start()
+    srv.sources = sources
+    yield srv
+    srv.close()
+
+def waitFor(cond, timeout=5.0):
+    t = time()
+    while not cond():
+        if time()-t > timeout: return False
+        sleep(0.005)
+    return True
+
+def readAll(src, nFrames):
+    blocks = []
+    while True:
+        d = src.read(nFrames, timeout=2.0)
+        if d is None:
+            if src.eof: break
+            continue
+        blocks.append(d)
+    return np.concatenate(blocks)
+
+#=======================================================================
+
+def test_frames_are_received_in_order(server):
+    # less than the ring buffer (5 seconds; 40000 frames), 
+    # so that nothing is dropped however late the reader is
+    data = (np.arange(35000) % 65536 - 32768).astype(np.int16)
+    sender = SocketPCMSender(server.address, framerate=8000)
+    src = server.sources.get(timeout=5.0)
+    assert (src.framerate, src.nchannels) == (8000, 1)
+    i = 0
+    for n in [1, 7, 441, 1000, 3333, 123]*20: # frames of various sizes
+        if i >= len(data): break
+        sender.send(data[i:i+n])
+        i += n
+    sender.send(data[i:])
+    sender.close()
+    d = readAll(src, 441)
+    nPad = (-len(data)) % 441 # the last block is padded with zeros
+    assert np.array_equal(d, np.concatenate((data, np.zeros(nPad, np.int16))))
+    assert src.overflows == 0
+
+def test_stereo_is_mixed_to_mono(server):
+    left = np.arange(0, 2000, dtype=np.int16)
+    right = left + 2
+    sender = SocketPCMSender(server.address, framerate=8000, nchannels=2)
+    src = server.sources.get(timeout=5.0)
+    sender.send(np.column_stack((left, right)).ravel()) # interleaved
+    sender.close()
+    d = readAll(src, 500)
+    assert np.array_equal(d, left + 1)
+
+def test_oldest_data_is_dropped_when_reader_stalls(server):
+    fr = 1000 # ring buffer of a source is 5 seconds; 5000 frames
+    data = (np.arange(23000) % 30000).astype(np.int16)
+    sender = SocketPCMSender(server.address, framerate=fr)
+    src = server.sources.get(timeout=5.0)
+    for i in range(0, len(data), 1000): sender.send(data[i:i+1000])
+    sender.close()
+    assert waitFor(lambda: src.closed) # reader didn't read meanwhile
+    assert src.overflows > 0
+    n = src.getReadAvailable()
+    assert n == 5 * fr
+    d = readAll(src, 250)
+    assert np.array_equal(d, data[-n:]) # the newest data, in order
+
+def test_invalid_header_is_rejected(server):
+    import socket
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(server.address)
+    s.sendall(b'XXXX' + b'\x00'*8)
+    assert s.recv(1) == b'' # closed by the server
+    s.close()
+    with pytest.raises(queue.Empty): server.sources.get(timeout=0.2)
@@ -0,0 +1,31 @@
+# coding: UTF-8
+
+"""
+Tests of PyListener.blocks2Spectrogram; columns should be the same as
+those of preProcDataFromMic on each block, without warnings on 
+silent (all-zero) blocks.
+"""
+
+import warnings
+
+import numpy as np
+
+import pyListenerLib as PLL
+
+#=======================================================================
+
+def test_same_as_preProcDataFromMic(tmp_path):
+    pl = PLL.PyListener(None, None, str(tmp_path / 'log.txt'), 
+                        flagMic=False)
+    fpb = PLL.INPUT_FRAMES_PER_BLOCK
+    rng = np.random.RandomState(0)
+    blocks = np.zeros((6, fpb), dtype=np.int16) # 1st block is silent
+    blocks[1] = 1 # max. of spectrogram column <= 1
+    blocks[2:] = rng.randint(-3000, 3000, (4, fpb))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        sp = pl.blocks2Spectrogram(blocks)
+    assert sp.shape == (int(fpb/2), len(blocks))
+    assert not sp[:,0].any()
+    for i in range(len(blocks)):
+        assert np.array_equal(sp[:,i], pl.preProcDataFromMic(blocks[i]))
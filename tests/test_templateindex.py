@@ -0,0 +1,82 @@
+# coding: UTF-8
+
+"""
+Tests of TemplateRangeIndex and matching of TemplateLibrary;
+candidates should include every template, of which threshold ranges
+contain the parameters of a sound fragment (brute force comparison).
+"""
+
+import numpy as np
+
+from pyLTemplateLib import TemplateLibrary, TemplateRangeIndex
+
+#=======================================================================
+
+def randomBoxes(rs, n, nDim, integer=False):
+    a = rs.uniform(0, 10, size=(n, nDim))
+    b = rs.uniform(0, 10, size=(n, nDim))
+    if integer: # many ties of values
+        a = np.round(a)
+        b = np.round(b)
+    return np.minimum(a, b), np.maximum(a, b)
+
+def bruteForce(mins, maxs, v):
+    return set(np.nonzero(np.all((v >= mins) & (v <= maxs), axis=1))[0])
+
+#=======================================================================
+
+def test_candidates_include_all_matches():
+    rs = np.random.RandomState(0)
+    for integer in [False, True]:
+        mins, maxs = randomBoxes(rs, 500, 5, integer)
+        idx = TemplateRangeIndex(mins, maxs)
+        pts = list(rs.uniform(-1, 11, size=(300, 5)))
+        pts += list(np.round(rs.uniform(0, 10, size=(300, 5)))) # on bounds
+        pts += [mins[i] for i in range(20)] + [maxs[i] for i in range(20)]
+        nMatched = 0
+        for v in pts:
+            cand = idx.candidates(v)
+            assert len(set(cand)) == len(cand) # no duplicates
+            assert set(cand) <= set(range(500))
+            matched = bruteForce(mins, maxs, v)
+            assert matched <= set(cand)
+            nMatched += len(matched)
+        assert nMatched > 0 # some points matched
+
+def test_candidates_are_narrowed_down():
+    rs = np.random.RandomState(1)
+    mins, maxs = randomBoxes(rs, 2000, 4)
+    maxs = mins + 0.5 # narrow ranges
+    idx = TemplateRangeIndex(mins, maxs)
+    n = [len(idx.candidates(v)) for v in rs.uniform(0, 10, size=(100, 4))]
+    assert np.mean(n) < 2000 * 0.1
+
+def test_empty_index():
+    idx = TemplateRangeIndex(np.zeros((0, 3)), np.zeros((0, 3)))
+    assert len(idx.candidates(np.zeros(3))) == 0
+
+def test_library_match_equals_brute_force(tmp_path):
+    """ With summedAmpRatio, of which range is relative to summedAmp of 
+    each template. """
+    rs = np.random.RandomState(2)
+    keys = ['duration', 'summedAmpRatio', 'centerOfMass']
+    lib = TemplateLibrary(logFile=str(tmp_path / 'log.txt'), keys=keys)
+    n = 300
+    lib.names = ['t%i'%(i) for i in range(n)]
+    lib.mins, lib.maxs = randomBoxes(rs, n, len(keys))
+    lib.mins[:,1] = rs.uniform(0.2, 0.9, n)
+    lib.maxs[:,1] = lib.mins[:,1] + rs.uniform(0.1, 1.0, n)
+    lib.sumAmps = rs.uniform(100, 1000, n)
+    nMatched = 0
+    for i in range(500):
+        sParams = dict(duration=rs.uniform(0, 10),
+                       summedAmp=rs.uniform(50, 1500),
+                       summedAmpRatio=0.0, # ratio to the current template
+                       centerOfMass=rs.uniform(0, 10))
+        m = lib.paramMatrix(sParams) # summedAmpRatio to each template
+        expected = np.all((m >= lib.mins) & (m <= lib.maxs), axis=1)
+        assert np.array_equal(lib.matchMask(sParams), expected)
+        assert lib.match(sParams) == [lib.names[j] for j in \
+                                                 np.nonzero(expected)[0]]
+        nMatched += np.sum(expected)
+    assert nMatched > 0
@@ -0,0 +1,49 @@
+# coding: UTF-8
+
+"""
+Tests of TemplateStats; running sum, min. and max. values of scalar
+parameters should be the same as those calculated from all exemplars,
+after exemplars are added and removed.
+"""
+
+import numpy as np
+
+import pyListenerLib as PLL
+
+#=======================================================================
+
+def expected(stats, key):
+    vals = [stats.params[fp][key] for fp in stats.fps]
+    return np.average(vals), min(vals), max(vals)
+
+#=======================================================================
+
+def test_scalar_stats_after_add_and_remove():
+    rng = np.random.RandomState(0)
+    stats = PLL.TemplateStats(48000, 4, 10)
+    vals = dict(('f%i'%(i), rng.uniform(0, 100)) for i in range(8))
+    for fp in sorted(vals.keys()):
+        params = dict(v=vals[fp], cmInColList=[1, 2, 3])
+        stats.add(fp, params, np.ones((4, 10)))
+    assert not 'cmInColList' in stats.sums
+    fpMin = min(vals, key=vals.get)
+    fpMax = max(vals, key=vals.get)
+    for fp in [fpMin, fpMax, 'f3']:
+        if fp in stats.fps: stats.remove(fp)
+        assert np.allclose(stats.scalarStats('v'), expected(stats, 'v'))
+    stats.add(fpMin, dict(v=vals[fpMin]), np.ones((4, 10)))
+    assert np.allclose(stats.scalarStats('v'), expected(stats, 'v'))
+    # an exemplar with the same file path is replaced
+    stats.add(fpMin, dict(v=1000.0), np.ones((4, 10)))
+    assert np.allclose(stats.scalarStats('v'), expected(stats, 'v'))
+    assert stats.scalarStats('v')[2] == 1000.0
+
+#-----------------------------------------------------------------------
+
+def test_scalar_stats_start_over_when_empty():
+    stats = PLL.TemplateStats(48000, 4, 10)
+    stats.add('a', dict(v=5.0), np.ones((4, 10)))
+    stats.remove('a')
+    assert stats.sums == {} and stats.staleKeys == set()
+    stats.add('b', dict(v=2.0), np.ones((4, 10)))
+    assert stats.scalarStats('v') == (2.0, 2.0, 2.0)
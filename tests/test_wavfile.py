@@ -0,0 +1,145 @@
+# coding: UTF-8
+
+"""
+Tests of WAVFile; decoding of 16, 24 and 32-bit integer PCM and 32-bit
+float (to int16) and parsing of RIFF chunks.
+"""
+
+import wave, struct
+from os import path
+
+import numpy as np
+import pytest
+
+from pyLWAVFile import WAVFile, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+from pyLWAVFile import WAVE_FORMAT_EXTENSIBLE
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+#=======================================================================
+
+def writeRIFF(fp, tag, nch, rate, bits, data, extensible=False,
+              extraChunk=None, dataSize=None):
+    """ Write a WAV file with the given format and raw data bytes. """
+    blockAlign = nch * bits // 8
+    fmt = struct.pack('<HHIIHH', tag, nch, rate, rate*blockAlign,
+                      blockAlign, bits)
+    if extensible:
+        fmt = struct.pack('<HHIIHH', WAVE_FORMAT_EXTENSIBLE, nch, rate,
+                          rate*blockAlign, blockAlign, bits)
+        fmt += struct.pack('<HHI', 22, bits, 0) # cbSize, valid bits, mask
+        fmt += struct.pack('<H', tag) + b'\x00'*14 # sub-format GUID
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    if extraChunk != None:
+        cID, cData = extraChunk
+        body += cID + struct.pack('<I', len(cData)) + cData
+        if len(cData) % 2 == 1: body += b'\x00' # word-aligned
+    if dataSize == None: dataSize = len(data)
+    body += b'data' + struct.pack('<I', dataSize) + data
+    with open(fp, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+def int16Values(n=1000, nch=1, seed=0):
+    rs = np.random.RandomState(seed)
+    v = rs.randint(-32768, 32768, size=(n, nch)).astype(np.int16)
+    v[:4, 0] = [-32768, -1, 0, 32767] # extreme values
+    return v
+
+#=======================================================================
+
+def test_int16(tmp_path):
+    v = int16Values(nch=2)
+    fp = str(tmp_path / 'i16.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 2, 22050, 16, v.astype('<i2').tobytes())
+    wf = WAVFile(fp)
+    assert (wf.fmt, wf.nchannels, wf.framerate, wf.nframes) == \
+            ('int16', 2, 22050, len(v))
+    d = wf.read()
+    assert d.dtype == np.int16 and d.shape == v.shape
+    assert np.array_equal(d, v)
+    wf.close()
+
+def test_int24(tmp_path):
+    v = int16Values()
+    low = np.random.RandomState(1).randint(0, 256, size=v.shape)
+    i24 = (v.astype(np.int32) << 8) | low # lower byte is dropped
+    b = np.zeros(v.shape + (3,), dtype=np.uint8)
+    for i in range(3): b[:, :, i] = (i24 >> (8*i)) & 0xFF
+    fp = str(tmp_path / 'i24.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 1, 44100, 24, b.tobytes())
+    wf = WAVFile(fp)
+    assert (wf.fmt, wf.sampwidth, wf.nframes) == ('int24', 3, len(v))
+    assert np.array_equal(wf.read(), v)
+
+def test_int32(tmp_path):
+    v = int16Values()
+    low = np.random.RandomState(2).randint(0, 65536, size=v.shape)
+    i32 = (v.astype(np.int32) << 16) | low
+    fp = str(tmp_path / 'i32.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 1, 44100, 32, i32.astype('<i4').tobytes())
+    wf = WAVFile(fp)
+    assert wf.fmt == 'int32'
+    assert np.array_equal(wf.read(), v)
+
+def test_float32(tmp_path):
+    v = int16Values()
+    f32 = v.astype(np.float32) / 32768.0
+    f32[4:8, 0] = [1.0, 1.5, -1.0, -2.0] # out of range values are clipped
+    fp = str(tmp_path / 'f32.wav')
+    writeRIFF(fp, WAVE_FORMAT_IEEE_FLOAT, 1, 48000, 32,
+              f32.astype('<f4').tobytes())
+    wf = WAVFile(fp)
+    assert (wf.fmt, wf.framerate) == ('float32', 48000)
+    d = wf.read()
+    expected = v.copy()
+    expected[4:8, 0] = [32767, 32767, -32768, -32768]
+    assert np.array_equal(d, expected)
+
+def test_extensible_header_and_extra_chunk(tmp_path):
+    v = int16Values()
+    fp = str(tmp_path / 'ext.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 1, 44100, 16, v.astype('<i2').tobytes(),
+              extensible=True, extraChunk=(b'LIST', b'odd'))
+    wf = WAVFile(fp)
+    assert wf.fmt == 'int16'
+    assert np.array_equal(wf.read(), v)
+
+def test_read_range(tmp_path):
+    v = int16Values()
+    fp = str(tmp_path / 'range.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 1, 44100, 16, v.astype('<i2').tobytes())
+    wf = WAVFile(fp)
+    assert np.array_equal(wf.read(100, 50), v[100:150])
+    assert np.array_equal(wf.read(990, 50), v[990:]) # shorter at the end
+    assert wf.read(2000, 10).shape == (0, 1)
+
+def test_truncated_data_chunk(tmp_path):
+    """ Size of data chunk in the header is larger than the file
+    (recording was interrupted). """
+    v = int16Values()
+    fp = str(tmp_path / 'trunc.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 1, 44100, 16, v.astype('<i2').tobytes(),
+              dataSize=10**6)
+    wf = WAVFile(fp)
+    assert wf.nframes == len(v)
+    assert np.array_equal(wf.read(), v)
+
+def test_unsupported_format(tmp_path):
+    fp = str(tmp_path / 'u8.wav')
+    writeRIFF(fp, WAVE_FORMAT_PCM, 1, 8000, 8, b'\x80'*100)
+    with pytest.raises(ValueError): WAVFile(fp)
+    fp = str(tmp_path / 'notwav.wav')
+    with open(fp, 'wb') as f: f.write(b'not a wav file')
+    with pytest.raises(ValueError): WAVFile(fp)
+
+def test_same_as_wave_module():
+    fp = path.join(ROOT, 'input', 'test', 'm_test.wav')
+    w = wave.open(fp, 'rb')
+    nch = w.getnchannels()
+    v = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2')
+    v = v.reshape(-1, nch)
+    wf = WAVFile(fp)
+    assert wf.getparams()[:4] == w.getparams()[:4]
+    assert np.array_equal(wf.read(), v)
+    w.close()
+    wf.close()